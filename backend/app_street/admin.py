@@ -1,21 +1,102 @@
+from django import forms
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from .models import (
     Producto, Categoria, Genero, Temporada, Marca, 
-    Talla, ProductoTallaStock, ImagenProducto
+    Talla, ProductoTallaStock, ImagenProducto, TrabajoImportacion
 )
+from .referencias import referencias
+
+
+class TallaChoiceField(forms.ModelChoiceField):
+    # Opciones y validación desde el registro en memoria: sin consultas por fila
+    # del inline (el widget de autocompletar consultaba la talla de cada fila)
+    def _get_choices(self):
+        return [('', self.empty_label)] + [(t.pk, t.nombre) for t in referencias.todos(Talla)]
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            talla = referencias.por_id(Talla, int(value))
+        except (TypeError, ValueError):
+            talla = None
+        if talla is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return talla
+
 
 # 1. Creamos un "Inline" para gestionar el stock por talla
 # Esto te permitirá añadir/editar/borrar tallas y stock desde la página del producto
 class ProductoTallaStockInline(admin.TabularInline):
     model = ProductoTallaStock
     extra = 1  # Cuántos campos vacíos para añadir nuevas tallas mostrar
-    autocomplete_fields = ['talla'] # Un buscador para las tallas, más cómodo
+
+    def get_queryset(self, request):
+        # Cada fila muestra "producto - talla": sin esto serían dos consultas por fila
+        return super().get_queryset(request).select_related('producto', 'talla')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'talla':
+            kwargs['form_class'] = TallaChoiceField
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 # Otro Inline para las imágenes
 class ImagenProductoInline(admin.StackedInline):
     model = ImagenProducto
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('producto')
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Sin filtros ni búsqueda, contar las páginas es un COUNT(*) de todo el
+    catálogo; en ese caso se usa la estimación de PostgreSQL (pg_class.reltuples,
+    que mantienen ANALYZE y autovacuum). Con filtros, o si la tabla es chica,
+    se cuenta de verdad.
+    """
+    umbral = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimado = filas_estimadas(queryset.model)
+            if estimado >= self.umbral:
+                return estimado
+        return super().count
+
+
+def filas_estimadas(modelo):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [modelo._meta.db_table])
+        fila = cursor.fetchone()
+    # -1 si la tabla nunca se analizó
+    return fila[0] if fila else -1
+
+class StockFilter(admin.SimpleListFilter):
+    title = 'stock'
+    parameter_name = 'stock'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('agotado', 'Agotado'),
+            ('disponible', 'Con stock'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'agotado':
+            return queryset.filter(stock_total=0)
+        if self.value() == 'disponible':
+            return queryset.filter(stock_total__gt=0)
+        return queryset
+
 # 2. Modificamos el ProductoAdmin
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
@@ -26,32 +107,39 @@ class ProductoAdmin(admin.ModelAdmin):
         'marca',
         'precio_base', 
         'en_oferta',
-        'precio_final', # El método @property funciona aquí directamente
-        'stock_total',  # Usaremos un método para mostrar el stock total
+        'precio_final', # Columna generada por la base de datos
+        'stock_total',  # Columna guardada: se puede ordenar sin agregar por fila
     )
     # Filtros que aparecerán a la derecha
-    list_filter = ('marca', 'categoria', 'genero', 'en_oferta')
+    list_filter = ('marca', 'categoria', 'genero', 'en_oferta', StockFilter)
     # Campos de búsqueda
     search_fields = ('nombre', 'sku', 'marca__nombre')
     # Añadimos los inlines
     inlines = [ProductoTallaStockInline, ImagenProductoInline]
 
-    # Método para mostrar el stock total en el list_display
-    def stock_total(self, obj):
-        return obj.get_stock_total()
-    
-    # Ayuda a que la columna de stock total se pueda ordenar
-    stock_total.admin_order_field = 'stock_tallas__stock' 
-    stock_total.short_description = 'Stock Total'
+    # La marca de cada fila viene en la misma consulta del listado
+    list_select_related = ('marca',)
+    # Sin el "N en total" al filtrar (un COUNT(*) extra del catálogo completo);
+    # el total sin filtros se estima (ConteoEstimadoPaginator)
+    show_full_result_count = False
+    paginator = ConteoEstimadoPaginator
+    # Buscadores en lugar de <select> con todas las filas de cada tabla
+    autocomplete_fields = ['categoria', 'genero', 'temporada', 'marca']
 
 
-# Registra los otros modelos para que aparezcan en el admin
-admin.site.register(Categoria)
-admin.site.register(Genero)
-admin.site.register(Temporada)
-admin.site.register(Marca)
+# Registra los otros modelos para que aparezcan en el admin (con búsqueda
+# por nombre, que usan los autocompletar del producto)
+@admin.register(Categoria, Genero, Temporada, Marca)
+class ClasificacionAdmin(admin.ModelAdmin):
+    search_fields = ('nombre',)
 
 @admin.register(Talla)
 class TallaAdmin(admin.ModelAdmin):
     # Habilita un campo de búsqueda para el modelo Talla
-    search_fields = ('nombre',)
\ No newline at end of file
+    search_fields = ('nombre',)
+
+@admin.register(TrabajoImportacion)
+class TrabajoImportacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'estado', 'filas_procesadas', 'total_filas', 'creados', 'actualizados', 'fecha_creacion')
+    list_filter = ('estado',)
+    readonly_fields = ('fecha_creacion', 'fecha_inicio', 'ultimo_avance', 'fecha_fin')
@@ -1,11 +1,49 @@
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from app_street.models import Producto
+from django.db.models import Prefetch
+from app_street.models import Producto, ProductoTallaStock, ImagenProducto
 from app_street.serializers import ProductSerializer
+from app_street.filters import BusquedaFilter, ClasificacionFilter, PrecioFilter
+from app_street.pagination import ProductoCursorPagination
+from app_street.cache_catalogo import CatalogoCacheMixin
+from app_street.facetas import contar_facetas
 from rest_framework import filters
 
-class ProductViewSet(ModelViewSet):
-    queryset = Producto.objects.all()
+# list/retrieve se cachean por parámetros + versión del catálogo (ETag/304)
+class ProductViewSet(CatalogoCacheMixin, ModelViewSet):
     serializer_class = ProductSerializer
+    # Páginas por cursor (?cursor=, ?page_size=) ordenadas por fecha_registro + id
+    pagination_class = ProductoCursorPagination
 
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['nombre', 'sku', 'descripcion', 'marca__nombre']
\ No newline at end of file
+    # ?search= busca en nombre, SKU, descripción y marca con índices de PostgreSQL;
+    # ?categoria=, ?genero=, ?temporada=, ?marca= filtran por id
+    filter_backends = [BusquedaFilter, ClasificacionFilter, PrecioFilter, filters.OrderingFilter]
+    # ?ordering=precio_final / -precio_final se resuelve con ORDER BY sobre la columna generada
+    ordering_fields = ['precio_final', 'precio_base', 'nombre', 'fecha_registro']
+    # Las facetas solo dependen de los filtros: ?cursor=, ?ordering=... comparten entrada
+    parametros_cache = {
+        'facets': ['search', 'categoria', 'genero', 'temporada', 'marca', 'precio_min', 'precio_max', 'en_oferta'],
+    }
+
+    def get_queryset(self):
+        # Traemos las relaciones en consultas fijas para que to_representation
+        # no dispare consultas por cada producto (N+1)
+        return (
+            Producto.objects
+            .defer('search_vector')
+            .select_related('categoria', 'genero', 'temporada', 'marca')
+            .prefetch_related(
+                Prefetch('talla_stock', queryset=ProductoTallaStock.objects.select_related('talla')),
+                Prefetch('imagenes', queryset=ImagenProducto.objects.all()),
+            )
+        )
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Conteos por categoría, género, temporada, marca, talla y oferta para
+        # los filtros actuales (ver facetas.py), cacheados como list/retrieve
+        return self._respuesta_cacheada(request, 'facets', self._facetas)
+
+    def _facetas(self, request):
+        return Response(contar_facetas(self.filter_queryset(Producto.objects.all())))
@@ -0,0 +1,62 @@
+"""
+Lectura del catálogo para el despliegue ASGI: mismo JSON, filtros, cursor y
+caché que ProductViewSet (list/retrieve y ?search=), pero la petición no
+ocupa un worker mientras espera a PostgreSQL. Las páginas se leen con el ORM
+async (aiterator, aget); lo que solo existe en versión síncrona (los filtros
+de DRF, que consultan al buscar, y la caché) corre con sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .api import ProductViewSet
+from .cache_catalogo import NO_MODIFICADO, consultar_cache, guardar_en_cache, con_cabeceras
+from .models import Producto
+
+
+class ProductosAsyncView(View):
+    """GET /api/async/productos/ (listado y búsqueda) y /api/async/productos/<id>/."""
+
+    async def get(self, request, pk=None):
+        accion = 'list' if pk is None else 'retrieve'
+        # Solo se usan query_params y la URL: ni parsers ni autenticación de DRF
+        drf_request = Request(request)
+        vista = ProductViewSet(request=drf_request, format_kwarg=None, action=accion, args=(), kwargs={'pk': pk})
+
+        etag, clave_cache, data = await sync_to_async(consultar_cache)(drf_request, accion)
+        if data is NO_MODIFICADO:
+            return con_cabeceras(HttpResponse(status=status.HTTP_304_NOT_MODIFIED), etag, 'HIT')
+        if data is not None:
+            return con_cabeceras(self.json(data), etag, 'HIT')
+
+        try:
+            data = await (self.listar(vista) if pk is None else self.detalle(vista, pk))
+        except APIException as exc:
+            # Mismo cuerpo que el manejador de excepciones de DRF
+            detalle = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return self.json(detalle, exc.status_code)
+
+        await sync_to_async(guardar_en_cache)(clave_cache, data, vista.cache_timeout)
+        return con_cabeceras(self.json(data), etag, 'MISS')
+
+    async def listar(self, vista):
+        queryset = await sync_to_async(vista.filter_queryset)(vista.get_queryset())
+        paginador = vista.paginator
+        productos = await paginador.apaginate_queryset(queryset, vista.request, vista)
+        # Con todo precargado, serializar no consulta la base de datos
+        return paginador.get_paginated_data(vista.get_serializer(productos, many=True).data)
+
+    async def detalle(self, vista, pk):
+        try:
+            producto = await vista.get_queryset().aget(pk=pk)
+        except Producto.DoesNotExist:
+            raise NotFound()
+        return vista.get_serializer(producto).data
+
+    def json(self, data, estado=status.HTTP_200_OK):
+        renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+        return HttpResponse(renderer.render(data), content_type=renderer.media_type, status=estado)
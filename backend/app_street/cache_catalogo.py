@@ -0,0 +1,148 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+# Secuencia de PostgreSQL (migración 0012): la versión es la misma para todos
+# los procesos y no vuelve a empezar si se reinicia la caché
+SECUENCIA_VERSION = 'app_street_version_catalogo'
+CLAVE_METRICAS = 'catalogo:metricas:{}'
+METRICAS = ('hits', 'misses', 'not_modified', 'invalidaciones')
+
+
+def _cache():
+    # El backend se elige en settings.CACHES (locmem por defecto, Redis/archivo en producción)
+    return caches[getattr(settings, 'CATALOGO_CACHE_ALIAS', 'default')]
+
+
+def version_catalogo():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT last_value FROM {SECUENCIA_VERSION}')
+        return cursor.fetchone()[0]
+
+
+def _incrementar_version():
+    # nextval no es transaccional: los demás procesos lo ven enseguida, no
+    # bloquea a otros escritores y no se deshace si la transacción se revierte
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SECUENCIA_VERSION])
+    _contar('invalidaciones')
+
+
+def invalidar_catalogo():
+    """
+    Cambia la versión del catálogo: las respuestas guardadas con la versión
+    anterior dejan de usarse (y expiran solas). Se incrementa ahora, para que
+    quien escribe lea sus propios cambios, y otra vez al confirmar la
+    transacción, por si otro request guardó datos viejos mientras tanto.
+    """
+    _incrementar_version()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_incrementar_version)
+
+
+def _contar(metrica):
+    cache = _cache()
+    clave = CLAVE_METRICAS.format(metrica)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+
+
+def metricas_cache():
+    cache = _cache()
+    datos = {m: cache.get(CLAVE_METRICAS.format(m), 0) for m in METRICAS}
+    consultas = datos['hits'] + datos['misses'] + datos['not_modified']
+    datos['hit_ratio'] = round((datos['hits'] + datos['not_modified']) / consultas, 4) if consultas else None
+    datos['version'] = version_catalogo()
+    return datos
+
+
+def _clave_respuesta(request, accion, parametros=None):
+    # Parámetros ordenados para que ?a=1&b=2 y ?b=2&a=1 compartan entrada;
+    # el host entra en la clave porque los links de paginación son absolutos.
+    # Con `parametros` solo esos entran en la clave (el resto no cambia la respuesta)
+    parametros = urlencode(sorted(
+        (nombre, valores) for nombre, valores in request.query_params.lists()
+        if parametros is None or nombre in parametros
+    ), doseq=True)
+    base = f'{accion}|{request.get_host()}{request.path}?{parametros}'
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()
+
+
+NO_MODIFICADO = object()
+
+
+def consultar_cache(request, accion, parametros=None):
+    """
+    (etag, clave_cache, data) de la respuesta de `accion` para `request`
+    (un Request de DRF). data es NO_MODIFICADO si el cliente ya tiene la
+    versión vigente (If-None-Match) y None si no hay nada guardado.
+    """
+    version = version_catalogo()
+    clave = _clave_respuesta(request, accion, parametros)
+    # El ETag solo depende de la consulta y la versión: el 304 solo cuesta
+    # la lectura de la secuencia
+    etag = f'"{version}-{clave[:16]}"'
+
+    if etag in _etags(request.headers.get('If-None-Match', '')):
+        _contar('not_modified')
+        return etag, None, NO_MODIFICADO
+
+    clave_cache = f'catalogo:v{version}:{clave}'
+    data = _cache().get(clave_cache)
+    _contar('misses' if data is None else 'hits')
+    return etag, clave_cache, data
+
+
+def guardar_en_cache(clave_cache, data, timeout=None):
+    timeout = timeout or getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 300)
+    _cache().set(clave_cache, data, timeout)
+
+
+def con_cabeceras(response, etag, estado):
+    response['ETag'] = etag
+    response['X-Cache'] = estado
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class CatalogoCacheMixin:
+    """
+    Cachea las respuestas de list/retrieve de un ViewSet por parámetros de la
+    consulta + versión del catálogo, y responde 304 si el cliente ya tiene la
+    versión vigente (If-None-Match). Agrega X-Cache: HIT/MISS.
+    """
+    cache_timeout = None
+    # acción -> parámetros de la consulta que entran en la clave (por defecto todos)
+    parametros_cache = {}
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, 'list', super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, 'retrieve', super().retrieve, *args, **kwargs)
+
+    def _respuesta_cacheada(self, request, accion, generar, *args, **kwargs):
+        etag, clave_cache, data = consultar_cache(request, accion, self.parametros_cache.get(accion))
+        if data is NO_MODIFICADO:
+            return con_cabeceras(Response(status=status.HTTP_304_NOT_MODIFIED), etag, 'HIT')
+        if data is not None:
+            return con_cabeceras(Response(data), etag, 'HIT')
+
+        response = generar(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            guardar_en_cache(clave_cache, response.data, self.cache_timeout)
+            con_cabeceras(response, etag, 'MISS')
+        return response
+
+
+def _etags(cabecera):
+    return {e.strip().removeprefix('W/') for e in cabecera.split(',') if e.strip()}
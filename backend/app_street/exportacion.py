@@ -0,0 +1,107 @@
+import csv
+import itertools
+import tempfile
+
+import pandas as pd
+from openpyxl import Workbook
+
+from .models import Producto
+
+# Columnas del archivo exportado (las mismas que espera ProductImportView)
+COLUMNAS_EXPORTACION = [
+    'SKU', 'Nombre', 'Descripcion', 'Precio Base', 'En Oferta', 'Descuento Porcentaje',
+    'Nombre Categoria', 'Nombre Genero', 'Nombre Temporada', 'Nombre Marca',
+    'Tallas', 'Stocks',
+]
+# Filas por row group del Parquet exportado (lo que se tiene en memoria a la vez)
+FILAS_POR_GRUPO_PARQUET = 10_000
+
+
+def filas_exportacion(snapshot):
+    """Filas del archivo exportado, leídas de la foto columnar del catálogo (ver snapshot.py)."""
+    columnas = snapshot.columnas
+    for i in range(len(snapshot)):
+        tallas, stocks = snapshot.stocks(i)
+        yield [
+            snapshot.texto('sku', i),
+            snapshot.texto('nombre', i),
+            snapshot.texto('descripcion', i),
+            snapshot.precio(i),
+            'Sí' if columnas['en_oferta'][i] else 'No',
+            int(columnas['descuento_porcentaje'][i]),
+            # Usamos los nombres de las relaciones, no los IDs
+            snapshot.nombre('categoria', columnas['categoria'][i]),
+            snapshot.nombre('genero', columnas['genero'][i]),
+            snapshot.nombre('temporada', columnas['temporada'][i]),
+            snapshot.nombre('marca', columnas['marca'][i]),
+            ', '.join(snapshot.nombre('talla', t) for t in tallas),
+            ', '.join(str(s) for s in stocks.tolist()),
+        ]
+
+
+class _Echo:
+    # Buffer falso: csv.writer nos devuelve cada línea en vez de guardarla
+    def write(self, value):
+        return value
+
+
+def generar_csv(snapshot):
+    writer = csv.writer(_Echo())
+    # BOM para que Excel reconozca el UTF-8 (tildes, ñ)
+    yield '\ufeff' + writer.writerow(COLUMNAS_EXPORTACION)
+    for fila in filas_exportacion(snapshot):
+        yield writer.writerow(fila)
+
+
+def escribir_xlsx(snapshot):
+    """
+    Escribe el catálogo en un libro write-only de openpyxl, que vuelca las filas
+    a disco a medida que se agregan. Devuelve el archivo temporal ya posicionado
+    al inicio para poder enviarlo por bloques.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Productos')
+    ws.append(COLUMNAS_EXPORTACION)
+    for fila in filas_exportacion(snapshot):
+        ws.append(fila)
+
+    archivo = tempfile.TemporaryFile()
+    wb.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def escribir_parquet(snapshot, motor, filas_por_grupo=FILAS_POR_GRUPO_PARQUET):
+    """
+    Parquet con las mismas columnas; se vuelve a importar sin pasar por XLSX.
+    Con pyarrow cada bloque de `filas_por_grupo` filas se escribe como un row
+    group apenas se arma, así en memoria hay un bloque y no el catálogo entero.
+    """
+    archivo = tempfile.TemporaryFile()
+    if motor == 'pyarrow':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Tipos fijos: inferidos por bloque podrían no coincidir entre row groups
+        precio = Producto._meta.get_field('precio_base')
+        tipos = {'Precio Base': pa.decimal128(precio.max_digits, precio.decimal_places), 'Descuento Porcentaje': pa.int64()}
+        esquema = pa.schema([(columna, tipos.get(columna, pa.string())) for columna in COLUMNAS_EXPORTACION])
+        with pq.ParquetWriter(archivo, esquema) as writer:
+            for bloque in _bloques(filas_exportacion(snapshot), filas_por_grupo):
+                columnas = zip(*bloque)
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(valores, type=campo.type) for campo, valores in zip(esquema, columnas)], schema=esquema,
+                ))
+    else:
+        # fastparquet no escribe row groups sueltos sobre un archivo abierto
+        df = pd.DataFrame(filas_exportacion(snapshot), columns=COLUMNAS_EXPORTACION)
+        df.to_parquet(archivo, engine=motor, index=False)
+    archivo.seek(0)
+    return archivo
+
+
+def _bloques(filas, tamano):
+    bloque = list(itertools.islice(filas, tamano))
+    while bloque:
+        yield bloque
+        bloque = list(itertools.islice(filas, tamano))
@@ -0,0 +1,65 @@
+"""
+Conteos por faceta del catálogo (navegación facetada de la tienda).
+
+Para los productos con stock que cumplen los filtros actuales cuenta cuántos
+hay por categoría, género, temporada, marca y talla, y cuántos están en
+oferta, con dos consultas agrupadas:
+- productos agrupados por (categoria, genero, temporada, marca, en_oferta):
+  cada combinación es una fila y las facetas se suman en Python;
+- filas de stock > 0 agrupadas por talla, sobre los mismos productos.
+Los nombres salen del registro de referencias en memoria.
+"""
+from collections import Counter
+
+from django.db.models import Count
+
+from .models import ProductoTallaStock, Categoria, Genero, Temporada, Marca, Talla
+from .referencias import referencias
+
+FACETAS = {'categoria': Categoria, 'genero': Genero, 'temporada': Temporada, 'marca': Marca}
+
+
+def contar_facetas(queryset):
+    """
+    {"total": n, "en_oferta": n, "categoria": [{"id", "nombre", "cantidad"}], ..., "talla": [...]}
+    para los productos de `queryset` (ya filtrado) que tienen stock.
+    """
+    # Sin orden: ORDER BY (p. ej. la relevancia de ?search=) entraría en el GROUP BY
+    productos = queryset.filter(stock_total__gt=0).order_by()
+
+    conteos = {campo: Counter() for campo in FACETAS}
+    total = en_oferta = 0
+    combinaciones = (
+        productos
+        .values(*(f'{campo}_id' for campo in FACETAS), 'en_oferta')
+        .annotate(cantidad=Count('pk'))
+    )
+    for fila in combinaciones:
+        total += fila['cantidad']
+        if fila['en_oferta']:
+            en_oferta += fila['cantidad']
+        for campo in FACETAS:
+            if fila[f'{campo}_id'] is not None:
+                conteos[campo][fila[f'{campo}_id']] += fila['cantidad']
+
+    tallas = (
+        ProductoTallaStock.objects
+        .filter(stock__gt=0, producto__in=productos.values('pk'))
+        .order_by()
+        .values('talla_id')
+        .annotate(cantidad=Count('pk'))
+    )
+
+    resultado = {'total': total, 'en_oferta': en_oferta}
+    for campo, modelo in FACETAS.items():
+        # Primero las opciones con más productos
+        valores = sorted(conteos[campo].items(), key=lambda item: (-item[1], item[0]))
+        resultado[campo] = [_opcion(modelo, pk, cantidad) for pk, cantidad in valores]
+    # Las tallas en su orden natural (el de creación: XS, S, M...)
+    resultado['talla'] = [_opcion(Talla, fila['talla_id'], fila['cantidad']) for fila in sorted(tallas, key=lambda f: f['talla_id'])]
+    return resultado
+
+
+def _opcion(modelo, pk, cantidad):
+    objeto = referencias.por_id(modelo, pk)
+    return {'id': pk, 'nombre': objeto.nombre if objeto else None, 'cantidad': cantidad}
@@ -0,0 +1,140 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .models import Marca, Producto
+
+
+def buscar_productos(queryset, termino):
+    """
+    Búsqueda de productos usando los índices de PostgreSQL:
+    - texto completo (search_vector, GIN) con coincidencia por prefijo, para
+      que "zapat" encuentre "Zapatillas" mientras el usuario escribe;
+    - fragmentos de SKU con pg_trgm (UPPER(sku) LIKE '%...%');
+    - marca, resolviendo primero los ids en la tabla pequeña de marcas para
+      no hacer un OR a través del JOIN.
+    Cada rama del OR tiene su índice, así PostgreSQL combina bitmaps en vez de
+    recorrer la tabla. Los resultados quedan ordenados por relevancia (ts_rank).
+
+    Si no hay coincidencias se intenta una búsqueda difusa por nombre
+    (similitud de trigramas por palabra) para tolerar errores de tipeo. Es más
+    cara, por eso solo se usa como segundo intento.
+    """
+    palabras = re.findall(r'\w+', termino)
+    # Lista literal de ids (y no una subconsulta) para que la rama use el índice de marca_id
+    marcas = list(Marca.objects.filter(nombre__icontains=termino).values_list('pk', flat=True))
+
+    condicion = Q(sku__icontains=termino)
+    if marcas:
+        condicion |= Q(marca_id__in=marcas)
+
+    if palabras:
+        query = SearchQuery(' & '.join(f'{p}:*' for p in palabras), search_type='raw', config='spanish')
+        resultados = (
+            queryset
+            # float8 para que el valor viaje exacto en el cursor de paginación
+            .annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+            .filter(condicion | Q(search_vector=query))
+            .order_by('-rank', 'pk')
+        )
+    else:
+        resultados = queryset.filter(condicion).order_by('pk')
+
+    if resultados.exists():
+        return resultados
+
+    return (
+        queryset
+        .annotate(similitud=Cast(TrigramWordSimilarity(termino, 'nombre'), FloatField()))
+        .filter(nombre__trigram_word_similar=termino)
+        .order_by('-similitud', 'pk')
+    )
+
+
+class BusquedaFilter(filters.BaseFilterBackend):
+    """?search= con búsqueda de texto completo + trigramas (ver buscar_productos)."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        termino = request.query_params.get(self.search_param, '').strip()
+        if not termino:
+            return queryset
+        return buscar_productos(queryset, termino)
+
+
+class ClasificacionFilter(filters.BaseFilterBackend):
+    """
+    ?categoria=, ?genero=, ?temporada=, ?marca= (ids). Las combinaciones de
+    categoria/genero/marca/en_oferta usan el índice producto_filtros_idx.
+    """
+    campos = ['categoria', 'genero', 'temporada', 'marca']
+
+    def filter_queryset(self, request, queryset, view):
+        for campo in self.campos:
+            valor = request.query_params.get(campo)
+            if valor in (None, ''):
+                continue
+            queryset = queryset.filter(**{f'{campo}_id': self._id(campo, valor)})
+        return queryset
+
+    def _id(self, campo, valor):
+        # int() y no isdigit(): '²' es un dígito pero no un número
+        try:
+            valor = int(valor)
+        except ValueError:
+            raise ValidationError({campo: 'Debe ser un id numérico.'})
+        # Fuera del rango de la columna PostgreSQL falla al comparar
+        tipo = Producto._meta.get_field(campo).target_field.get_internal_type()
+        minimo, maximo = connection.ops.integer_field_range(tipo)
+        if not max(minimo, 1) <= valor <= maximo:
+            raise ValidationError({campo: 'Debe ser un id numérico.'})
+        return valor
+
+
+class PrecioFilter(filters.BaseFilterBackend):
+    """
+    Filtra por precio final y oferta en SQL (usa la columna generada precio_final):
+    ?precio_min=, ?precio_max=, ?en_oferta=true|false
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        precio_min = self._decimal(params, 'precio_min')
+        if precio_min is not None:
+            queryset = queryset.filter(precio_final__gte=precio_min)
+
+        precio_max = self._decimal(params, 'precio_max')
+        if precio_max is not None:
+            queryset = queryset.filter(precio_final__lte=precio_max)
+
+        en_oferta = params.get('en_oferta')
+        if en_oferta is not None:
+            valor = en_oferta.strip().lower()
+            if valor not in ('true', 'false', '1', '0'):
+                raise ValidationError({'en_oferta': "Debe ser 'true' o 'false'."})
+            queryset = queryset.filter(en_oferta=valor in ('true', '1'))
+
+        return queryset
+
+    def _decimal(self, params, nombre):
+        valor = params.get(nombre)
+        if valor in (None, ''):
+            return None
+        try:
+            valor = Decimal(valor)
+        except InvalidOperation:
+            raise ValidationError({nombre: 'Debe ser un número.'})
+        # nan/Infinity/1e999999 pasan Decimal() pero PostgreSQL no los compara
+        # con la columna: se limitan a la precisión de precio_final
+        columna = Producto._meta.get_field('precio_final').output_field
+        maximo = Decimal(10) ** (columna.max_digits - columna.decimal_places)
+        if not valor.is_finite() or abs(valor) >= maximo:
+            raise ValidationError({nombre: f'Debe ser un número menor que {maximo}.'})
+        return valor
@@ -0,0 +1,64 @@
+import importlib.util
+import os
+
+# Firmas al inicio del archivo: más confiables que la extensión que mande el cliente
+FIRMAS = [
+    (b'PK\x03\x04', 'xlsx'),
+    (b'PAR1', 'parquet'),
+    (b'\xd0\xcf\x11\xe0', 'xls'),
+]
+EXTENSIONES = {
+    '.xlsx': 'xlsx', '.xlsm': 'xlsx', '.xls': 'xls',
+    '.csv': 'csv', '.txt': 'csv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+}
+NOMBRES = {'xlsx': 'Excel', 'xls': 'Excel', 'csv': 'CSV', 'parquet': 'Parquet'}
+
+
+def disponible(modulo):
+    return importlib.util.find_spec(modulo) is not None
+
+
+def motor_excel(formato='xlsx'):
+    """Motor de pandas para el Excel `formato` ('xlsx' o 'xls'), o None si no hay ninguno instalado."""
+    # calamine (python-calamine, en Rust) lee .xlsx y .xls bastante más rápido
+    # que openpyxl/xlrd; se usa si está instalado
+    if disponible('python_calamine'):
+        return 'calamine'
+    # openpyxl solo entiende .xlsx: los .xls (formato OLE) necesitan xlrd
+    if formato == 'xls':
+        return 'xlrd' if disponible('xlrd') else None
+    return 'openpyxl'
+
+
+def motor_parquet():
+    """Motor de pandas para Parquet, o None si no hay ninguno instalado."""
+    for modulo in ('pyarrow', 'fastparquet'):
+        if disponible(modulo):
+            return modulo
+    return None
+
+
+def columnas_parquet(archivo, motor):
+    """Nombres de las columnas de un Parquet, leyendo solo sus metadatos."""
+    posicion = archivo.tell()
+    try:
+        if motor == 'pyarrow':
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(archivo).schema_arrow.names
+        import fastparquet
+        return fastparquet.ParquetFile(archivo).columns
+    finally:
+        archivo.seek(posicion)
+
+
+def detectar_formato(archivo):
+    """'xlsx', 'xls', 'parquet' o 'csv', por la firma del archivo y si no por su extensión."""
+    posicion = archivo.tell()
+    cabecera = archivo.read(8)
+    archivo.seek(posicion)
+    for firma, formato in FIRMAS:
+        if cabecera.startswith(firma):
+            return formato
+    extension = os.path.splitext(getattr(archivo, 'name', '') or '')[1].lower()
+    return EXTENSIONES.get(extension, 'csv')
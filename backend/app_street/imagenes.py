@@ -0,0 +1,228 @@
+import hashlib
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .cache_catalogo import invalidar_catalogo
+from .models import ImagenProducto
+
+logger = logging.getLogger(__name__)
+
+# formato -> (formato de Pillow, extensión, opciones de compresión)
+FORMATOS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_subidas = None
+
+
+def anchos():
+    return list(getattr(settings, 'IMAGENES_ANCHOS', [200, 600, 1200]))
+
+
+def generar_versiones(contenido, anchos_deseados):
+    """
+    Devuelve {ancho: {formato: bytes}} con la imagen reducida a cada ancho.
+    No agranda: los anchos mayores que el original se omiten. Es una función
+    pura (bytes -> bytes) para poder correrla en otro proceso.
+    """
+    with Image.open(io.BytesIO(contenido)) as original:
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    resultado = {}
+    for ancho in sorted(anchos_deseados):
+        if ancho > original.width:
+            continue
+        alto = max(1, round(original.height * ancho / original.width))
+        reducida = original.resize((ancho, alto), Image.LANCZOS)
+        resultado[ancho] = {}
+        for formato, (formato_pil, _, opciones) in FORMATOS.items():
+            imagen = reducida
+            if formato_pil == 'JPEG' and imagen.mode != 'RGB':
+                imagen = _sobre_fondo_blanco(imagen)
+            elif imagen.mode not in ('RGB', 'RGBA'):
+                imagen = imagen.convert('RGBA')
+            salida = io.BytesIO()
+            imagen.save(salida, formato_pil, **opciones)
+            resultado[ancho][formato] = salida.getvalue()
+    return resultado
+
+
+def _sobre_fondo_blanco(imagen):
+    imagen = imagen.convert('RGBA')
+    fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+    fondo.paste(imagen, mask=imagen.getchannel('A'))
+    return fondo
+
+
+def guardar_versiones(imagen, versiones_generadas):
+    """Guarda los archivos junto al original (productos/foto_600.webp) y los registra en `versiones`."""
+    storage = imagen.imagen.storage
+    base, _ = posixpath.splitext(imagen.imagen.name)
+    versiones = {'origen': imagen.imagen.name}
+    for ancho, formatos in versiones_generadas.items():
+        for formato, contenido in formatos.items():
+            extension = FORMATOS[formato][1]
+            nombre = f'{base}_{ancho}.{extension}'
+            if storage.exists(nombre):
+                storage.delete(nombre)
+            versiones.setdefault(formato, {})[str(ancho)] = storage.save(nombre, ContentFile(contenido))
+
+    # update() para no disparar otra vez post_save (que volvería a encolar)
+    ImagenProducto.objects.filter(pk=imagen.pk).update(versiones=versiones)
+    imagen.versiones = versiones
+    invalidar_catalogo()
+    return versiones
+
+
+def procesar_imagen(imagen_id):
+    imagen = ImagenProducto.objects.filter(pk=imagen_id).first()
+    if imagen is None or not imagen.imagen or not imagen.necesita_versiones():
+        return None
+    with imagen.imagen.open('rb') as archivo:
+        contenido = archivo.read()
+    return guardar_versiones(imagen, generar_versiones(contenido, anchos()))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGENES_WORKERS', 2),
+            thread_name_prefix='imagenes',
+        )
+    return _executor
+
+
+def encolar_versiones(imagen_id):
+    """
+    Genera las versiones fuera del request. Con IMAGENES_VERSIONES_RUNNER =
+    'thread' (por defecto) se hace en un hilo tras el commit; con 'command'
+    quedan para `python manage.py generar_versiones_imagenes`.
+    """
+    if getattr(settings, 'IMAGENES_VERSIONES_RUNNER', 'thread') == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_procesar_en_hilo, imagen_id))
+
+
+def _procesar_en_hilo(imagen_id):
+    close_old_connections()
+    try:
+        procesar_imagen(imagen_id)
+    except Exception:
+        # La imagen original sigue sirviendo; el comando de backfill puede reintentar
+        logger.exception("Error generando versiones de la imagen %s", imagen_id)
+    finally:
+        close_old_connections()
+
+
+# --- Subida de imágenes de un producto ---
+
+def _get_executor_subidas():
+    global _executor_subidas
+    if _executor_subidas is None:
+        _executor_subidas = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGENES_SUBIDA_WORKERS', 4),
+            thread_name_prefix='subida-imagenes',
+        )
+    return _executor_subidas
+
+
+def _hash_archivo(archivo):
+    sha = hashlib.sha256()
+    for bloque in archivo.chunks():
+        sha.update(bloque)
+    archivo.seek(0)
+    return sha.hexdigest()
+
+
+def _guardar_archivo(archivo):
+    campo = ImagenProducto._meta.get_field('imagen')
+    nombre = campo.generate_filename(None, archivo.name)
+    return campo.storage.save(nombre, archivo, max_length=campo.max_length)
+
+
+def agregar_imagenes(producto, archivos):
+    """
+    Agrega `archivos` (UploadedFile) al final de las imágenes del producto
+    (si no tenía, la primera queda como principal).
+    Los hashes y las escrituras al storage se hacen en paralelo en un pool de
+    hilos, y las filas se insertan con un solo bulk_create.
+
+    Una subida idéntica a una imagen ya guardada (de cualquier producto)
+    reutiliza ese archivo y sus versiones; si el producto ya la tenía, se omite.
+    """
+    if not archivos:
+        return []
+    pool = _get_executor_subidas()
+    hashes = list(pool.map(_hash_archivo, archivos))
+
+    guardadas = {}
+    del_producto = set()
+    for hash_, nombre, versiones, producto_id in (
+        ImagenProducto.objects
+        .filter(hash_contenido__in=set(hashes))
+        .exclude(imagen='')
+        .order_by('pk')
+        .values_list('hash_contenido', 'imagen', 'versiones', 'producto_id')
+    ):
+        guardadas.setdefault(hash_, (nombre, versiones))
+        if producto_id == producto.pk:
+            del_producto.add(hash_)
+
+    # Un solo archivo por contenido, aunque venga repetido en la misma subida
+    por_subir = {}
+    for hash_, archivo in zip(hashes, archivos):
+        if hash_ not in guardadas and hash_ not in del_producto:
+            por_subir.setdefault(hash_, archivo)
+    for hash_, nombre in zip(por_subir, pool.map(_guardar_archivo, por_subir.values())):
+        guardadas[hash_] = (nombre, {})
+
+    siguiente = max(producto.imagenes.values_list('orden', flat=True), default=-1) + 1
+    nuevas = []
+    for hash_ in dict.fromkeys(hashes):
+        if hash_ in del_producto:
+            continue
+        nombre, versiones = guardadas[hash_]
+        nuevas.append(ImagenProducto(
+            producto=producto, imagen=nombre, hash_contenido=hash_, versiones=versiones,
+            orden=siguiente, principal=siguiente == 0,
+        ))
+        siguiente += 1
+    ImagenProducto.objects.bulk_create(nuevas)
+
+    # bulk_create no dispara post_save: encolamos aquí las versiones que falten
+    for imagen in nuevas:
+        if imagen.necesita_versiones():
+            encolar_versiones(imagen.pk)
+    invalidar_catalogo()
+    return nuevas
+
+
+def ordenar_imagenes(producto, ids=()):
+    """
+    Renumera las imágenes del producto: primero las de `ids` en ese orden y
+    luego el resto como estaban. La primera queda como principal.
+    """
+    imagenes = list(producto.imagenes.order_by('orden', 'id'))
+    posicion = {pk: i for i, pk in enumerate(ids)}
+    imagenes.sort(key=lambda img: (0, posicion[img.pk]) if img.pk in posicion else (1, 0))
+
+    cambiadas = []
+    for orden, imagen in enumerate(imagenes):
+        principal = orden == 0
+        if imagen.orden != orden or imagen.principal != principal:
+            imagen.orden, imagen.principal = orden, principal
+            cambiadas.append(imagen)
+    ImagenProducto.objects.bulk_update(cambiadas, ['orden', 'principal'])
+    if cambiadas:
+        invalidar_catalogo()
+    return imagenes
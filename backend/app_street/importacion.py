@@ -0,0 +1,391 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_catalogo import invalidar_catalogo
+from .formatos import NOMBRES, columnas_parquet, detectar_formato, motor_excel, motor_parquet
+from .referencias import normalizar, referencias
+from .stock import sincronizar_stock
+
+from .models import Producto, ProductoTallaStock, Categoria, Genero, Temporada, Marca, Talla
+
+# Columnas requeridas, usando nombres en lugar de IDs
+COLUMNAS_REQUERIDAS = [
+    'SKU', 'Nombre', 'Precio Base', 'Tallas', 'Stocks',
+    'Nombre Categoria', 'Nombre Genero', 'Nombre Temporada', 'Nombre Marca',
+]
+
+CAMPOS_PRODUCTO = ['nombre', 'precio_base', 'descripcion', 'categoria', 'genero', 'temporada', 'marca']
+
+# Columna del Excel -> (campo del producto, modelo de clasificación)
+CLASIFICACIONES = [
+    ('Nombre Categoria', 'categoria', Categoria),
+    ('Nombre Genero', 'genero', Genero),
+    ('Nombre Temporada', 'temporada', Temporada),
+    ('Nombre Marca', 'marca', Marca),
+]
+
+
+class ErrorImportacion(Exception):
+    """Error que invalida el archivo completo (no se puede leer, faltan columnas...)."""
+
+
+# Únicas columnas que se leen del archivo: las demás (p. ej. las que agrega la
+# exportación) se saltan al parsear
+COLUMNAS_LECTURA = COLUMNAS_REQUERIDAS + ['Descripcion']
+
+
+def leer_dataframe(archivo, formato=None, motor=None):
+    """
+    Lee un archivo .xlsx/.xls, .csv o .parquet (detectado por su contenido si no
+    se indica `formato`). Solo se leen COLUMNAS_LECTURA y todo como texto: la
+    validación hace las conversiones, y así un SKU numérico no se vuelve '123.0'.
+    """
+    formato = formato or detectar_formato(archivo)
+    # Solo las celdas vacías cuentan como faltantes ('NA' o 'None' son texto válido)
+    texto = {'usecols': lambda columna: columna in COLUMNAS_LECTURA, 'dtype': str, 'keep_default_na': False, 'na_values': ['']}
+    try:
+        if formato == 'csv':
+            # utf-8-sig: la exportación escribe un BOM para Excel
+            df = pd.read_csv(archivo, encoding='utf-8-sig', **texto)
+        elif formato == 'parquet':
+            if motor_parquet() is None:
+                raise ErrorImportacion("El servidor no puede leer archivos Parquet (falta pyarrow).")
+            motor = motor or motor_parquet()
+            # Formato columnar: se leen solo las columnas usadas (Descripcion puede no venir)
+            existentes = columnas_parquet(archivo, motor)
+            df = pd.read_parquet(archivo, engine=motor, columns=[col for col in COLUMNAS_LECTURA if col in existentes])
+        else:
+            motor = motor or motor_excel(formato)
+            if motor is None:
+                raise ErrorImportacion("El servidor no puede leer archivos .xls (falta xlrd); guárdalo como .xlsx o .csv.")
+            df = pd.read_excel(archivo, engine=motor, **texto)
+    except ErrorImportacion:
+        raise
+    except Exception as e:
+        raise ErrorImportacion(f"Error al leer el archivo {NOMBRES[formato]}: {str(e)}")
+
+    if not all(col in df.columns for col in COLUMNAS_REQUERIDAS):
+        missing_cols = [col for col in COLUMNAS_REQUERIDAS if col not in df.columns]
+        raise ErrorImportacion(f"Faltan las siguientes columnas requeridas: {', '.join(missing_cols)}")
+
+    return df
+
+
+def _texto(df, columna):
+    # Como str(celda).strip(), pero con las celdas vacías (NaN) como ''
+    if columna not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    serie = df[columna]
+    return serie.astype(str).where(serie.notna(), '').str.strip()
+
+
+def _partes(df, columna):
+    # "S, M ,L" -> una fila por valor, con el índice de la fila de origen y sin vacíos
+    partes = _texto(df, columna).str.split(r'\s*,\s*', regex=True).explode()
+    return partes[partes.notna() & (partes != '')]
+
+
+def _buscar(serie, mapa):
+    # Busca cada valor distinto una sola vez (las columnas de nombres repiten mucho)
+    codigos, unicos = pd.factorize(serie)
+    encontrados = np.array([mapa.get(normalizar(valor)) for valor in unicos] + [None], dtype=object)
+    return pd.Series(encontrados[codigos], index=serie.index)
+
+
+class ImportadorProductos:
+    """
+    Importa productos desde un DataFrame trabajando por conjuntos: las tablas de
+    clasificación y las tallas se cargan una sola vez en memoria, los SKU
+    existentes se leen en una sola consulta y los cambios se escriben con
+    bulk_create/bulk_update en lotes de `batch_size`.
+
+    Si se pasa `progreso`, se llama como progreso(total=..., errores=...) al
+    terminar la validación y, en importar(), como progreso(procesadas=...,
+    creados=..., actualizados=..., sin_cambios=...) después de escribir cada
+    lote, con los totales acumulados.
+    """
+
+    def __init__(self, batch_size=None, progreso=None):
+        self.batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+        self.progreso = progreso
+
+    def importar(self, df, dry_run=False):
+        """
+        Importa el archivo completo en una sola transacción. Con dry_run=True
+        solo valida y agrega en results["diff"] lo que cambiaría, sin escribir.
+        """
+        results = {"created": 0, "updated": 0, "unchanged": 0, "errors": []}
+        filas = self.validar(df, results["errors"])
+
+        if dry_run:
+            results["diff"] = self.diferencias(filas, results)
+        # Si hay errores de validación no se escribe nada
+        elif not results["errors"]:
+            with transaction.atomic():
+                for inicio in range(0, len(filas), self.batch_size):
+                    lote = filas[inicio:inicio + self.batch_size]
+                    self.aplicar(lote, results)
+                    if self.progreso:
+                        self.progreso(
+                            procesadas=inicio + len(lote), creados=results["created"],
+                            actualizados=results["updated"], sin_cambios=results["unchanged"],
+                        )
+
+        return results
+
+    def importar_por_lotes(self, df, filas_por_lote, desde=0, checkpoint=None):
+        """
+        Como importar(), pero confirma cada `filas_por_lote` filas en su propia
+        transacción: los locks duran lo que dura un lote y si algo falla a mitad
+        de camino lo ya confirmado se conserva.
+
+        `checkpoint(filas_confirmadas, results)` se llama dentro de la
+        transacción de cada lote, para guardar el avance junto con los datos;
+        `desde` salta las filas que ya confirmó una ejecución anterior.
+        """
+        results = {"created": 0, "updated": 0, "unchanged": 0, "errors": []}
+        filas = self.validar(df, results["errors"])
+        # Se valida el archivo completo antes de escribir el primer lote; sin
+        # errores, cada fila válida es una fila del archivo y `desde` sirve de índice
+        if results["errors"]:
+            return results
+
+        for inicio in range(desde, len(filas), filas_por_lote):
+            lote = filas[inicio:inicio + filas_por_lote]
+            with transaction.atomic():
+                self.aplicar(lote, results)
+                if checkpoint:
+                    checkpoint(inicio + len(lote), results)
+        return results
+
+    def validar(self, df, errores):
+        """
+        Devuelve las filas válidas ya normalizadas y agrega a `errores` las inválidas.
+
+        Las validaciones se hacen por columnas (operaciones de pandas sobre el
+        archivo completo) y no fila por fila; cada fila se queda con el primer
+        error que encuentre, en el mismo orden en que se revisaban antes.
+        """
+        total = len(df)
+        numero = pd.Series(df.index + 2).astype(str)
+        df = df.reset_index(drop=True)
+        error = pd.Series(None, index=df.index, dtype=object)
+        sin_error = np.ones(total, dtype=bool)
+
+        def marcar(mascara, *partes):
+            # El mensaje se arma solo para las filas que todavía no tenían error
+            nuevas = np.asarray(mascara, dtype=bool) & sin_error
+            if not nuevas.any():
+                return
+            indices = df.index[nuevas]
+            mensaje = 'Fila ' + numero[indices] + ': '
+            for parte in partes:
+                mensaje = mensaje + (parte.reindex(indices).astype(str) if isinstance(parte, pd.Series) else parte)
+            error[indices] = mensaje
+            sin_error[nuevas] = False
+
+        sku = _texto(df, 'SKU')
+        marcar(sku == '', 'El SKU es obligatorio.')
+
+        # "S, M" -> una fila por talla/stock, indexada por la fila del archivo
+        tallas = _partes(df, 'Tallas')
+        stocks = _partes(df, 'Stocks')
+        n_tallas = tallas.groupby(level=0).size().reindex(df.index, fill_value=0)
+        n_stocks = stocks.groupby(level=0).size().reindex(df.index, fill_value=0)
+        marcar(
+            n_tallas != n_stocks,
+            'El número de tallas (', n_tallas, ') no coincide con el de stocks (', n_stocks, ') para el SKU ', sku, '.',
+        )
+
+        # Igual que int(): solo dígitos con signo opcional, y además no negativos
+        enteros = stocks.str.fullmatch(r'[+-]?\d+').astype(bool)
+        cantidades = pd.to_numeric(stocks.where(enteros), errors='coerce')
+        stock_invalido = (~enteros | (cantidades < 0)).groupby(level=0).any().reindex(df.index, fill_value=False)
+        marcar(stock_invalido, 'Los Stocks deben ser números enteros positivos para el SKU ', sku, '.')
+
+        # Nombres -> objetos desde el registro en memoria (sin distinguir mayúsculas)
+        clasificacion = {}
+        for columna, campo, modelo in CLASIFICACIONES:
+            clasificacion[campo] = _buscar(df[columna], referencias.mapa_por_nombre(modelo))
+            marcar(
+                clasificacion[campo].isna(),
+                f"No se encontró un valor para '{modelo.__name__}' con el nombre proporcionado para el SKU ", sku, '.',
+            )
+
+        talla_ids = _buscar(tallas, {nombre: talla.pk for nombre, talla in referencias.mapa_por_nombre(Talla).items()})
+        invalidas = tallas[talla_ids.isna()].groupby(level=0).agg(', '.join)
+        marcar(df.index.isin(invalidas.index), 'Tallas inválidas: ', invalidas, ' para el SKU ', sku, '.')
+
+        precio = pd.to_numeric(df['Precio Base'], errors='coerce').astype(float)
+        marcar(~np.isfinite(precio), 'El Precio Base debe ser un número para el SKU ', sku, '.')
+        marcar(precio < 0, 'El Precio Base no puede ser negativo para el SKU ', sku, '.')
+        # Lo que entra en la columna: DecimalField(max_digits, decimal_places)
+        campo = Producto._meta.get_field('precio_base')
+        marcar(
+            (precio.abs() >= 10 ** (campo.max_digits - campo.decimal_places)) | (precio.round(campo.decimal_places) != precio),
+            f'El Precio Base admite hasta {campo.max_digits - campo.decimal_places} dígitos enteros y '
+            f'{campo.decimal_places} decimales para el SKU ', sku, '.',
+        )
+
+        # Un SKU repetido dejaría en duda cuál de las filas vale
+        repetido = (sku != '') & sku.duplicated()
+        primera = numero.groupby(sku.to_numpy()).transform('first')
+        marcar(repetido, 'El SKU ', sku, ' está repetido en el archivo (aparece primero en la fila ', primera, ').')
+
+        errores.extend(error.dropna().tolist())
+
+        # En las filas válidas hay tantas tallas como stocks, en el mismo orden
+        indices = df.index[sin_error]
+        talla_ids = talla_ids[talla_ids.index.isin(indices)].astype('int64')
+        cantidades = cantidades[cantidades.index.isin(indices)].astype('int64')
+        stocks_por_fila = {}
+        for i, talla_id, cantidad in zip(talla_ids.index, talla_ids.tolist(), cantidades.tolist()):
+            # Si una talla se repite en la fila, gana el último stock
+            stocks_por_fila.setdefault(i, {})[talla_id] = cantidad
+
+        nombre = _texto(df, 'Nombre')
+        descripcion = _texto(df, 'Descripcion')
+        filas = [
+            {
+                'sku': sku_,
+                'campos': {
+                    'nombre': nombre_,
+                    'precio_base': precio_,
+                    'descripcion': descripcion_,
+                    'categoria': categoria, 'genero': genero, 'temporada': temporada, 'marca': marca,
+                },
+                'stocks': stocks_por_fila.get(i, {}),
+            }
+            for i, sku_, nombre_, precio_, descripcion_, categoria, genero, temporada, marca in zip(
+                indices, sku[indices].tolist(), nombre[indices].tolist(), precio[indices].astype(float).tolist(),
+                descripcion[indices].tolist(), *(clasificacion[campo][indices].tolist() for _, campo, _ in CLASIFICACIONES),
+            )
+        ]
+
+        if self.progreso:
+            self.progreso(total=total, errores=list(errores))
+        return filas
+
+    def aplicar(self, filas, results):
+        # validar() ya rechaza los SKU repetidos dentro del archivo
+        por_sku = {fila['sku']: fila for fila in filas}
+        existentes = {p.sku: p for p in Producto.objects.filter(sku__in=por_sku)}
+
+        nuevos, modificados, sin_cambios = [], [], []
+        for sku, fila in por_sku.items():
+            producto = existentes.get(sku)
+            if producto is None:
+                nuevos.append(Producto(sku=sku, **fila['campos']))
+                continue
+            cambios = _cambios(producto, fila['campos'])
+            for campo in cambios:
+                setattr(producto, campo, fila['campos'][campo])
+            (modificados if cambios else sin_cambios).append(producto)
+
+        Producto.objects.bulk_create(nuevos, batch_size=self.batch_size)
+        # Solo se escriben los productos que cambiaron. bulk_update no aplica
+        # auto_now: fijamos la marca de cambio a mano
+        ahora = timezone.now()
+        for producto in modificados:
+            producto.fecha_modificacion = ahora
+        Producto.objects.bulk_update(modificados, CAMPOS_PRODUCTO + ['fecha_modificacion'], batch_size=self.batch_size)
+
+        # Solo se escriben las tallas/stocks que cambiaron respecto a la base;
+        # sincronizar_stock recalcula stock_total de los productos afectados
+        con_stock_nuevo = sincronizar_stock(
+            {p.pk: por_sku[p.sku]['stocks'] for p in modificados + sin_cambios}, batch_size=self.batch_size,
+        )
+        sincronizar_stock({p.pk: por_sku[p.sku]['stocks'] for p in nuevos}, batch_size=self.batch_size, nuevos=True)
+        invalidar_catalogo()
+
+        actualizados = len(modificados) + sum(1 for p in sin_cambios if p.pk in con_stock_nuevo)
+        results["created"] += len(nuevos)
+        results["updated"] += actualizados
+        results["unchanged"] += len(existentes) - actualizados
+
+    def diferencias(self, filas, results):
+        """
+        Lo que haría importar() con `filas`, sin escribir:
+        {"crear": [sku], "actualizar": [{"sku", "cambios"}], "sin_cambios": [sku]},
+        donde cambios es {campo: [antes, después]} y cambios["stock"] es
+        {talla: [antes, después]} (None si la talla no existe en ese lado).
+        """
+        diff = {"crear": [], "actualizar": [], "sin_cambios": []}
+        skus = [fila['sku'] for fila in filas]
+        existentes = {}
+        stocks = {}
+        for i in range(0, len(skus), self.batch_size):
+            lote = {p.sku: p for p in Producto.objects.filter(sku__in=skus[i:i + self.batch_size])}
+            existentes.update(lote)
+            for producto_id, talla_id, stock in ProductoTallaStock.objects.filter(
+                producto_id__in=[p.pk for p in lote.values()]
+            ).order_by().values_list('producto_id', 'talla_id', 'stock'):
+                stocks.setdefault(producto_id, {})[talla_id] = stock
+
+        for fila in filas:
+            producto = existentes.get(fila['sku'])
+            if producto is None:
+                diff["crear"].append(fila['sku'])
+                continue
+            cambios = {
+                campo: [_mostrar(campo, antes), _mostrar(campo, fila['campos'][campo])]
+                for campo, antes in _cambios(producto, fila['campos']).items()
+            }
+            antes, despues = stocks.get(producto.pk, {}), fila['stocks']
+            stock = {
+                referencias.por_id(Talla, talla_id).nombre: [antes.get(talla_id), despues.get(talla_id)]
+                for talla_id in sorted(antes.keys() | despues.keys())
+                if antes.get(talla_id) != despues.get(talla_id)
+            }
+            if stock:
+                cambios['stock'] = stock
+            if cambios:
+                diff["actualizar"].append({"sku": fila['sku'], "cambios": cambios})
+            else:
+                diff["sin_cambios"].append(fila['sku'])
+
+        results["created"] += len(diff["crear"])
+        results["updated"] += len(diff["actualizar"])
+        results["unchanged"] += len(diff["sin_cambios"])
+        return diff
+
+
+# Campo del producto -> modelo de clasificación
+MODELOS_CLASIFICACION = {campo: modelo for _, campo, modelo in CLASIFICACIONES}
+
+
+def _cambios(producto, campos):
+    """{campo: valor actual} de los campos de `campos` que difieren del producto (sin consultar la base)."""
+    cambios = {}
+    for campo, valor in campos.items():
+        if campo in MODELOS_CLASIFICACION:
+            actual = getattr(producto, f'{campo}_id')
+            if actual != valor.pk:
+                cambios[campo] = actual
+        elif campo == 'precio_base':
+            if producto.precio_base != _precio(valor):
+                cambios[campo] = producto.precio_base
+        # Un texto NULL en la base equivale a una celda vacía
+        elif (getattr(producto, campo) or '') != valor:
+            cambios[campo] = getattr(producto, campo)
+    return cambios
+
+
+def _precio(valor):
+    # Como lo guardaría el DecimalField (2 decimales)
+    return Decimal(str(valor)).quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN)
+
+
+def _mostrar(campo, valor):
+    # Valores del diff en JSON: nombres para las clasificaciones, texto para el precio
+    if campo in MODELOS_CLASIFICACION:
+        objeto = valor if hasattr(valor, 'pk') else referencias.por_id(MODELOS_CLASIFICACION[campo], valor)
+        return objeto.nombre if objeto else None
+    if campo == 'precio_base':
+        return str(_precio(valor))
+    return valor
@@ -0,0 +1,185 @@
+"""
+Métricas por petición: tiempo total, consultas SQL y tiempo en la base de
+datos (con connection.execute_wrapper), más las etapas que se midan con
+`medir()` (p. ej. la serialización a JSON). Se registran en una línea de
+log JSON por petición y se envían en la cabecera Server-Timing a quien
+permita INSTRUMENTACION_SERVER_TIMING (por defecto solo a usuarios staff).
+
+Solo suma contadores y llama a perf_counter por consulta, así que puede
+quedar activo en producción (INSTRUMENTACION_ACTIVA).
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+_actual = ContextVar('metricas_peticion', default=None)
+
+
+class MetricasPeticion:
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.etapas = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: se llama en cada consulta de la conexión
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def metricas_actuales():
+    """Métricas de la petición en curso, o None fuera de una petición instrumentada."""
+    return _actual.get()
+
+
+@contextmanager
+def medir(etapa):
+    """Suma el tiempo del bloque a la etapa `etapa` de la petición en curso (si la hay)."""
+    metricas = _actual.get()
+    if metricas is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        metricas.etapas[etapa] = metricas.etapas.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+class JSONRendererMedido(JSONRenderer):
+    """JSONRenderer que registra su tiempo como etapa 'serializacion' (si INSTRUMENTACION_SERIALIZACION)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not getattr(settings, 'INSTRUMENTACION_SERIALIZACION', True):
+            return super().render(data, accepted_media_type, renderer_context)
+        with medir('serializacion'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def _server_timing():
+    # True: a todos; 'staff': solo a usuarios staff; False: a nadie (el log no cambia)
+    return getattr(settings, 'INSTRUMENTACION_SERVER_TIMING', 'staff')
+
+
+def _mostrar_server_timing(request):
+    """
+    Se decide una vez, antes de atender la petición: con 'staff' el usuario se
+    lee de la sesión (este middleware corre antes que SessionMiddleware y
+    AuthenticationMiddleware) y se deja en la caché de esta última, así
+    request.user no lo vuelve a consultar.
+    """
+    if _server_timing() != 'staff':
+        return bool(_server_timing())
+    clave = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if clave is None:
+        return False
+    sesion = import_module(settings.SESSION_ENGINE).SessionStore(clave)
+    usuario = auth.get_user(SimpleNamespace(session=sesion))
+    request._cached_user = request._acached_user = usuario
+    return usuario.is_staff
+
+
+class InstrumentacionMiddleware:
+    """
+    Debe ir primero en MIDDLEWARE para que el total incluya al resto. Con
+    INSTRUMENTACION_SERVER_TIMING = 'staff' el usuario se reconoce por la
+    sesión (no por la autenticación de DRF, que corre dentro de la vista).
+
+    Si una petición hace más de INSTRUMENTACION_PRESUPUESTO_CONSULTAS consultas
+    se registra como WARNING (típicamente un N+1 que volvió). En las respuestas
+    por streaming solo se mide hasta que empieza el envío.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        server_timing = _mostrar_server_timing(request)
+        metricas, token, inicio = self._iniciar()
+        try:
+            with self._contar_consultas(metricas):
+                response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        return self._terminar(request, response, metricas, inicio, server_timing)
+
+    async def __acall__(self, request):
+        server_timing = await sync_to_async(_mostrar_server_timing)(request)
+        metricas, token, inicio = self._iniciar()
+        # Las conexiones son por hilo: el wrapper se instala en el hilo donde
+        # sync_to_async ejecuta el ORM de esta petición (uno por petición en ASGI)
+        pila = ExitStack()
+        try:
+            await sync_to_async(pila.enter_context)(self._contar_consultas(metricas))
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+            _actual.reset(token)
+        return self._terminar(request, response, metricas, inicio, server_timing)
+
+    def _iniciar(self):
+        metricas = MetricasPeticion()
+        return metricas, _actual.set(metricas), time.perf_counter()
+
+    @contextmanager
+    def _contar_consultas(self, metricas):
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(metricas))
+            yield
+
+    def _terminar(self, request, response, metricas, inicio, server_timing):
+        total = time.perf_counter() - inicio
+        presupuesto = getattr(settings, 'INSTRUMENTACION_PRESUPUESTO_CONSULTAS', 30)
+        excedido = presupuesto is not None and metricas.consultas > presupuesto
+
+        tiempos = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={metricas.tiempo_db * 1000:.1f};desc="{metricas.consultas} consultas"',
+        ]
+        tiempos += [f'{etapa};dur={duracion * 1000:.1f}' for etapa, duracion in metricas.etapas.items()]
+        if server_timing:
+            response['Server-Timing'] = ', '.join(tiempos)
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        registro = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': coincidencia.view_name if coincidencia else None,
+            'estado': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(metricas.tiempo_db * 1000, 1),
+            'consultas': metricas.consultas,
+            **{f'{etapa}_ms': round(duracion * 1000, 1) for etapa, duracion in metricas.etapas.items()},
+        }
+        if excedido:
+            registro['presupuesto_consultas'] = presupuesto
+            logger.warning(json.dumps(registro, ensure_ascii=False), extra={'metricas': registro})
+        else:
+            logger.info(json.dumps(registro, ensure_ascii=False), extra={'metricas': registro})
+        return response
@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework import filters
+from rest_framework.request import Request
+
+from app_street.filters import buscar_productos
+from app_street.models import Producto, Marca
+
+PALABRAS = [
+    "Polo", "Polera", "Zapatillas", "Pantalón", "Casaca", "Gorra", "Oversize", "Cargo",
+    "Runner", "Street", "Urban", "Classic", "Retro", "Negro", "Blanco", "Algodón",
+    "Denim", "Hoodie", "Jogger", "Skate", "Air", "Boost", "Premium", "Vintage",
+]
+TERMINOS = ["zapat", "polo over", "nike", "air-0", "hodie", "skate retro negro"]
+
+
+class _VistaAnterior:
+    # Configuración que tenía ProductViewSet con SearchFilter (ILIKE '%term%' con OR)
+    search_fields = ['nombre', 'sku', 'descripcion', 'marca__nombre']
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia de la búsqueda actual (tsvector + pg_trgm) con el SearchFilter anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000, help='Productos sintéticos a generar')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Veces que se ejecuta cada búsqueda')
+        parser.add_argument('--limite', type=int, default=50, help='Resultados leídos por búsqueda (0 = todos, como la API sin paginar)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Todo ocurre dentro de una transacción que se revierte al final
+        with transaction.atomic():
+            self.generar_catalogo(options['productos'], options['seed'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE app_street_producto')
+
+            self.stdout.write(f"{'término':<22}{'anterior p50':>14}{'p95':>10}{'nuevo p50':>14}{'p95':>10}{'mejora':>9}")
+            for termino in TERMINOS:
+                anterior = self.medir(self.busqueda_anterior(termino), options)
+                nuevo = self.medir(buscar_productos(Producto.objects.all(), termino), options)
+                self.stdout.write(
+                    f"{termino:<22}{anterior[0]:>12.2f}ms{anterior[1]:>8.2f}ms"
+                    f"{nuevo[0]:>12.2f}ms{nuevo[1]:>8.2f}ms{anterior[0] / nuevo[0]:>8.1f}x"
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('--- Benchmark finalizado (datos sintéticos revertidos) ---'))
+
+    def generar_catalogo(self, cantidad, seed):
+        rng = random.Random(seed)
+        marcas = [Marca.objects.get_or_create(nombre=n)[0] for n in ("Nike", "Adidas", "StreetForce", "UrbanStyle", "Supreme")]
+        # Vocabulario amplio de palabras inventadas para que las descripciones no
+        # repitan siempre los mismos términos (como en un catálogo real)
+        silabas = ['ka', 'lo', 'mi', 'tra', 'ven', 'sor', 'qui', 'ba', 'den', 'ru', 'fle', 'xo']
+        vocabulario = [''.join(rng.choices(silabas, k=rng.randint(2, 4))) for _ in range(5000)]
+        self.stdout.write(f'Generando {cantidad} productos sintéticos...')
+
+        lote = []
+        for i in range(cantidad):
+            lote.append(Producto(
+                sku=f'BENCH-{rng.choice(["NK", "AD", "SF", "US"])}-{i:07d}',
+                nombre=' '.join(rng.sample(PALABRAS, 2) + [rng.choice(vocabulario).capitalize()]),
+                descripcion=' '.join(rng.choices(vocabulario, k=12) + rng.choices(PALABRAS, k=1)),
+                precio_base=rng.randint(20, 500),
+                marca=rng.choice(marcas),
+            ))
+            if len(lote) == 5000:
+                Producto.objects.bulk_create(lote)
+                lote = []
+        Producto.objects.bulk_create(lote)
+
+    def busqueda_anterior(self, termino):
+        request = Request(RequestFactory().get('/api/productos/', {'search': termino}))
+        return filters.SearchFilter().filter_queryset(request, Producto.objects.all(), _VistaAnterior())
+
+    def medir(self, queryset, options):
+        queryset = queryset.values_list('pk', 'nombre')
+        if options['limite']:
+            queryset = queryset[:options['limite']]
+        tiempos = []
+        for _ in range(options['repeticiones']):
+            inicio = time.perf_counter()
+            list(queryset.all())  # .all() evita la caché del queryset
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
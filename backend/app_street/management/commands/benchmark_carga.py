@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import json
+import ssl
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_catalogo import percentil
+
+RUTAS = {
+    # Mismas consultas por las dos vías: DRF síncrono (WSGI) y vistas async (ASGI)
+    'wsgi': ['/api/productos/', '/api/productos/?search=hoodie', '/api/productos/?page_size=20&en_oferta=true'],
+    'asgi': ['/api/async/productos/', '/api/async/productos/?search=hoodie', '/api/async/productos/?page_size=20&en_oferta=true'],
+}
+
+
+class ErrorHTTP(Exception):
+    pass
+
+
+async def leer_respuesta(reader):
+    """(estado, cerrar) de una respuesta HTTP/1.1; el cuerpo se lee y se descarta."""
+    linea = await reader.readline()
+    if not linea:
+        raise ErrorHTTP('conexión cerrada por el servidor')
+    estado = int(linea.split()[1])
+    cabeceras = {}
+    while (linea := await reader.readline()) not in (b'\r\n', b'\n', b''):
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        cabeceras[nombre.strip().lower()] = valor.strip()
+
+    if cabeceras.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            largo = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(largo + 2)
+            if largo == 0:
+                break
+    elif 'content-length' in cabeceras:
+        await reader.readexactly(int(cabeceras['content-length']))
+    else:
+        await reader.read()
+        return estado, True
+    return estado, cabeceras.get('connection', '').lower() == 'close'
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga HTTP contra un servidor en marcha (muchas conexiones keep-alive concurrentes). '
+        'Para comparar despliegues: levantar el mismo número de workers con '
+        '"gunicorn proyecto_street.wsgi" y con "uvicorn proyecto_street.asgi:application", '
+        'y correr --via wsgi y --via asgi contra cada uno'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor a probar')
+        parser.add_argument('--via', choices=sorted(RUTAS), default='wsgi', help='Rutas del API síncrono o del async')
+        parser.add_argument('--rutas', help='Rutas propias separadas por coma (reemplaza las de --via)')
+        parser.add_argument('--conexiones', type=int, default=200, help='Conexiones concurrentes')
+        parser.add_argument('--duracion', type=float, default=20, help='Segundos de medición')
+        parser.add_argument('--calentamiento', type=float, default=3, help='Segundos previos que no se miden')
+        parser.add_argument('--timeout', type=float, default=30, help='Segundos máximos por petición')
+        parser.add_argument('--salida', help='Archivo JSON de resultados')
+        parser.add_argument('--comparar', help='JSON de otra ejecución (p. ej. la de WSGI) para comparar')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise CommandError('--url debe ser http://host:puerto o https://host:puerto')
+        if options['conexiones'] < 1 or options['duracion'] <= 0:
+            raise CommandError('--conexiones y --duracion deben ser positivos.')
+        rutas = [r.strip() for r in options['rutas'].split(',')] if options['rutas'] else RUTAS[options['via']]
+
+        self.stdout.write(
+            f"{options['conexiones']} conexiones contra {options['url']} durante {options['duracion']:.0f} s "
+            f"({len(rutas)} rutas)..."
+        )
+        tiempos, estados, errores, segundos = asyncio.run(self.carga(url, rutas, options))
+
+        todos = [t for lista in tiempos.values() for t in lista]
+        if not todos:
+            raise CommandError(f'Ninguna petición terminó: {dict(errores) or "sin respuesta"}')
+        informe = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'url': options['url'],
+            'via': 'rutas propias' if options['rutas'] else options['via'],
+            'conexiones': options['conexiones'],
+            'duracion_s': round(segundos, 2),
+            'total': self.resumen(todos, segundos),
+            'rutas': {ruta: self.resumen(tiempos[ruta], segundos) for ruta in rutas if tiempos[ruta]},
+            'estados': {str(codigo): cantidad for codigo, cantidad in sorted(estados.items())},
+            'errores': dict(errores),
+        }
+
+        self.stdout.write(f"{'ruta':<52}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9} ms")
+        for ruta, r in [*informe['rutas'].items(), ('TOTAL', informe['total'])]:
+            self.stdout.write(
+                f"{ruta[:51]:<52}{r['req_s']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+            )
+        self.stdout.write(f"Estados: {informe['estados']}  Errores: {informe['errores'] or 'ninguno'}")
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as f:
+                anterior = json.load(f)
+            a, b = anterior['total'], informe['total']
+            self.stdout.write(
+                f"Frente a {anterior['via']} ({anterior['url']}): "
+                f"req/s {a['req_s']:.1f} -> {b['req_s']:.1f} ({b['req_s'] / a['req_s']:.2f}x), "
+                f"p99 {a['p99_ms']:.1f} -> {b['p99_ms']:.1f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS('--- Prueba de carga finalizada ---'))
+
+    def resumen(self, tiempos, segundos):
+        return {
+            'peticiones': len(tiempos),
+            'req_s': round(len(tiempos) / segundos, 1),
+            'p50_ms': round(percentil(tiempos, 50), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'p99_ms': round(percentil(tiempos, 99), 2),
+            'max_ms': round(max(tiempos), 2),
+        }
+
+    async def carga(self, url, rutas, options):
+        tiempos, estados, errores = defaultdict(list), Counter(), Counter()
+        ahora = time.perf_counter()
+        desde = ahora + options['calentamiento']
+        hasta = desde + options['duracion']
+        # Cada conexión arranca en una ruta distinta para repartir la carga
+        ciclos = [itertools.islice(itertools.cycle(rutas), i % len(rutas), None) for i in range(options['conexiones'])]
+        await asyncio.gather(*(
+            self.conexion(url, ciclo, desde, hasta, options['timeout'], tiempos, estados, errores) for ciclo in ciclos
+        ))
+        return tiempos, estados, errores, options['duracion']
+
+    async def conexion(self, url, rutas, desde, hasta, timeout, tiempos, estados, errores):
+        puerto = url.port or (443 if url.scheme == 'https' else 80)
+        contexto = ssl.create_default_context() if url.scheme == 'https' else None
+        host = url.netloc
+        reader = writer = None
+        for ruta in rutas:
+            if time.perf_counter() >= hasta:
+                break
+            inicio = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(url.hostname, puerto, ssl=contexto), timeout,
+                    )
+                writer.write(
+                    f'GET {ruta} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n'
+                    f'Connection: keep-alive\r\n\r\n'.encode('latin-1')
+                )
+                await writer.drain()
+                estado, cerrar = await asyncio.wait_for(leer_respuesta(reader), timeout)
+            except (OSError, ErrorHTTP, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+                if inicio >= desde:
+                    errores[type(exc).__name__] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            fin = time.perf_counter()
+            if inicio >= desde and fin <= hasta:
+                tiempos[ruta].append((fin - inicio) * 1000)
+                estados[estado] += 1
+            if cerrar:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
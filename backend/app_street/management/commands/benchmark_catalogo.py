@@ -0,0 +1,243 @@
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from app_street.cache_catalogo import invalidar_catalogo
+from app_street.importacion import ImportadorProductos, leer_dataframe
+from app_street.instrumentacion import MetricasPeticion
+from app_street.models import Producto
+from app_street.referencias import referencias, MODELOS_REFERENCIA
+from app_street.snapshot import actualizar_snapshot
+
+from .benchmark_importacion import generar_planilla
+from .seed_catalog import sembrar_catalogo
+
+
+def percentil(valores, p):
+    # Rango más cercano: siempre es uno de los tiempos medidos
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+
+def _commit_actual():
+    try:
+        salida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        )
+    except OSError:
+        return None
+    return salida.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95/p99), consultas y memoria pico de los endpoints del catálogo, '
+        'la exportación, la importación y el changelist del admin con catálogos sintéticos de varios tamaños'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default='1000,10000', help='Tamaños de catálogo separados por coma')
+        parser.add_argument('--tallas', type=int, default=4, help='Tallas con stock por producto')
+        parser.add_argument('--imagenes', type=int, default=2, help='Imágenes por producto')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Mediciones por escenario')
+        parser.add_argument('--filas-importacion', type=int, default=1000, help='Filas del archivo que se importa')
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmark_catalogo_<fecha>.json)')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            tamanos = [int(t) for t in options['tamanos'].split(',') if t.strip()]
+        except ValueError:
+            raise CommandError('--tamanos debe ser una lista de enteros, p. ej. 1000,10000')
+        if not tamanos or min(tamanos) < 1 or options['repeticiones'] < 1:
+            raise CommandError('Los tamaños y --repeticiones deben ser positivos.')
+
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as f:
+                anterior = json.load(f)
+
+        resultados = []
+        with tempfile.TemporaryDirectory() as carpeta:
+            for tamano in tamanos:
+                # Cada tamaño con su propia foto del catálogo, fuera de la real;
+                # sin aviso de presupuesto: aquí las consultas se registran igual
+                with override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    CATALOGO_SNAPSHOT_DIR=os.path.join(carpeta, str(tamano)),
+                    INSTRUMENTACION_PRESUPUESTO_CONSULTAS=None,
+                ), transaction.atomic():
+                    self.stdout.write(f'Generando catálogo de {tamano} productos...')
+                    sembrar_catalogo(tamano, options['tallas'], options['imagenes'], seed=options['seed'], prefijo='BENCH')
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                    for escenario in self.escenarios(options):
+                        resultado = {'catalogo': tamano, **self.medir(*escenario, options['repeticiones'])}
+                        resultados.append(resultado)
+                        self.escribir(resultado)
+                    transaction.set_rollback(True)
+
+        # La versión de la caché y el registro de referencias quedaron con datos revertidos
+        invalidar_catalogo()
+        for modelo in MODELOS_REFERENCIA:
+            referencias.invalidar(modelo)
+
+        informe = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit_actual(),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'postgresql': connection.pg_version,
+            },
+            'parametros': {
+                'tamanos': tamanos, 'tallas': options['tallas'], 'imagenes': options['imagenes'],
+                'repeticiones': options['repeticiones'], 'filas_importacion': options['filas_importacion'],
+                'seed': options['seed'],
+            },
+            'resultados': resultados,
+        }
+        salida = options['salida'] or f"benchmark_catalogo_{datetime.now():%Y%m%d_%H%M%S}.json"
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Resultados guardados en {salida}')
+
+        if anterior:
+            self.comparar(anterior, informe)
+        self.stdout.write(self.style.SUCCESS('--- Benchmark finalizado (datos sintéticos revertidos) ---'))
+
+    def escenarios(self, options):
+        """(nombre, preparar, ejecutar): preparar corre antes de cada medición y no se cuenta."""
+        cliente = Client()
+        admin = Client()
+        admin.force_login(User.objects.create_superuser('benchmark-admin', 'benchmark@example.com', None))
+        producto = Producto.objects.filter(sku__startswith='BENCH-').order_by('sku').first()
+
+        archivo = io.BytesIO()
+        generar_planilla(options['filas_importacion'], seed=options['seed']).to_csv(archivo, index=False)
+        archivo = archivo.getvalue()
+
+        def get(cliente, url, **parametros):
+            return lambda: cliente.get(url, parametros)
+
+        def importar():
+            # Se escribe de verdad y se revierte, para que cada medición cree los mismos productos
+            with transaction.atomic():
+                df = leer_dataframe(io.BytesIO(archivo), formato='csv')
+                results = ImportadorProductos().importar(df)
+                transaction.set_rollback(True)
+            if results['errors']:
+                raise CommandError(f"La importación del benchmark falló: {results['errors'][:3]}")
+
+        def tocar_producto():
+            # Un cambio en el catálogo: la foto publicada queda desactualizada
+            Producto.objects.filter(pk=producto.pk).update(fecha_modificacion=timezone.now())
+
+        def regenerar(completo):
+            def ejecutar():
+                # Sin solapamiento: el catálogo recién sembrado entraría entero en la ventana
+                with override_settings(CATALOGO_SNAPSHOT_SOLAPE=0):
+                    actualizar_snapshot(completo=completo)
+            return ejecutar
+
+        # Las respuestas del catálogo se cachean: sin caché se invalida antes de cada medición.
+        # La exportación pone al día la foto dentro del request: exportacion_csv incluye
+        # la actualización incremental tras un cambio, que snapshot_* mide por separado
+        return [
+            ('lista', invalidar_catalogo, get(cliente, '/api/productos/')),
+            ('lista_cache', None, get(cliente, '/api/productos/')),
+            ('detalle', invalidar_catalogo, get(cliente, f'/api/productos/{producto.pk}/')),
+            ('busqueda', invalidar_catalogo, get(cliente, '/api/productos/', search='hoodie negro')),
+            ('exportacion_csv', tocar_producto, get(cliente, '/export/', format='csv')),
+            ('snapshot_incremental', tocar_producto, regenerar(completo=False)),
+            ('snapshot_completo', None, regenerar(completo=True)),
+            ('importacion', None, importar),
+            ('admin_changelist', None, get(admin, '/admin/app_street/producto/')),
+        ]
+
+    def medir(self, nombre, preparar, ejecutar, repeticiones):
+        # Una ejecución de calentamiento (la primera exportación arma la foto completa)
+        self.ejecutar(preparar, ejecutar)
+
+        tracemalloc.start()
+        try:
+            self.ejecutar(preparar, ejecutar)
+            memoria_pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        tiempos, consultas = [], []
+        for _ in range(repeticiones):
+            metricas = MetricasPeticion()
+            if preparar:
+                preparar()
+            with connection.execute_wrapper(metricas):
+                inicio = time.perf_counter()
+                self.consumir(ejecutar())
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(metricas.consultas)
+
+        return {
+            'escenario': nombre,
+            'consultas': max(consultas),
+            'p50_ms': round(percentil(tiempos, 50), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'p99_ms': round(percentil(tiempos, 99), 2),
+            'max_ms': round(max(tiempos), 2),
+            'memoria_pico_kb': round(memoria_pico / 1024),
+        }
+
+    def ejecutar(self, preparar, ejecutar):
+        if preparar:
+            preparar()
+        self.consumir(ejecutar())
+
+    def consumir(self, response):
+        if response is None:
+            return
+        if response.status_code != 200:
+            raise CommandError(f'{response.request["PATH_INFO"]} respondió {response.status_code}')
+        # Las descargas por streaming se generan al leerlas
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+
+    def escribir(self, r):
+        self.stdout.write(
+            f"{r['catalogo']:>8} {r['escenario']:<22}{r['consultas']:>4} consultas"
+            f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f} ms (p50/p95/p99)"
+            f"{r['memoria_pico_kb']:>10} KB"
+        )
+
+    def comparar(self, anterior, actual):
+        previos = {(r['catalogo'], r['escenario']): r for r in anterior.get('resultados', [])}
+        self.stdout.write(f"Comparación con {anterior.get('fecha')} (commit {anterior.get('commit')}):")
+        for r in actual['resultados']:
+            previo = previos.get((r['catalogo'], r['escenario']))
+            if previo is None:
+                continue
+            self.stdout.write(
+                f"{r['catalogo']:>8} {r['escenario']:<22}"
+                f"p50 {previo['p50_ms']:.1f} -> {r['p50_ms']:.1f} ms ({r['p50_ms'] / previo['p50_ms']:.2f}x)  "
+                f"consultas {previo['consultas']} -> {r['consultas']}  "
+                f"memoria {previo['memoria_pico_kb']} -> {r['memoria_pico_kb']} KB"
+            )
@@ -0,0 +1,151 @@
+import random
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_street.importacion import CLASIFICACIONES, ImportadorProductos
+from app_street.models import Categoria, Genero, Temporada, Marca, Talla
+from app_street.referencias import referencias, MODELOS_REFERENCIA
+
+TALLAS = ["XS", "S", "M", "L", "XL", "38", "39", "40", "41", "42"]
+NOMBRES = {
+    Categoria: ["Polos", "Pantalones", "Zapatillas", "Accesorios", "Poleras"],
+    Genero: ["Hombre", "Mujer", "Unisex"],
+    Temporada: ["Verano 2025", "Invierno 2025", "Todo el Año"],
+    Marca: ["Nike", "Adidas", "StreetForce", "UrbanStyle", "Supreme"],
+}
+
+
+def validar_anterior(df, errores):
+    # Validación que hacía ImportadorProductos con df.iterrows(), para comparar
+    mapas = {campo: referencias.mapa_por_nombre(modelo) for _, campo, modelo in CLASIFICACIONES}
+    tallas = referencias.mapa_por_nombre(Talla)
+    filas = []
+    for index, row in df.iterrows():
+        sku = str(row.get('SKU', '')).strip()
+        if not sku:
+            errores.append(f"Fila {index + 2}: El SKU es obligatorio.")
+            continue
+        tallas_list = [t.strip() for t in str(row.get('Tallas', '')).strip().split(',') if t.strip()]
+        stocks_list = [s.strip() for s in str(row.get('Stocks', '')).strip().split(',') if s.strip()]
+        if len(tallas_list) != len(stocks_list):
+            errores.append(f"Fila {index + 2}: El número de tallas ({len(tallas_list)}) no coincide con el de stocks ({len(stocks_list)}) para el SKU {sku}.")
+            continue
+        try:
+            stocks_int = [int(stock) for stock in stocks_list]
+            if any(stock < 0 for stock in stocks_int):
+                raise ValueError("Stocks negativos")
+        except ValueError:
+            errores.append(f"Fila {index + 2}: Los Stocks deben ser números enteros positivos para el SKU {sku}.")
+            continue
+        clasificacion = {}
+        for columna, campo, modelo in CLASIFICACIONES:
+            obj = mapas[campo].get(str(row.get(columna, '')).strip().lower())
+            if obj is None:
+                errores.append(f"Fila {index + 2}: No se encontró un valor para '{modelo.__name__}' con el nombre proporcionado para el SKU {sku}.")
+                break
+            clasificacion[campo] = obj
+        else:
+            invalid_tallas = [t for t in tallas_list if t.lower() not in tallas]
+            if invalid_tallas:
+                errores.append(f"Fila {index + 2}: Tallas inválidas: {', '.join(invalid_tallas)} para el SKU {sku}.")
+                continue
+            filas.append({
+                'sku': sku,
+                'campos': {
+                    'nombre': str(row.get('Nombre', '')).strip(),
+                    'precio_base': float(row.get('Precio Base', 0.0)),
+                    'descripcion': str(row.get('Descripcion', '')).strip(),
+                    **clasificacion,
+                },
+                'stocks': {tallas[t.lower()].pk: stock for t, stock in zip(tallas_list, stocks_int)},
+            })
+    return filas
+
+
+def generar_planilla(cantidad, fraccion_errores=0.0, seed=42):
+    rng = random.Random(seed)
+    filas = []
+    for i in range(cantidad):
+        tallas = rng.sample(TALLAS, rng.randint(1, 5))
+        fila = {
+            'SKU': f'IMP-{i:07d}',
+            'Nombre': f'Producto {i}',
+            'Descripcion': 'Algodón peinado',
+            'Precio Base': rng.randint(20, 500) + 0.9,
+            'Tallas': ', '.join(tallas),
+            'Stocks': ', '.join(str(rng.randint(0, 50)) for _ in tallas),
+            'Nombre Categoria': rng.choice(NOMBRES[Categoria]).lower(),
+            'Nombre Genero': rng.choice(NOMBRES[Genero]),
+            'Nombre Temporada': rng.choice(NOMBRES[Temporada]),
+            'Nombre Marca': rng.choice(NOMBRES[Marca]).upper(),
+        }
+        if rng.random() < fraccion_errores:
+            # Uno de los errores que detecta la validación
+            error = rng.randrange(5)
+            if error == 0:
+                fila['SKU'] = ' '
+            elif error == 1:
+                fila['Stocks'] += ', 1'
+            elif error == 2:
+                fila['Stocks'] = fila['Stocks'].replace('0', '-1', 1) if '0' in fila['Stocks'] else 'x'
+            elif error == 3:
+                fila['Nombre Marca'] = 'Inexistente'
+            else:
+                fila['Tallas'] = fila['Tallas'].replace(tallas[0], 'XXXL')
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+class Command(BaseCommand):
+    help = 'Compara la validación de importación por columnas (pandas) con el recorrido anterior con iterrows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100_000, help='Filas de la planilla sintética')
+        parser.add_argument('--errores', type=float, default=0.02, help='Fracción de filas con algún error')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Veces que se mide cada validación')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Las tablas de clasificación que falten se crean y se revierten al final
+        with transaction.atomic():
+            for modelo, nombres in NOMBRES.items():
+                for nombre in nombres:
+                    modelo.objects.get_or_create(nombre=nombre)
+            for nombre in TALLAS:
+                Talla.objects.get_or_create(nombre=nombre)
+            for modelo in MODELOS_REFERENCIA:
+                referencias.invalidar(modelo)
+
+            df = generar_planilla(options['filas'], options['errores'], options['seed'])
+            self.stdout.write(f"Planilla sintética: {len(df)} filas")
+
+            anterior, errores_anterior, filas_anterior = self.medir(validar_anterior, df, options['repeticiones'])
+            nuevo, errores_nuevo, filas_nuevo = self.medir(ImportadorProductos().validar, df, options['repeticiones'])
+
+            self.stdout.write(f"{'iterrows (anterior)':<24}{anterior:>10.1f} ms")
+            self.stdout.write(f"{'por columnas (pandas)':<24}{nuevo:>10.1f} ms")
+            self.stdout.write(f"{'mejora':<24}{anterior / nuevo:>10.1f}x")
+
+            iguales = errores_anterior == errores_nuevo and filas_anterior == filas_nuevo
+            self.stdout.write(
+                f"{len(filas_nuevo)} filas válidas, {len(errores_nuevo)} errores; "
+                f"resultados {'idénticos' if iguales else 'DISTINTOS'} a la validación anterior"
+            )
+
+            transaction.set_rollback(True)
+        for modelo in MODELOS_REFERENCIA:
+            referencias.invalidar(modelo)
+
+        self.stdout.write(self.style.SUCCESS('--- Benchmark finalizado (datos sintéticos revertidos) ---'))
+
+    def medir(self, validar, df, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            errores = []
+            inicio = time.perf_counter()
+            filas = validar(df, errores)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return min(tiempos), errores, filas
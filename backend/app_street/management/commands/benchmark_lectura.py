@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from app_street.formatos import disponible, motor_parquet
+from app_street.importacion import leer_dataframe
+
+from .benchmark_importacion import generar_planilla
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de lectura de una planilla de importación grande en XLSX, CSV y Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100_000, help='Filas de la planilla sintética')
+        parser.add_argument('--repeticiones', type=int, default=1, help='Veces que se mide cada lectura')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        df = generar_planilla(options['filas'], seed=options['seed'])
+        # Columnas que trae una exportación y que la importación no usa
+        df['En Oferta'] = 'No'
+        df['Descuento Porcentaje'] = 0
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            self.stdout.write(f'Escribiendo {len(df)} filas en cada formato...')
+            rutas = {'xlsx': os.path.join(carpeta, 'productos.xlsx'), 'csv': os.path.join(carpeta, 'productos.csv')}
+            df.to_excel(rutas['xlsx'], index=False, engine='openpyxl')
+            df.to_csv(rutas['csv'], index=False, encoding='utf-8-sig')
+            if motor_parquet():
+                rutas['parquet'] = os.path.join(carpeta, 'productos.parquet')
+                df.to_parquet(rutas['parquet'], engine=motor_parquet(), index=False)
+
+            lecturas = [
+                # La lectura anterior: openpyxl, todas las columnas y tipos inferidos
+                ('xlsx (anterior)', 'xlsx', lambda ruta: pd.read_excel(ruta)),
+                ('xlsx openpyxl', 'xlsx', lambda ruta: leer_dataframe(ruta, formato='xlsx', motor='openpyxl')),
+            ]
+            if disponible('python_calamine'):
+                lecturas.append(('xlsx calamine', 'xlsx', lambda ruta: leer_dataframe(ruta, formato='xlsx', motor='calamine')))
+            lecturas.append(('csv', 'csv', lambda ruta: leer_dataframe(ruta, formato='csv')))
+            if 'parquet' in rutas:
+                lecturas.append(('parquet', 'parquet', lambda ruta: leer_dataframe(ruta, formato='parquet')))
+
+            self.stdout.write(f"{'lectura':<18}{'tamaño':>10}{'tiempo':>12}{'mejora':>9}")
+            base = None
+            for nombre, formato, leer in lecturas:
+                tiempo = self.medir(leer, rutas[formato], options['repeticiones'])
+                base = base or tiempo
+                tamaño = os.path.getsize(rutas[formato]) / 1024 / 1024
+                self.stdout.write(f"{nombre:<18}{tamaño:>8.1f}MB{tiempo:>10.0f}ms{base / tiempo:>8.1f}x")
+
+        for modulo in ('python_calamine', 'pyarrow'):
+            if not disponible(modulo):
+                self.stdout.write(f'(sin {modulo}: se omiten sus lecturas)')
+        self.stdout.write(self.style.SUCCESS('--- Benchmark finalizado ---'))
+
+    def medir(self, leer, ruta, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            leer(ruta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return min(tiempos)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app_street.snapshot import actualizar_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Actualiza la foto columnar del catálogo usada por la exportación y los reportes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Regenera desde cero en lugar de incrementalmente')
+
+    def handle(self, *args, **options):
+        snapshot = actualizar_snapshot(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Generación {snapshot.generacion}: {snapshot.total} productos en {snapshot.ruta}'
+        ))
@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+
+from app_street.imagenes import anchos, generar_versiones, guardar_versiones
+from app_street.models import ImagenProducto
+
+
+class Command(BaseCommand):
+    help = 'Genera las versiones reducidas (WebP/JPEG) de las imágenes que aún no las tienen, en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos que redimensionan imágenes')
+        parser.add_argument('--en-vuelo', type=int, default=32, help='Imágenes leídas en memoria a la vez')
+        parser.add_argument('--todas', action='store_true', help='Regenera también las que ya tienen versiones')
+
+    def handle(self, *args, **options):
+        imagenes = ImagenProducto.objects.exclude(imagen='').exclude(imagen__isnull=True).order_by('pk')
+        if not options['todas']:
+            # Sin versiones, o generadas para un archivo que ya se reemplazó
+            imagenes = imagenes.annotate(origen=KT('versiones__origen')).filter(
+                Q(origen__isnull=True) | ~Q(origen=F('imagen'))
+            )
+        total = imagenes.count()
+        self.stdout.write(f'Generando versiones de {total} imagen(es) con {options["procesos"]} proceso(s)...')
+
+        # Los procesos hijos solo redimensionan (bytes -> bytes); la lectura, el
+        # guardado y la base de datos quedan en este proceso
+        procesadas = fallidas = 0
+        anchos_deseados = anchos()
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=django.setup) as pool:
+            pendientes = {}
+            iterador = imagenes.iterator(chunk_size=500)
+            agotado = False
+            while pendientes or not agotado:
+                while not agotado and len(pendientes) < options['en_vuelo']:
+                    imagen = next(iterador, None)
+                    if imagen is None:
+                        agotado = True
+                        break
+                    try:
+                        with imagen.imagen.open('rb') as archivo:
+                            contenido = archivo.read()
+                    except OSError as e:
+                        fallidas += 1
+                        self.stderr.write(f'❌ {imagen.imagen.name}: {e}')
+                        continue
+                    pendientes[pool.submit(generar_versiones, contenido, anchos_deseados)] = imagen
+
+                if not pendientes:
+                    continue
+                listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    imagen = pendientes.pop(futuro)
+                    try:
+                        guardar_versiones(imagen, futuro.result())
+                        procesadas += 1
+                    except Exception as e:
+                        fallidas += 1
+                        self.stderr.write(f'❌ {imagen.imagen.name}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {procesadas} imagen(es) procesada(s), {fallidas} con error.'))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from app_street.trabajos import procesar_pendientes, recuperar_trabajos
+
+
+class Command(BaseCommand):
+    help = 'Procesa las importaciones de productos pendientes (worker fuera del request)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesa lo pendiente y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre cada revisión de la cola')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('--- Worker de importaciones iniciado ---'))
+
+        while True:
+            # Los que quedaron `procesando` tras la caída de otro worker
+            _, fallidos = recuperar_trabajos()
+            if fallidos:
+                self.stdout.write(self.style.WARNING(f'⚠️ {fallidos} importación(es) interrumpida(s) marcadas como fallidas.'))
+            procesados = procesar_pendientes()
+            if procesados:
+                self.stdout.write(self.style.SUCCESS(f'✅ {procesados} importación(es) procesada(s).'))
+            if options['once']:
+                break
+            time.sleep(options['intervalo'])
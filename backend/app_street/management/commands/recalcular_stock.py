@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from app_street.models import Producto, stock_total_subquery, recalcular_stock_total
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Producto.stock_total a partir de ProductoTallaStock (reparación/backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Productos por cada UPDATE')
+        parser.add_argument('--todos', action='store_true', help='Recalcula todos, no solo los desfasados')
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.all()
+        if not options['todos']:
+            # Solo los productos cuyo total guardado no coincide con la suma real
+            productos = productos.annotate(stock_real=stock_total_subquery()).exclude(stock_total=F('stock_real'))
+
+        ids = list(productos.values_list('pk', flat=True))
+        recalcular_stock_total(ids, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ stock_total recalculado para {len(ids)} producto(s).'))
@@ -0,0 +1,135 @@
+import random
+import re
+import time
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
+
+from app_street.cache_catalogo import invalidar_catalogo
+from app_street.models import Producto, ProductoTallaStock, ImagenProducto, Categoria, Genero, Temporada, Marca, Talla
+from app_street.referencias import referencias, MODELOS_REFERENCIA
+
+from .seed_data import TALLAS_ROPA, TALLAS_CALZADO
+
+PALABRAS = {
+    "Polos": ["Polo", "Oversize", "Básico", "Estampado", "Boxy", "Cuello V", "Manga Larga"],
+    "Pantalones": ["Pantalón", "Cargo", "Jogger", "Denim", "Recto", "Baggy", "Chino"],
+    "Zapatillas": ["Zapatillas", "Runner", "Skate", "Retro", "Air", "Boost", "Low"],
+    "Accesorios": ["Gorra", "Mochila", "Canguro", "Medias", "Beanie", "Lentes", "Bolso"],
+    "Poleras": ["Polera", "Hoodie", "Crewneck", "Zip", "Fleece", "Oversize", "Half Zip"],
+}
+COLORES = ["Negro", "Blanco", "Gris", "Azul", "Verde Oliva", "Beige", "Rojo", "Camel"]
+MATERIALES = ["algodón peinado", "french terry", "denim rígido", "poliéster reciclado", "lona", "cuero sintético"]
+
+
+def sembrar_catalogo(productos, tallas_por_producto=3, imagenes=1, seed=42, prefijo='SEED', lote=2000, progreso=None):
+    """
+    Crea `productos` productos sintéticos con `tallas_por_producto` filas de
+    stock e `imagenes` imágenes cada uno, con bulk_create por lotes. Los SKU
+    son <prefijo>-0000001... y continúan los que ya existan con ese prefijo.
+    Las imágenes solo guardan la ruta (no se escriben archivos en MEDIA_ROOT).
+    Devuelve la cantidad de productos creados.
+    """
+    # Las tablas de clasificación las crea seed_data (idempotente)
+    call_command('seed_data', stdout=StringIO())
+    for modelo in MODELOS_REFERENCIA:
+        referencias.invalidar(modelo)
+
+    rng = random.Random(seed)
+    categorias = referencias.todos(Categoria)
+    generos = referencias.todos(Genero)
+    temporadas = referencias.todos(Temporada)
+    marcas = referencias.todos(Marca)
+    tallas = referencias.mapa_por_nombre(Talla)
+    # Zapatillas con tallas numéricas, el resto con tallas de ropa
+    grupos = {
+        'calzado': [tallas[t.lower()] for t in TALLAS_CALZADO if t.lower() in tallas],
+        'ropa': [tallas[t.lower()] for t in TALLAS_ROPA if t.lower() in tallas],
+    }
+    todas = list(tallas.values())
+
+    # Después del mayor número ya usado (no de la cantidad: tras borrar alguno se repetirían SKU)
+    ultimo = (
+        Producto.objects
+        .filter(sku__regex=rf'^{re.escape(prefijo)}-[0-9]+$')
+        .aggregate(ultimo=Max(Cast(Substr('sku', len(prefijo) + 2), BigIntegerField())))['ultimo']
+    )
+    inicio = 0 if ultimo is None else ultimo + 1
+    creados = 0
+    while creados < productos:
+        cantidad = min(lote, productos - creados)
+        nuevos, stocks, fotos = [], [], []
+        for i in range(inicio + creados, inicio + creados + cantidad):
+            categoria = rng.choice(categorias)
+            grupo = grupos['calzado' if categoria.nombre == 'Zapatillas' else 'ropa'] or todas
+            if tallas_por_producto > len(grupo):
+                grupo = todas
+            elegidas = sorted(rng.sample(grupo, min(tallas_por_producto, len(grupo))), key=lambda t: t.pk)
+            cantidades = [rng.choice((0, rng.randint(1, 60))) for _ in elegidas]
+
+            en_oferta = rng.random() < 0.2
+            sku = f'{prefijo}-{i:07d}'
+            palabras = PALABRAS.get(categoria.nombre) or [categoria.nombre]
+            producto = Producto(
+                sku=sku,
+                nombre=f"{' '.join(rng.sample(palabras, 2))} {rng.choice(COLORES)}",
+                descripcion=f"{categoria.nombre} de {rng.choice(MATERIALES)}, corte {rng.choice(['regular', 'oversize', 'slim'])}.",
+                precio_base=Decimal(rng.randint(2000, 50000)) / 100,
+                en_oferta=en_oferta,
+                descuento_porcentaje=rng.choice((10, 15, 20, 30, 50)) if en_oferta else 0,
+                categoria=categoria,
+                genero=rng.choice(generos),
+                temporada=rng.choice(temporadas),
+                marca=rng.choice(marcas),
+                # Se calcula aquí: bulk_create no dispara las señales de stock
+                stock_total=sum(cantidades),
+            )
+            nuevos.append(producto)
+            stocks += [ProductoTallaStock(producto=producto, talla=t, stock=s) for t, s in zip(elegidas, cantidades)]
+            fotos += [
+                ImagenProducto(producto=producto, imagen=f'productos/{sku.lower()}_{j}.jpg', principal=j == 0, orden=j)
+                for j in range(imagenes)
+            ]
+
+        with transaction.atomic():
+            Producto.objects.bulk_create(nuevos)
+            ProductoTallaStock.objects.bulk_create(stocks)
+            ImagenProducto.objects.bulk_create(fotos)
+        creados += cantidad
+        if progreso:
+            progreso(creados, productos)
+
+    invalidar_catalogo()
+    return creados
+
+
+class Command(BaseCommand):
+    help = 'Genera un catálogo sintético (productos, stock por talla e imágenes) con inserciones en bloque'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, required=True, help='Productos a crear')
+        parser.add_argument('--sizes-per-product', type=int, default=3, help='Tallas con stock por producto')
+        parser.add_argument('--images', type=int, default=1, help='Imágenes por producto (solo la ruta, sin archivo)')
+        parser.add_argument('--prefix', default='SEED', help='Prefijo de los SKU generados')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Productos por bulk_create')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['products'] < 1 or options['sizes_per_product'] < 0 or options['images'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--products y --batch-size deben ser positivos; --sizes-per-product e --images, no negativos.')
+
+        inicio = time.perf_counter()
+        creados = sembrar_catalogo(
+            options['products'], options['sizes_per_product'], options['images'],
+            seed=options['seed'], prefijo=options['prefix'], lote=options['batch_size'],
+            progreso=lambda hechos, total: self.stdout.write(f'{hechos}/{total} productos'),
+        )
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'--- {creados} productos creados en {segundos:.1f} s ({creados / segundos:.0f} productos/s) ---'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:06
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def rellenar_stock_total(apps, schema_editor):
+    Producto = apps.get_model('app_street', 'Producto')
+    ProductoTallaStock = apps.get_model('app_street', 'ProductoTallaStock')
+    totales = (
+        ProductoTallaStock.objects
+        .filter(producto=models.OuterRef('pk'))
+        .order_by()
+        .values('producto')
+        .annotate(total=models.Sum('stock'))
+        .values('total')
+    )
+    Producto.objects.update(stock_total=Coalesce(models.Subquery(totales), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0002_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_total',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(rellenar_stock_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:07
+
+import django.db.models.expressions
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0003_producto_stock_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precio_final',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=models.Case(models.When(descuento_porcentaje__gt=0, en_oferta=True, then=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('precio_base'), '-', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('precio_base'), '*', models.F('descuento_porcentaje')), '/', models.Value(100))), 2)), default=models.F('precio_base')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+    ]
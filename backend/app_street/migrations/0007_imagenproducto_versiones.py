@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0006_producto_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='versiones',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+# La imagen principal queda primera y el resto conserva el orden en que se subieron
+NUMERAR_IMAGENES = '''
+    UPDATE app_street_imagenproducto AS i
+    SET orden = o.n - 1
+    FROM (
+        SELECT id, row_number() OVER (PARTITION BY producto_id ORDER BY principal DESC, id) AS n
+        FROM app_street_imagenproducto
+    ) AS o
+    WHERE i.id = o.id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0007_imagenproducto_versiones'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='imagenproducto',
+            options={'ordering': ['orden', 'id']},
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='hash_contenido',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imagenproducto',
+            name='orden',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(NUMERAR_IMAGENES, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0009_producto_fecha_modificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='diferencias',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='filas_confirmadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='filas_por_lote',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='modo',
+            field=models.CharField(choices=[('atomico', 'Atómico'), ('lotes', 'Por lotes'), ('simulacion', 'Simulación')], default='atomico', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='sin_cambios',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
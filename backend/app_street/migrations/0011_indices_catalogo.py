@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:49
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.utils import timezone
+
+# Modelo de clasificación -> campo de Producto que lo referencia
+CLASIFICACIONES = [('Categoria', 'categoria'), ('Genero', 'genero'), ('Temporada', 'temporada'), ('Marca', 'marca')]
+
+
+def fusionar_duplicados(apps, schema_editor):
+    """
+    Antes de crear las restricciones únicas: los nombres repetidos (sin
+    distinguir mayúsculas) se funden en el de menor id, que es el que ya usaba
+    el importador, y sus productos y stocks pasan a ese registro.
+    """
+    Producto = apps.get_model('app_street', 'Producto')
+    ProductoTallaStock = apps.get_model('app_street', 'ProductoTallaStock')
+
+    for nombre_modelo, campo in CLASIFICACIONES + [('Talla', None)]:
+        modelo = apps.get_model('app_street', nombre_modelo)
+        conservados = {}
+        for pk, nombre in modelo.objects.order_by('pk').values_list('pk', 'nombre'):
+            destino = conservados.setdefault(nombre.upper(), pk)
+            if destino == pk:
+                continue
+            if campo:
+                Producto.objects.filter(**{campo: pk}).update(**{campo: destino}, fecha_modificacion=timezone.now())
+            else:
+                # Si el producto ya tenía la talla conservada, se suman los stocks
+                for fila in ProductoTallaStock.objects.filter(talla_id=pk):
+                    existente = ProductoTallaStock.objects.filter(producto_id=fila.producto_id, talla_id=destino).first()
+                    if existente:
+                        existente.stock += fila.stock
+                        existente.save(update_fields=['stock'])
+                        fila.delete()
+                    else:
+                        fila.talla_id = destino
+                        fila.save(update_fields=['talla'])
+            modelo.objects.filter(pk=pk).delete()
+
+    # Los FK son diferidos: se verifican ya, antes de crear los índices
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0010_trabajoimportacion_modos'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='productotallastock',
+            options={'ordering': ['talla_id']},
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'genero', 'marca', 'en_oferta', '-fecha_registro', '-id'], name='producto_filtros_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoria',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('nombre'), name='categoria_nombre_ci_uniq', violation_error_message='Ya existe un registro con ese nombre (sin distinguir mayúsculas).'),
+        ),
+        migrations.AddConstraint(
+            model_name='genero',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('nombre'), name='genero_nombre_ci_uniq', violation_error_message='Ya existe un registro con ese nombre (sin distinguir mayúsculas).'),
+        ),
+        migrations.AddConstraint(
+            model_name='marca',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('nombre'), name='marca_nombre_ci_uniq', violation_error_message='Ya existe un registro con ese nombre (sin distinguir mayúsculas).'),
+        ),
+        migrations.AddConstraint(
+            model_name='talla',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('nombre'), name='talla_nombre_ci_uniq', violation_error_message='Ya existe un registro con ese nombre (sin distinguir mayúsculas).'),
+        ),
+        migrations.AddConstraint(
+            model_name='temporada',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('nombre'), name='temporada_nombre_ci_uniq', violation_error_message='Ya existe un registro con ese nombre (sin distinguir mayúsculas).'),
+        ),
+    ]
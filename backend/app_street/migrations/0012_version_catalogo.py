@@ -0,0 +1,27 @@
+import time
+
+from django.db import migrations
+
+SECUENCIA = 'app_street_version_catalogo'
+
+
+def crear_secuencia(apps, schema_editor):
+    # Arranca en el instante de la migración (en ms) y no en 1: si la base se
+    # recrea, los ETags "<versión>-..." que tengan los clientes no vuelven a coincidir
+    inicio = int(time.time() * 1000)
+    schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SECUENCIA} START WITH {inicio}')
+
+
+def borrar_secuencia(apps, schema_editor):
+    schema_editor.execute(f'DROP SEQUENCE IF EXISTS {SECUENCIA}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0011_indices_catalogo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_secuencia, borrar_secuencia),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:39
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def rellenar_ultimo_avance(apps, schema_editor):
+    # Los trabajos ya tomados no registraron avance: cuenta desde que empezaron
+    TrabajoImportacion = apps.get_model('app_street', 'TrabajoImportacion')
+    TrabajoImportacion.objects.filter(fecha_inicio__isnull=False).update(ultimo_avance=F('fecha_inicio'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_street', '0012_version_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='ultimo_avance',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(rellenar_ultimo_avance, migrations.RunPython.noop),
+    ]
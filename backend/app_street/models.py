@@ -1,34 +1,65 @@
 from django.db import models
+from django.db.models.functions import Coalesce, Round, Upper
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 import uuid
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 # --- Modelos de Clasificación ---
 
+def nombre_unico(modelo):
+    # Único sin distinguir mayúsculas. Es un índice sobre UPPER(nombre), que es
+    # como compila nombre__iexact en PostgreSQL, así que también sirve esas búsquedas
+    return models.UniqueConstraint(
+        Upper('nombre'), name=f'{modelo}_nombre_ci_uniq',
+        violation_error_message='Ya existe un registro con ese nombre (sin distinguir mayúsculas).',
+    )
+
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
+
+    class Meta:
+        constraints = [nombre_unico('categoria')]
+
     def __str__(self):
         return self.nombre
 
 class Genero(models.Model):
     nombre = models.CharField(max_length=50)  # Hombre, Mujer, Niño, Niña, Unisex
+
+    class Meta:
+        constraints = [nombre_unico('genero')]
+
     def __str__(self):
         return self.nombre
 
 class Temporada(models.Model):
     nombre = models.CharField(max_length=50)  # Invierno, Verano, etc.
+
+    class Meta:
+        constraints = [nombre_unico('temporada')]
+
     def __str__(self):
         return self.nombre
 
 class Marca(models.Model):
     nombre = models.CharField(max_length=100)
     pais_origen = models.CharField(max_length=100, blank=True, null=True)
+
+    class Meta:
+        constraints = [nombre_unico('marca')]
+
     def __str__(self):
         return self.nombre
 
 class Talla(models.Model):
     nombre = models.CharField(max_length=20) # Ej: "S", "M", "42", "43.5"
 
+    class Meta:
+        constraints = [nombre_unico('talla')]
+
     def __str__(self):
         return f"{self.nombre}"
 
@@ -50,6 +81,25 @@ class Producto(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
 
+    # Precio con descuento calculado por la base de datos, así se puede filtrar
+    # y ordenar por él en SQL. Tras un save() se vuelve a leer al accederlo.
+    precio_final = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                en_oferta=True,
+                descuento_porcentaje__gt=0,
+                then=Round(
+                    models.F('precio_base') - models.F('precio_base') * models.F('descuento_porcentaje') / models.Value(100),
+                    2,
+                ),
+            ),
+            default=models.F('precio_base'),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        db_index=True,
+    )
+
     # --- Datos de Clasificación (Relaciones) ---
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True)
     genero = models.ForeignKey(Genero, on_delete=models.SET_NULL, null=True)
@@ -58,17 +108,61 @@ class Producto(models.Model):
     
     # --- Datos Adicionales ---
     fecha_registro = models.DateTimeField(auto_now_add=True)
-    
-    @property
-    def precio_final(self):
-        if self.en_oferta and self.descuento_porcentaje > 0:
-            descuento = self.precio_base * (self.descuento_porcentaje / 100)
-            return round(self.precio_base - descuento, 2)
-        return self.precio_base
+    # Marca de cambio para la foto incremental del catálogo (snapshot.py). Las
+    # escrituras en bloque y los UPDATE de stock la actualizan explícitamente.
+    fecha_modificacion = models.DateTimeField(auto_now=True, db_index=True)
+    # Suma del stock de todas las tallas. Se mantiene al escribir ProductoTallaStock
+    # (ver signals.py y recalcular_stock_total) para no agregarla en cada lectura.
+    stock_total = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+
+    # Vector de búsqueda de texto completo (nombre y SKU pesan más que la descripción).
+    # Lo calcula PostgreSQL al escribir la fila y se consulta con un índice GIN.
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('nombre', weight='A', config='spanish')
+            + SearchVector('sku', weight='A', config='spanish')
+            + SearchVector('descripcion', weight='C', config='spanish')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='producto_search_vector_gin'),
+            # pg_trgm: fragmentos de SKU (sku__icontains compila a UPPER(sku) LIKE ...)
+            # y nombres con errores de tipeo (nombre % término)
+            GinIndex(OpClass(Upper('sku'), name='gin_trgm_ops'), name='producto_sku_trgm'),
+            GinIndex(fields=['nombre'], name='producto_nombre_trgm', opclasses=['gin_trgm_ops']),
+            # Orden por defecto del listado paginado por cursor
+            models.Index(fields=['-fecha_registro', '-id'], name='producto_fecha_id_idx'),
+            # Listado filtrado por clasificación/oferta: las igualdades primero y
+            # luego el orden del cursor, así la página sale del índice sin ordenar
+            models.Index(
+                fields=['categoria', 'genero', 'marca', 'en_oferta', '-fecha_registro', '-id'],
+                name='producto_filtros_idx',
+            ),
+        ]
+    
     def get_stock_total(self):
-        total = ProductoTallaStock.objects.filter(producto=self).aggregate(total=models.Sum('stock'))['total']
-        return total or 0
+        return self.stock_total
+
+    def save(self, *args, **kwargs):
+        # stock_total lo mantiene la base de datos; una instancia desactualizada
+        # no debe pisarlo al guardar el resto de campos
+        actualizando = not self._state.adding
+        if actualizando and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not f.generated and f.name != 'stock_total'
+            ]
+        super().save(*args, **kwargs)
+        if actualizando:
+            # El UPDATE no devuelve las columnas generadas: las dejamos diferidas
+            # para que se lean de nuevo (una consulta) solo si se usan
+            for f in self._meta.concrete_fields:
+                if f.generated:
+                    self.__dict__.pop(f.attname, None)
 
     def __str__(self):
         return f"{self.nombre} ({self.sku})"
@@ -80,15 +174,117 @@ class ProductoTallaStock(models.Model):
 
     class Meta:
         unique_together = ('producto', 'talla')
-        ordering = ['talla__nombre']
+        # Por id de talla (el orden en que se crearon: XS, S, M...). Ordenar por
+        # talla__nombre obligaba a un JOIN con Talla en cada consulta de stock;
+        # así el índice único (producto, talla) ya entrega las filas ordenadas
+        ordering = ['talla_id']
 
     def __str__(self):
         return f"{self.producto.nombre} - Talla: {self.talla.nombre} - Stock: {self.stock}"
 
+def stock_total_subquery():
+    """Expresión SQL con la suma real del stock de cada producto."""
+    totales = (
+        ProductoTallaStock.objects
+        .filter(producto=models.OuterRef('pk'))
+        .order_by()
+        .values('producto')
+        .annotate(total=models.Sum('stock'))
+        .values('total')
+    )
+    return Coalesce(models.Subquery(totales), 0)
+
+
+def recalcular_stock_total(producto_ids, batch_size=1000):
+    """Actualiza stock_total de los productos indicados con un UPDATE por lote."""
+    producto_ids = list(producto_ids)
+    for i in range(0, len(producto_ids), batch_size):
+        Producto.objects.filter(pk__in=producto_ids[i:i + batch_size]).update(
+            stock_total=stock_total_subquery(), fecha_modificacion=timezone.now(),
+        )
+
+
 class ImagenProducto(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="imagenes")
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
     principal = models.BooleanField(default=False)
+    # Versiones reducidas generadas en segundo plano (app_street.imagenes):
+    # {"origen": "productos/a.png", "webp": {"200": "productos/a_200.webp", ...}, "jpeg": {...}}
+    versiones = models.JSONField(default=dict, blank=True, editable=False)
+    # SHA-256 del archivo: subidas idénticas reutilizan el mismo archivo guardado
+    hash_contenido = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    orden = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['orden', 'id']
     
     def __str__(self):
-        return f"Imagen de {self.producto.nombre}"
\ No newline at end of file
+        return f"Imagen de {self.producto.nombre}"
+
+    def necesita_versiones(self):
+        # Si se reemplazó el archivo, las versiones guardadas son de la imagen anterior
+        return bool(self.imagen) and self.versiones.get('origen') != self.imagen.name
+
+    def srcset(self):
+        """{"webp": "url 200w, url 600w", "jpeg": ...}; vacío mientras no haya versiones."""
+        if not self.imagen or self.necesita_versiones():
+            return {}
+        storage = self.imagen.storage
+        return {
+            formato: ', '.join(f'{storage.url(nombre)} {ancho}w' for ancho, nombre in sorted(archivos.items(), key=lambda a: int(a[0])))
+            for formato, archivos in self.versiones.items()
+            if formato != 'origen'
+        }
+
+# --- Importaciones en segundo plano ---
+
+class TrabajoImportacion(models.Model):
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADO = 'completado'
+    FALLIDO = 'fallido'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADO, 'Completado'),
+        (FALLIDO, 'Fallido'),
+    ]
+
+    # atomico: todo el archivo en una transacción; lotes: una transacción por
+    # lote, reanudable; simulacion: valida y calcula los cambios sin escribir
+    ATOMICO = 'atomico'
+    LOTES = 'lotes'
+    SIMULACION = 'simulacion'
+    MODOS = [
+        (ATOMICO, 'Atómico'),
+        (LOTES, 'Por lotes'),
+        (SIMULACION, 'Simulación'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    archivo = models.FileField(upload_to='importaciones/')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    modo = models.CharField(max_length=20, choices=MODOS, default=ATOMICO)
+    filas_por_lote = models.PositiveIntegerField(null=True, blank=True)
+
+    # --- Progreso ---
+    total_filas = models.PositiveIntegerField(default=0)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    creados = models.PositiveIntegerField(default=0)
+    actualizados = models.PositiveIntegerField(default=0)
+    sin_cambios = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    # Modo lotes: filas ya confirmadas (al reanudar se sigue desde aquí)
+    filas_confirmadas = models.PositiveIntegerField(default=0)
+    # Modo simulación: {"crear": [...], "actualizar": [...], "sin_cambios": [...]}
+    diferencias = models.JSONField(default=dict, blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    # Último avance (validación, lote escrito): sin avance reciente, un
+    # trabajo `procesando` se da por interrumpido
+    ultimo_avance = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Importación {self.id} ({self.estado})"
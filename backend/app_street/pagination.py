@@ -0,0 +1,202 @@
+import json
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import GeneratedField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset): cada página se pide con los valores de
+    ordenamiento de la última fila vista, p. ej.
+    WHERE (fecha_registro, id) < (:fecha, :id) ORDER BY fecha_registro DESC, id DESC LIMIT n
+    así el costo depende del tamaño de la página y no de cuántas filas hay antes.
+
+    Respeta el orden que ya traiga el queryset (?ordering=, relevancia de la
+    búsqueda) siempre que sean campos o anotaciones simples; el `id` se agrega
+    como desempate para que el cursor sea único.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    ordering = ('-fecha_registro', '-id')
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._cerrar_pagina(list(self._consulta_pagina(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Igual que paginate_queryset, leyendo la página con el ORM async (vistas ASGI)."""
+        consulta = self._consulta_pagina(queryset, request)
+        # Un solo bloque: las relaciones prefetch se cargan para toda la página a la vez
+        return self._cerrar_pagina([fila async for fila in consulta.aiterator(chunk_size=self.page_size + 1)])
+
+    def _consulta_pagina(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.orden = self.get_ordering(queryset)
+
+        valores, self.hacia_atras = self.decode_cursor(request, queryset)
+        self.desde_cursor = valores is not None
+        orden_consulta = _invertir(self.orden) if self.hacia_atras else self.orden
+        queryset = queryset.order_by(*orden_consulta)
+        if valores is not None:
+            queryset = queryset.filter(_despues_de(orden_consulta, valores))
+
+        # Pedimos una fila de más para saber si hay otra página en esa dirección
+        return queryset[:self.page_size + 1]
+
+    def _cerrar_pagina(self, filas):
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+        if self.hacia_atras:
+            filas.reverse()
+
+        if self.hacia_atras:
+            self.has_next, self.has_previous = True, hay_mas
+        else:
+            self.has_next, self.has_previous = hay_mas, self.desde_cursor
+        self.page = filas
+        return filas
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        orden = list(queryset.query.order_by)
+        # Solo sabemos armar el cursor con campos/anotaciones del propio producto
+        if not orden or any(not isinstance(c, str) or '__' in c for c in orden):
+            orden = list(self.ordering)
+        orden = [c.replace('pk', 'id') if c.lstrip('-') == 'pk' else c for c in orden]
+        if not any(c.lstrip('-') == 'id' for c in orden):
+            orden.append('-id' if orden[-1].startswith('-') else 'id')
+        return orden
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], hacia_atras=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], hacia_atras=True)
+
+    def encode_cursor(self, obj, hacia_atras):
+        valores = [_a_texto(getattr(obj, campo.lstrip('-'))) for campo in self.orden]
+        datos = json.dumps({'v': valores, 'r': hacia_atras}, separators=(',', ':'))
+        cursor = b64encode(datos.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            datos = json.loads(b64decode(parse.unquote(cursor).encode('ascii')).decode('utf-8'))
+            valores, hacia_atras = datos['v'], bool(datos['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valores, list) or len(valores) != len(self.orden):
+            raise NotFound(self.invalid_cursor_message)
+        # Un cursor bien formado puede traer valores que no son del tipo de la
+        # columna: se convierten aquí (404) y no al ejecutar la consulta (500)
+        try:
+            valores = [_de_texto(queryset, campo.lstrip('-'), valor) for campo, valor in zip(self.orden, valores)]
+        except (ValidationError, TypeError, ValueError, ArithmeticError):
+            raise NotFound(self.invalid_cursor_message)
+        return valores, hacia_atras
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'integer'}},
+        ]
+
+    def to_html(self):
+        return ''
+
+
+class ProductoCursorPagination(KeysetPagination):
+    # Índice compuesto producto_fecha_id_idx
+    ordering = ('-fecha_registro', '-id')
+
+
+def _invertir(orden):
+    return [c[1:] if c.startswith('-') else f'-{c}' for c in orden]
+
+
+def _despues_de(orden, valores):
+    """
+    Condición "fila posterior al cursor" para un orden de varios campos:
+    (a > x) OR (a = x AND b > y) OR ...  (con < en los campos descendentes)
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        lookup = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{lookup}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def _de_texto(queryset, nombre, valor):
+    # _a_texto siempre escribe textos
+    if not isinstance(valor, str):
+        raise TypeError(valor)
+    try:
+        anotacion = queryset.query.annotations.get(nombre)
+        campo = anotacion.output_field if anotacion is not None else queryset.model._meta.get_field(nombre)
+    except (FieldDoesNotExist, FieldError):
+        return valor
+    if isinstance(campo, GeneratedField):
+        campo = campo.output_field
+    valor = campo.to_python(valor)
+    if valor is None:
+        raise ValueError(nombre)
+    # Límites de la columna (p. ej. max_digits de un DecimalField)
+    campo.run_validators(valor)
+    return valor
+
+
+def _a_texto(valor):
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    if isinstance(valor, float):
+        return repr(valor)
+    return str(valor)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Categoria, Genero, Temporada, Marca, Talla
+
+MODELOS_REFERENCIA = (Categoria, Genero, Temporada, Marca, Talla)
+
+
+def normalizar(nombre):
+    return str(nombre).strip().lower()
+
+
+class _Tabla:
+    def __init__(self, modelo):
+        self.objetos = list(modelo.objects.order_by('pk'))
+        self.por_id = {obj.pk: obj for obj in self.objetos}
+        # Si dos filas tienen el mismo nombre (sin distinguir mayúsculas), gana la primera
+        self.por_nombre = {}
+        for obj in self.objetos:
+            self.por_nombre.setdefault(normalizar(obj.nombre), obj)
+        self.cargada_en = time.monotonic()
+
+
+class RegistroReferencias:
+    """
+    Copia en memoria de las tablas de clasificación (Categoria, Genero,
+    Temporada, Marca, Talla). Cada tabla se carga la primera vez que se pide
+    y se descarta con las señales post_save/post_delete del modelo.
+
+    Es local a cada proceso: las señales solo llegan al proceso que escribió,
+    así que además cada tabla se recarga pasados REFERENCIAS_TTL segundos.
+    """
+
+    def __init__(self):
+        self._tablas = {}
+        self._lock = threading.Lock()
+
+    def _tabla(self, modelo):
+        tabla = self._tablas.get(modelo)
+        ttl = getattr(settings, 'REFERENCIAS_TTL', 60)
+        if tabla is None or time.monotonic() - tabla.cargada_en > ttl:
+            with self._lock:
+                tabla = _Tabla(modelo)
+                self._tablas[modelo] = tabla
+        return tabla
+
+    def todos(self, modelo):
+        return list(self._tabla(modelo).objetos)
+
+    def por_id(self, modelo, pk):
+        return self._tabla(modelo).por_id.get(pk)
+
+    def por_nombre(self, modelo, nombre):
+        """Búsqueda sin distinguir mayúsculas ni espacios alrededor; None si no existe."""
+        return self._tabla(modelo).por_nombre.get(normalizar(nombre))
+
+    def mapa_por_nombre(self, modelo):
+        return dict(self._tabla(modelo).por_nombre)
+
+    def invalidar(self, modelo=None):
+        with self._lock:
+            if modelo is None:
+                self._tablas.clear()
+            else:
+                self._tablas.pop(modelo, None)
+
+
+referencias = RegistroReferencias()
+
+
+def invalidar_referencias(modelo):
+    # También al confirmar: una recarga hecha dentro de la transacción pudo
+    # leer filas que todavía no eran visibles para los demás
+    referencias.invalidar(modelo)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: referencias.invalidar(modelo))
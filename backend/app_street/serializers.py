@@ -1,18 +1,47 @@
 from rest_framework import serializers
-from app_street.models import Producto, ProductoTallaStock, Talla, ImagenProducto
+from app_street.models import (
+    Producto, ProductoTallaStock, Talla, TrabajoImportacion, Categoria, Genero, Temporada, Marca,
+)
+from app_street.referencias import referencias
+from app_street.stock import sincronizar_stock
+from app_street.imagenes import agregar_imagenes, ordenar_imagenes
 from django.core.exceptions import ValidationError
 
+class ReferenciaField(serializers.PrimaryKeyRelatedField):
+    # Igual que PrimaryKeyRelatedField, pero resuelve el id con el registro en
+    # memoria en lugar de hacer un queryset.get() por campo
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        modelo = self.get_queryset().model
+        try:
+            pk = modelo._meta.pk.to_python(data)
+        except (TypeError, ValueError, ValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = referencias.por_id(modelo, pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
 class ProductSerializer(serializers.ModelSerializer):
     tallas = serializers.CharField(write_only=True, required=True)  # String como "S, M, L"
     stocks = serializers.CharField(write_only=True, required=True)  # String como "10, 20, 15"
     imagenes = serializers.ListField(  # Nuevo campo para múltiples archivos
         child=serializers.ImageField(), write_only=True, required=False  # No obligatorio
     )
+    # Al editar: ids de imágenes a quitar y el nuevo orden (la primera queda como principal)
+    imagenes_eliminar = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+    imagenes_orden = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+    categoria = ReferenciaField(queryset=Categoria.objects.all(), allow_null=True, required=False)
+    genero = ReferenciaField(queryset=Genero.objects.all(), allow_null=True, required=False)
+    temporada = ReferenciaField(queryset=Temporada.objects.all(), allow_null=True, required=False)
+    marca = ReferenciaField(queryset=Marca.objects.all(), allow_null=True, required=False)
 
     class Meta:
         model = Producto
-        fields = '__all__'
-        extra_fields = ['tallas', 'stocks', 'imagenes']
+        exclude = ['search_vector']
+        extra_fields = ['tallas', 'stocks', 'imagenes', 'imagenes_eliminar', 'imagenes_orden']
 
     def validate(self, attrs):
         tallas_str = attrs.get('tallas')
@@ -31,15 +60,15 @@ class ProductSerializer(serializers.ModelSerializer):
         except ValueError:
             raise ValidationError("Los stocks deben ser números enteros válidos.")
 
-        existing_tallas = Talla.objects.values_list('nombre', flat=True)
-        invalid_tallas = [t for t in tallas_list if t not in existing_tallas]
+        tallas = [referencias.por_nombre(Talla, t) for t in tallas_list]
+        invalid_tallas = [nombre for nombre, talla in zip(tallas_list, tallas) if talla is None]
         if invalid_tallas:
             raise ValidationError(
                 f"Las siguientes tallas no existen: {', '.join(invalid_tallas)}."
             )
 
         # Guardar resultados ya procesados en attrs para reusarlos en create/update
-        attrs['tallas_list'] = tallas_list
+        attrs['tallas_list'] = tallas
         attrs['stocks_int'] = stocks_int
 
         return attrs
@@ -48,6 +77,8 @@ class ProductSerializer(serializers.ModelSerializer):
         tallas_list = validated_data.pop('tallas_list')
         stocks_int = validated_data.pop('stocks_int')
         imagenes = validated_data.pop('imagenes', [])
+        validated_data.pop('imagenes_eliminar', None)
+        validated_data.pop('imagenes_orden', None)
 
         # Limpieza para que no reviente
         validated_data.pop('tallas', None)
@@ -55,16 +86,11 @@ class ProductSerializer(serializers.ModelSerializer):
 
         producto = Producto.objects.create(**validated_data)
 
-        for talla_nombre, stock in zip(tallas_list, stocks_int):
-            talla = Talla.objects.get(nombre=talla_nombre)
-            ProductoTallaStock.objects.create(producto=producto, talla=talla, stock=stock)
+        sincronizar_stock({producto.pk: _stocks_por_talla(tallas_list, stocks_int)}, nuevos=True)
+        producto.refresh_from_db(fields=['stock_total'])
 
-        for idx, imagen in enumerate(imagenes):
-            ImagenProducto.objects.create(
-                producto=producto,
-                imagen=imagen,
-                principal=(idx == 0)
-            )
+        # Se guardan en paralelo y se insertan de una vez; la primera es la principal
+        agregar_imagenes(producto, imagenes)
 
         return producto
 
@@ -72,6 +98,8 @@ class ProductSerializer(serializers.ModelSerializer):
         tallas_list = validated_data.pop('tallas_list')
         stocks_int = validated_data.pop('stocks_int')
         imagenes = validated_data.pop('imagenes', [])
+        eliminar = validated_data.pop('imagenes_eliminar', [])
+        orden = validated_data.pop('imagenes_orden', [])
 
         # 👇 Limpieza para que no reviente
         validated_data.pop('tallas', None)
@@ -82,21 +110,17 @@ class ProductSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
-        # Eliminar tallas/stocks anteriores y crear nuevos
-        ProductoTallaStock.objects.filter(producto=instance).delete()
-        for talla_nombre, stock in zip(tallas_list, stocks_int):
-            talla = Talla.objects.get(nombre=talla_nombre)
-            ProductoTallaStock.objects.create(producto=instance, talla=talla, stock=stock)
-
-        # Si se proporcionan nuevas imágenes, reemplazar las existentes
-        if imagenes:
-            instance.imagenes.all().delete()  # Eliminar imágenes anteriores
-            for idx, imagen in enumerate(imagenes):
-                ImagenProducto.objects.create(
-                    producto=instance,
-                    imagen=imagen,
-                    principal=(idx == 0)
-                )
+        # Solo se tocan las tallas cuyo stock cambió, las nuevas y las que ya no vienen
+        sincronizar_stock({instance.pk: _stocks_por_talla(tallas_list, stocks_int)})
+        instance.refresh_from_db(fields=['stock_total', 'precio_final'])
+
+        # Las imágenes se editan por id: se quitan las indicadas, las nuevas se
+        # agregan al final y luego se aplica el orden pedido
+        if eliminar:
+            instance.imagenes.filter(pk__in=eliminar).delete()
+        agregar_imagenes(instance, imagenes)
+        if eliminar or imagenes or orden:
+            ordenar_imagenes(instance, orden)
 
         return instance
 
@@ -104,7 +128,76 @@ class ProductSerializer(serializers.ModelSerializer):
         # Para respuestas GET, agregamos tallas y stocks como strings
         representation = super().to_representation(instance)
         talla_stocks = instance.talla_stock.all()
-        representation['tallas'] = ', '.join([ts.talla.nombre for ts in talla_stocks])
+        representation['tallas'] = ', '.join([_talla(ts).nombre for ts in talla_stocks])
         representation['stocks'] = ', '.join([str(ts.stock) for ts in talla_stocks])
         representation['imagenes'] = [img.imagen.url for img in instance.imagenes.all()]
-        return representation
\ No newline at end of file
+        # Mismo orden que `imagenes`, con las versiones reducidas para <picture>/srcset
+        representation['imagenes_srcset'] = [
+            {'id': img.id, 'original': img.imagen.url, 'principal': img.principal, 'srcset': img.srcset()}
+            for img in instance.imagenes.all()
+        ]
+        return representation
+
+def _stocks_por_talla(tallas, stocks):
+    # Si una talla se repite, gana el último stock (igual que en el importador)
+    return {talla.pk: stock for talla, stock in zip(tallas, stocks)}
+
+def _talla(talla_stock):
+    # Si la talla no vino con select_related, la tomamos del registro en memoria
+    if ProductoTallaStock.talla.is_cached(talla_stock):
+        return talla_stock.talla
+    return referencias.por_id(Talla, talla_stock.talla_id) or talla_stock.talla
+
+class TrabajoImportacionSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+    created = serializers.IntegerField(source='creados', read_only=True)
+    updated = serializers.IntegerField(source='actualizados', read_only=True)
+    unchanged = serializers.IntegerField(source='sin_cambios', read_only=True)
+    errors = serializers.JSONField(source='errores', read_only=True)
+    diff = serializers.JSONField(source='diferencias', read_only=True)
+
+    class Meta:
+        model = TrabajoImportacion
+        fields = [
+            'job_id', 'estado', 'modo', 'total_filas', 'filas_procesadas', 'filas_por_lote', 'filas_confirmadas',
+            'created', 'updated', 'unchanged', 'errors', 'diff',
+            'fecha_creacion', 'fecha_inicio', 'ultimo_avance', 'fecha_fin',
+        ]
+
+
+class OpcionesImportacionSerializer(serializers.Serializer):
+    # dry_run: solo valida y devuelve el diff; commit=chunked: una transacción cada chunk_size filas
+    dry_run = serializers.BooleanField(default=False)
+    commit = serializers.ChoiceField(choices=['atomic', 'chunked'], default='atomic')
+    chunk_size = serializers.IntegerField(min_value=1, max_value=100_000, required=False)
+
+    def validate(self, attrs):
+        if attrs['dry_run'] and attrs['commit'] == 'chunked':
+            raise serializers.ValidationError("dry_run no escribe nada: no se puede combinar con commit=chunked.")
+        return attrs
+
+    def campos_trabajo(self):
+        if self.validated_data['dry_run']:
+            return {'modo': TrabajoImportacion.SIMULACION}
+        if self.validated_data['commit'] == 'chunked':
+            return {'modo': TrabajoImportacion.LOTES, 'filas_por_lote': self.validated_data.get('chunk_size')}
+        return {'modo': TrabajoImportacion.ATOMICO}
+
+
+class LineaStockSerializer(serializers.Serializer):
+    producto = serializers.UUIDField()
+    talla = serializers.CharField()  # Nombre de la talla, como en el resto de la API
+    cantidad = serializers.IntegerField(min_value=1)
+
+class MovimientoStockSerializer(serializers.Serializer):
+    lineas = serializers.ListField(child=LineaStockSerializer(), allow_empty=False, max_length=200)
+    # False: si una línea no alcanza no se descuenta ninguna (todo o nada)
+    parcial = serializers.BooleanField(default=False)
+
+    def lineas_para_stock(self):
+        # (producto_id, talla_id, cantidad); una talla desconocida queda como None y falla en su línea
+        lineas = []
+        for linea in self.validated_data['lineas']:
+            talla = referencias.por_nombre(Talla, linea['talla'])
+            lineas.append((linea['producto'], talla.pk if talla else None, linea['cantidad']))
+        return lineas
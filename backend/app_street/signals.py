@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache_catalogo import invalidar_catalogo
+from .referencias import MODELOS_REFERENCIA, invalidar_referencias
+from .imagenes import encolar_versiones
+from .trabajos import recuperar_en_segundo_plano
+from .models import (
+    Producto, ProductoTallaStock, ImagenProducto, Categoria, Genero, Temporada, Marca, Talla,
+    recalcular_stock_total,
+)
+
+
+# Mantienen Producto.stock_total al guardar/borrar filas de stock una por una
+# (serializer, inlines del admin). Las escrituras en bloque (bulk_create,
+# bulk_update) no disparan señales y llaman a recalcular_stock_total directamente.
+@receiver(post_save, sender=ProductoTallaStock)
+@receiver(post_delete, sender=ProductoTallaStock)
+def actualizar_stock_total(sender, instance, **kwargs):
+    recalcular_stock_total([instance.producto_id])
+
+
+# Cualquier cambio que se vea en la API invalida las respuestas cacheadas del
+# catálogo. Las escrituras en bloque (importador) llaman a invalidar_catalogo.
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=ProductoTallaStock)
+@receiver(post_delete, sender=ProductoTallaStock)
+@receiver(post_save, sender=ImagenProducto)
+@receiver(post_delete, sender=ImagenProducto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Genero)
+@receiver(post_delete, sender=Genero)
+@receiver(post_save, sender=Temporada)
+@receiver(post_delete, sender=Temporada)
+@receiver(post_save, sender=Marca)
+@receiver(post_delete, sender=Marca)
+@receiver(post_save, sender=Talla)
+@receiver(post_delete, sender=Talla)
+def invalidar_cache_catalogo(sender, **kwargs):
+    invalidar_catalogo()
+
+
+def invalidar_registro_referencias(sender, **kwargs):
+    invalidar_referencias(sender)
+
+
+for _modelo in MODELOS_REFERENCIA:
+    post_save.connect(invalidar_registro_referencias, sender=_modelo, dispatch_uid=f'referencias_save_{_modelo.__name__}')
+    post_delete.connect(invalidar_registro_referencias, sender=_modelo, dispatch_uid=f'referencias_delete_{_modelo.__name__}')
+
+
+# Versiones reducidas de cada imagen nueva o reemplazada, fuera del request
+@receiver(post_save, sender=ImagenProducto)
+def generar_versiones_imagen(sender, instance, **kwargs):
+    if instance.necesita_versiones():
+        encolar_versiones(instance.pk)
+
+
+# Con IMPORT_JOBS_RUNNER = 'thread' la cola vive en memoria del proceso: en el
+# primer request de cada proceso se recuperan los trabajos que dejó un reinicio
+@receiver(request_started, dispatch_uid='recuperar_importaciones')
+def recuperar_importaciones(sender, **kwargs):
+    request_started.disconnect(dispatch_uid='recuperar_importaciones')
+    if getattr(settings, 'IMPORT_JOBS_RUNNER', 'thread') == 'thread':
+        recuperar_en_segundo_plano()
@@ -0,0 +1,373 @@
+"""
+Foto columnar del catálogo (productos + stock por talla) en archivos .npy.
+
+Cada generación es un directorio con un arreglo NumPy por columna; los textos
+se guardan como un blob UTF-8 + offsets y el stock por talla en formato CSR
+(offsets por producto + talla_id + cantidad). Los lectores abren los archivos
+con mmap, así todos los workers comparten las mismas páginas en memoria.
+
+La foto se actualiza de forma incremental: solo se releen los productos
+creados/modificados desde el último marcador (fecha_registro /
+fecha_modificacion) y se descartan los que ya no existen. Los requests que
+la leen la ponen al día antes si el catálogo cambió, así nunca sirven datos
+viejos; `generar_snapshot` (p. ej. desde cron) la mantiene al día para que
+casi nunca tengan que hacerlo.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max, Q
+
+from .models import Producto, ProductoTallaStock, Categoria, Genero, Temporada, Marca, Talla
+from .referencias import referencias as registro_referencias
+
+CHUNK_SIZE = 2000
+ARCHIVO_ACTUAL = 'ACTUAL'
+# Clave del advisory lock de PostgreSQL: una sola regeneración a la vez
+LOCK_SNAPSHOT = 0x5354_5245  # "STRE"
+
+TEXTOS = ('sku', 'nombre', 'descripcion')
+# columna -> dtype
+NUMERICAS = {
+    'id': 'S36',
+    'precio_centavos': np.int64,
+    'en_oferta': np.bool_,
+    'descuento_porcentaje': np.int16,
+    'categoria': np.int64,  # 0 = sin valor
+    'genero': np.int64,
+    'temporada': np.int64,
+    'marca': np.int64,
+    'stock_total': np.int64,
+    'fecha_registro': np.int64,  # microsegundos desde epoch (UTC)
+}
+# Se incrementa cuando cambia el contenido de los archivos (2: stock ordenado por talla_id)
+FORMATO = 2
+REFERENCIAS = {'categoria': Categoria, 'genero': Genero, 'temporada': Temporada, 'marca': Marca, 'talla': Talla}
+
+CAMPOS_PRODUCTO = (
+    'id', 'sku', 'nombre', 'descripcion', 'precio_base', 'en_oferta', 'descuento_porcentaje',
+    'categoria_id', 'genero_id', 'temporada_id', 'marca_id', 'stock_total', 'fecha_registro',
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_abiertas = {}
+_lock_abiertas = threading.Lock()
+
+
+def directorio_snapshot():
+    return os.fspath(getattr(settings, 'CATALOGO_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'snapshot')))
+
+
+class SnapshotCatalogo:
+    """Una generación de la foto, abierta con mmap (solo lectura)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(os.path.join(ruta, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.generacion = self.meta['generacion']
+        self.total = self.meta['total']
+        self.marcador = datetime.fromisoformat(self.meta['marcador']) if self.meta['marcador'] else None
+        self.referencias = {
+            tipo: {int(pk): nombre for pk, nombre in nombres.items()}
+            for tipo, nombres in self.meta['referencias'].items()
+        }
+        cargar = lambda nombre: np.load(os.path.join(ruta, f'{nombre}.npy'), mmap_mode='r')
+        self.columnas = {nombre: cargar(nombre) for nombre in NUMERICAS}
+        self.textos = {nombre: (cargar(f'{nombre}.offsets'), cargar(f'{nombre}.blob')) for nombre in TEXTOS}
+        self.stock_offsets = cargar('stock.offsets')
+        self.stock_talla = cargar('stock.talla')
+        self.stock_cantidad = cargar('stock.cantidad')
+
+    def __len__(self):
+        return self.total
+
+    def texto_bytes(self, columna, i):
+        offsets, blob = self.textos[columna]
+        return blob[offsets[i]:offsets[i + 1]].tobytes()
+
+    def texto(self, columna, i):
+        return self.texto_bytes(columna, i).decode('utf-8')
+
+    def stocks(self, i):
+        """(talla_ids, cantidades) del producto i, ordenados por talla_id (como ProductoTallaStock)."""
+        inicio, fin = self.stock_offsets[i], self.stock_offsets[i + 1]
+        return self.stock_talla[inicio:fin], self.stock_cantidad[inicio:fin]
+
+    def nombre(self, tipo, pk):
+        return self.referencias[tipo].get(int(pk), '') if pk else ''
+
+    def precio(self, i):
+        return Decimal(int(self.columnas['precio_centavos'][i])).scaleb(-2)
+
+
+# --- Lectura ---
+
+def _leer_actual():
+    try:
+        with open(os.path.join(directorio_snapshot(), ARCHIVO_ACTUAL), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_actual():
+    """La última generación escrita (o None). Se reabre solo si cambió."""
+    nombre = _leer_actual()
+    if nombre is None:
+        return None
+    with _lock_abiertas:
+        snapshot = _abiertas.get('actual')
+        ruta = os.path.join(directorio_snapshot(), nombre)
+        if snapshot is None or snapshot.ruta != ruta:
+            snapshot = SnapshotCatalogo(ruta)
+            _abiertas['actual'] = snapshot
+        return snapshot
+
+
+# --- Construcción ---
+
+def _estado_catalogo():
+    estado = Producto.objects.aggregate(marcador=Max('fecha_modificacion'), total=Count('id'))
+    # Los nombres de las clasificaciones salen del registro en memoria (sin consultas)
+    estado['referencias'] = {
+        tipo: {obj.pk: obj.nombre for obj in registro_referencias.todos(modelo)}
+        for tipo, modelo in REFERENCIAS.items()
+    }
+    return estado
+
+
+def actualizar_snapshot(completo=False, chunk_size=CHUNK_SIZE):
+    """
+    Devuelve la foto al día. Si el catálogo no cambió (mismo total y ningún
+    fecha_modificacion posterior al marcador) no se toca; si cambió, se
+    escribe una generación nueva releyendo solo lo modificado.
+
+    Un cambio que se confirma con una fecha anterior al marcador (transacción
+    larga) entra en la siguiente regeneración gracias al solapamiento; el
+    comando `generar_snapshot --completo` la reconstruye desde cero.
+    """
+    actual = _base(completo)
+    estado = _estado_catalogo()
+    if actual is not None and _al_dia(actual, estado):
+        return actual
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [LOCK_SNAPSHOT])
+    try:
+        # Otro proceso pudo haberla regenerado mientras esperábamos el lock
+        actual = _base(completo)
+        estado = _estado_catalogo()
+        if actual is not None and _al_dia(actual, estado):
+            return actual
+        filas = _construir(actual, estado, chunk_size)
+        # Se numera después de la publicada aunque se reconstruya desde cero
+        publicada = snapshot_actual()
+        nombre = _escribir(filas, estado, (publicada.generacion + 1) if publicada else 1)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [LOCK_SNAPSHOT])
+
+    _limpiar_generaciones(conservar=nombre)
+    return snapshot_actual()
+
+
+def _base(completo):
+    # Generación de la que partir; una escrita con otro FORMATO se reconstruye entera
+    actual = None if completo else snapshot_actual()
+    if actual is not None and actual.meta.get('formato') != FORMATO:
+        return None
+    return actual
+
+
+def _al_dia(snapshot, estado):
+    return snapshot.total == estado['total'] and snapshot.referencias == estado['referencias'] and (
+        estado['marcador'] is None or (snapshot.marcador is not None and estado['marcador'] <= snapshot.marcador)
+    )
+
+
+def _construir(actual, estado, chunk_size):
+    # El orden (por SKU, con la collation de la base) y el conjunto de ids vigentes
+    # salen de una sola lectura del índice único de sku
+    ids_en_orden = [str(pk) for pk in Producto.objects.order_by('sku').values_list('id', flat=True)]
+
+    releer = set(ids_en_orden)
+    previas = {}
+    if actual is not None and actual.marcador is not None:
+        # Solapamos unos minutos: una transacción que empezó antes del marcador
+        # puede confirmar cambios con una fecha anterior a él
+        desde = actual.marcador - timedelta(seconds=getattr(settings, 'CATALOGO_SNAPSHOT_SOLAPE', 300))
+        releer = {
+            str(pk) for pk in Producto.objects
+            .filter(Q(fecha_registro__gt=desde) | Q(fecha_modificacion__gt=desde))
+            .values_list('id', flat=True)
+        }
+        previas = {pk.decode('ascii'): i for i, pk in enumerate(actual.columnas['id'])}
+
+    pendientes = [pk for pk in ids_en_orden if pk in releer or pk not in previas]
+
+    def filas():
+        # Los productos a releer se cargan de a chunk_size a medida que se
+        # escriben: en memoria hay un bloque, no el catálogo entero
+        nuevas, leidos = {}, 0
+        for pk in ids_en_orden:
+            if pk in releer or pk not in previas:
+                if leidos % chunk_size == 0:
+                    nuevas = _leer_productos(pendientes[leidos:leidos + chunk_size])
+                leidos += 1
+                if pk in nuevas:
+                    yield ('db', nuevas[pk])
+                    continue
+            # Sin cambios, o borrado mientras se construía (la próxima actualización lo nota)
+            if pk in previas:
+                yield ('previa', previas[pk])
+
+    return actual, ids_en_orden, filas()
+
+
+def _leer_productos(lote):
+    stocks = {}
+    for producto_id, talla_id, cantidad in (
+        ProductoTallaStock.objects.filter(producto_id__in=lote).order_by().values_list('producto_id', 'talla_id', 'stock')
+    ):
+        stocks.setdefault(str(producto_id), []).append((talla_id, cantidad))
+    return {
+        str(valores[0]): (valores, stocks.get(str(valores[0]), []))
+        for valores in Producto.objects.filter(pk__in=lote).order_by().values_list(*CAMPOS_PRODUCTO)
+    }
+
+
+def _micros(fecha):
+    return (fecha - _EPOCH) // timedelta(microseconds=1)
+
+
+def _escribir(construccion, estado, generacion):
+    actual, ids_en_orden, filas = construccion
+    referencias = estado['referencias']
+
+    # Tamaño máximo: un producto borrado durante la construcción no se escribe
+    total = len(ids_en_orden)
+    numericas = {nombre: np.zeros(total, dtype=dtype) for nombre, dtype in NUMERICAS.items()}
+    textos = {nombre: [] for nombre in TEXTOS}
+    stock_offsets = np.zeros(total + 1, dtype=np.int64)
+    stock_talla, stock_cantidad = [], []
+
+    for i, (origen, dato) in enumerate(filas):
+        if origen == 'db':
+            valores, stocks = dato
+            (pk, sku, nombre, descripcion, precio, en_oferta, descuento,
+             categoria, genero, temporada, marca, stock_total, fecha_registro) = valores
+            fila = {
+                'id': str(pk).encode('ascii'),
+                'precio_centavos': int(precio * 100),
+                'en_oferta': en_oferta,
+                'descuento_porcentaje': descuento,
+                'categoria': categoria or 0,
+                'genero': genero or 0,
+                'temporada': temporada or 0,
+                'marca': marca or 0,
+                'stock_total': stock_total,
+                'fecha_registro': _micros(fecha_registro),
+            }
+            for columna, valor in fila.items():
+                numericas[columna][i] = valor
+            for columna, valor in zip(TEXTOS, (sku, nombre, descripcion)):
+                textos[columna].append((valor or '').encode('utf-8'))
+            # Mismo orden que ProductoTallaStock.Meta.ordering
+            stocks.sort()
+            stock_talla.extend(s[0] for s in stocks)
+            stock_cantidad.extend(s[1] for s in stocks)
+            stock_offsets[i + 1] = stock_offsets[i] + len(stocks)
+        else:
+            # Fila sin cambios: se copia tal cual desde la generación anterior
+            for columna in NUMERICAS:
+                numericas[columna][i] = actual.columnas[columna][dato]
+            for columna in TEXTOS:
+                textos[columna].append(actual.texto_bytes(columna, dato))
+            tallas, cantidades = actual.stocks(dato)
+            stock_talla.extend(tallas.tolist())
+            stock_cantidad.extend(cantidades.tolist())
+            stock_offsets[i + 1] = stock_offsets[i] + len(tallas)
+
+    total = len(textos['sku'])
+    if total < len(ids_en_orden):
+        numericas = {columna: arreglo[:total] for columna, arreglo in numericas.items()}
+        stock_offsets = stock_offsets[:total + 1]
+
+    base = directorio_snapshot()
+    os.makedirs(base, exist_ok=True)
+    temporal = os.path.join(base, f'tmp-{uuid.uuid4().hex}')
+    os.makedirs(temporal)
+    guardar = lambda nombre, arreglo: np.save(os.path.join(temporal, f'{nombre}.npy'), arreglo)
+    for columna, arreglo in numericas.items():
+        guardar(columna, arreglo)
+    for columna, valores in textos.items():
+        offsets = np.zeros(len(valores) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in valores], out=offsets[1:])
+        guardar(f'{columna}.offsets', offsets)
+        guardar(f'{columna}.blob', np.frombuffer(b''.join(valores), dtype=np.uint8))
+    guardar('stock.offsets', stock_offsets)
+    guardar('stock.talla', np.array(stock_talla, dtype=np.int64))
+    guardar('stock.cantidad', np.array(stock_cantidad, dtype=np.int64))
+
+    meta = {
+        'formato': FORMATO,
+        'generacion': generacion,
+        'total': total,
+        'marcador': estado['marcador'].isoformat() if estado['marcador'] else None,
+        'referencias': {tipo: {str(pk): nombre for pk, nombre in nombres.items()} for tipo, nombres in referencias.items()},
+    }
+    with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # Se publica con renombres atómicos: los lectores ven la generación vieja o la nueva completa
+    nombre = f'gen-{generacion:06d}-{uuid.uuid4().hex[:8]}'
+    os.replace(temporal, os.path.join(base, nombre))
+    puntero = os.path.join(base, f'{ARCHIVO_ACTUAL}.{uuid.uuid4().hex}')
+    with open(puntero, 'w', encoding='utf-8') as f:
+        f.write(nombre)
+    os.replace(puntero, os.path.join(base, ARCHIVO_ACTUAL))
+    return nombre
+
+
+def _limpiar_generaciones(conservar):
+    # Se conserva también la anterior: puede haber lectores que todavía la tengan abierta
+    base = directorio_snapshot()
+    generaciones = sorted(n for n in os.listdir(base) if n.startswith('gen-'))
+    for nombre in generaciones[:-2]:
+        if nombre != conservar:
+            shutil.rmtree(os.path.join(base, nombre), ignore_errors=True)
+
+
+# --- Consultas sobre la foto ---
+
+def resumen_stock(snapshot):
+    """Productos y unidades en stock por categoría y unidades por talla, con NumPy."""
+    categorias = snapshot.columnas['categoria']
+    stock_total = snapshot.columnas['stock_total']
+    largo = int(categorias.max(initial=0)) + 1
+    productos = np.bincount(categorias, minlength=largo)
+    unidades = np.bincount(categorias, weights=stock_total, minlength=largo)
+    tallas = snapshot.stock_talla
+    por_talla = np.bincount(tallas, weights=snapshot.stock_cantidad, minlength=int(tallas.max(initial=0)) + 1)
+    return {
+        'generacion': snapshot.generacion,
+        'total_productos': snapshot.total,
+        'total_unidades': int(stock_total.sum()),
+        'por_categoria': [
+            {'categoria': snapshot.nombre('categoria', pk) or None, 'productos': int(productos[pk]), 'unidades': int(unidades[pk])}
+            for pk in np.flatnonzero(productos)
+        ],
+        'por_talla': [
+            {'talla': snapshot.nombre('talla', pk), 'unidades': int(por_talla[pk])}
+            for pk in np.flatnonzero(por_talla)
+        ],
+    }
@@ -10,9 +10,16 @@ document.addEventListener('DOMContentLoaded', function() {
   const buscadorProducto = document.getElementById('buscador-producto');
   const resultadosBusqueda = document.getElementById('resultados-busqueda');
 
+  // Tablas de clasificación que vienen en la página ({"marcas": {"1": "Nike"}, ...})
+  const datosReferencia = JSON.parse(document.getElementById('datos-referencia').textContent);
+
   let estadoEditar = false;
   let productoActual = null;
   let debounceTimer; // Para no saturar la API con búsquedas
+  // Peticiones en curso: una búsqueda o un producto nuevo cancelan la anterior
+  let busquedaEnCurso = null;
+  let detalleEnCurso = null;
+  let siguientePagina = null;
 
   // Función para habilitar/deshabilitar elementos
   function toggleElemento(elemento, habilitar) {
@@ -36,8 +43,11 @@ document.addEventListener('DOMContentLoaded', function() {
       toggleElemento(btnAgregar, false);
       
       // Hacemos la llamada a la API para obtener los detalles completos
+      if (detalleEnCurso) detalleEnCurso.abort();
+      detalleEnCurso = new AbortController();
       fetch(`/api/productos/${productoId}/`, {
-        headers: { 'Accept': 'application/json' }
+        headers: { 'Accept': 'application/json' },
+        signal: detalleEnCurso.signal
       })
       .then(res => res.json())
       .then(data => {
@@ -64,6 +74,7 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log("Producto cargado:", data);
       })
       .catch(err => {
+        if (err.name === 'AbortError') return; // Se eligió otro producto
         console.error("Error cargando producto:", err);
         alert("Error al cargar el producto");
       });
@@ -109,16 +120,23 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
 
-  function mostrarResultados(productos) {
-    resultadosBusqueda.innerHTML = ''; // Limpiar resultados anteriores
+  // La API devuelve páginas { next, previous, results }; "Cargar más" pide la siguiente
+  function mostrarResultados(pagina, agregar = false) {
+    const productos = pagina.results;
+    if (!agregar) {
+      resultadosBusqueda.innerHTML = ''; // Limpiar resultados anteriores
+    }
+    const cargarMasAnterior = resultadosBusqueda.querySelector('.cargar-mas');
+    if (cargarMasAnterior) cargarMasAnterior.remove();
     
-    if (productos.length === 0) {
+    if (!agregar && productos.length === 0) {
       resultadosBusqueda.innerHTML = `<div class="resultado-item no-results">No se encontraron productos</div>`;
     } else {
       productos.forEach(producto => {
         const item = document.createElement('div');
         item.classList.add('resultado-item');
-        item.textContent = `${producto.nombre} (${producto.sku})`;
+        const marca = datosReferencia.marcas[producto.marca];
+        item.textContent = `${producto.nombre} (${producto.sku})${marca ? ' · ' + marca : ''}`;
         item.dataset.id = producto.id; // Guardamos el ID en el elemento
 
         // Evento clave: al hacer clic en un resultado
@@ -132,9 +150,43 @@ document.addEventListener('DOMContentLoaded', function() {
       });
     }
 
+    siguientePagina = pagina.next;
+    if (pagina.next) {
+      const cargarMas = document.createElement('div');
+      cargarMas.classList.add('resultado-item', 'cargar-mas');
+      cargarMas.textContent = 'Cargar más resultados...';
+      cargarMas.addEventListener('click', (e) => {
+        e.stopPropagation();
+        buscarPagina(pagina.next, true);
+      });
+      resultadosBusqueda.appendChild(cargarMas);
+    }
+
     resultadosBusqueda.classList.add('activo'); // Muestra el desplegable
   }
 
+  function buscarPagina(url, agregar = false) {
+    // Solo importa la última petición: las respuestas viejas se descartan
+    if (busquedaEnCurso) busquedaEnCurso.abort();
+    busquedaEnCurso = new AbortController();
+    siguientePagina = null;
+    fetch(url, { headers: { 'Accept': 'application/json' }, signal: busquedaEnCurso.signal })
+      .then(response => response.json())
+      .then(pagina => {
+        busquedaEnCurso = null;
+        mostrarResultados(pagina, agregar);
+      })
+      .catch(error => {
+        if (error.name !== 'AbortError') console.error('Error en la búsqueda:', error);
+      });
+  }
+
+  function cancelarBusqueda() {
+    clearTimeout(debounceTimer);
+    if (busquedaEnCurso) busquedaEnCurso.abort();
+    busquedaEnCurso = null;
+  }
+
   // --- EVENT LISTENERS ---
 
   checkboxOferta.addEventListener('change', actualizarEstados);
@@ -147,9 +199,10 @@ document.addEventListener('DOMContentLoaded', function() {
     calcularPrecioFinal();
   });
 
-  buscadorProducto.addEventListener('keyup', (e) => {
+  // 'input' también cubre pegar/borrar con el mouse y no se dispara con las flechas
+  buscadorProducto.addEventListener('input', (e) => {
     const query = e.target.value.trim();
-    clearTimeout(debounceTimer);
+    cancelarBusqueda();
 
     if (query.length < 2) { // No buscar si hay menos de 2 caracteres
       resultadosBusqueda.classList.remove('activo');
@@ -161,14 +214,24 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Debounce: Espera 300ms después de que el usuario deja de teclear
     debounceTimer = setTimeout(() => {
-      fetch(`/api/productos/?search=${encodeURIComponent(query)}`)
-        .then(response => response.json())
-        .then(data => {
-          mostrarResultados(data);
-        })
-        .catch(error => console.error('Error en la búsqueda:', error));
+      buscarPagina(`/api/productos/?search=${encodeURIComponent(query)}&page_size=20`);
     }, 300);
   });
+
+  // Con el buscador vacío, al enfocarlo se muestran los últimos productos (una página)
+  buscadorProducto.addEventListener('focus', () => {
+    if (buscadorProducto.value.trim() === '') {
+      buscarPagina('/api/productos/?page_size=20');
+    }
+  });
+
+  // Al llegar al final del desplegable se pide la página siguiente
+  resultadosBusqueda.addEventListener('scroll', () => {
+    const alFinal = resultadosBusqueda.scrollTop + resultadosBusqueda.clientHeight >= resultadosBusqueda.scrollHeight - 40;
+    if (alFinal && siguientePagina && !busquedaEnCurso) {
+      buscarPagina(siguientePagina, true);
+    }
+  });
   
   document.addEventListener('click', (e) => {
     if (!buscadorProducto.contains(e.target) && !resultadosBusqueda.contains(e.target)) {
@@ -265,6 +328,59 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   });
 
+  // Importar Excel - El servidor devuelve un job y lo procesa en segundo plano
+  const importForm = document.getElementById('import-form');
+  const btnImportar = document.getElementById('btn-importar');
+
+  function consultarImportacion(statusUrl) {
+    fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+      .then(response => response.json())
+      .then(job => {
+        if (job.estado === 'pendiente' || job.estado === 'procesando') {
+          btnImportar.textContent = `Importando... ${job.filas_procesadas}/${job.total_filas || '?'}`;
+          setTimeout(() => consultarImportacion(statusUrl), 1000);
+          return;
+        }
+        btnImportar.textContent = 'Importar';
+        toggleElemento(btnImportar, true);
+        if (job.estado === 'completado') {
+          const titulo = job.modo === 'simulacion' ? 'Simulación (no se guardó nada)' : '¡Importación completada!';
+          alert(`${titulo} Creados: ${job.created}, actualizados: ${job.updated}, sin cambios: ${job.unchanged}`);
+        } else {
+          alert(`La importación falló:\n${job.errors.join('\n')}`);
+        }
+      })
+      .catch(error => {
+        console.error('Error consultando la importación:', error);
+        btnImportar.textContent = 'Importar';
+        toggleElemento(btnImportar, true);
+      });
+  }
+
+  importForm.addEventListener('submit', function(event) {
+    event.preventDefault();
+    const formData = new FormData(importForm);
+    if (!formData.get('excel_file') || !formData.get('excel_file').name) {
+      return alert("Selecciona un archivo Excel, CSV o Parquet para importar");
+    }
+
+    toggleElemento(btnImportar, false);
+    fetch('/import/', {
+      method: 'POST',
+      headers: { 'X-CSRFToken': formData.get('csrfmiddlewaretoken') },
+      body: formData
+    })
+    .then(response => response.ok ? response.json() : Promise.reject(response.json()))
+    .then(job => consultarImportacion(job.status_url))
+    .catch(errorPromise => {
+      toggleElemento(btnImportar, true);
+      Promise.resolve(errorPromise).then(error => {
+        console.error('Error:', error);
+        alert(`Error al importar: ${JSON.stringify(error)}`);
+      });
+    });
+  });
+
   // Inicializar estados al cargar la página
   actualizarEstados();
 });
@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache_catalogo import invalidar_catalogo
+from .models import Producto, ProductoTallaStock, recalcular_stock_total
+
+
+def sincronizar_stock(stocks_por_producto, batch_size=None, nuevos=False):
+    """
+    Deja las filas de ProductoTallaStock iguales a `stocks_por_producto`
+    ({producto_id: {talla_id: stock}}) comparando con lo que ya existe:
+    solo se actualizan los stocks distintos, se crean las tallas nuevas y se
+    borran las que ya no vienen. Un producto sin cambios cuesta una lectura.
+
+    Con nuevos=True se asume que los productos no tienen filas y se omite la lectura.
+    Devuelve el conjunto de producto_id que cambiaron.
+    """
+    batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+    producto_ids = list(stocks_por_producto)
+    a_actualizar, a_crear, a_borrar = [], [], []
+
+    for i in range(0, len(producto_ids), batch_size):
+        lote = producto_ids[i:i + batch_size]
+        actuales = {}
+        if not nuevos:
+            filas = (
+                ProductoTallaStock.objects
+                .filter(producto_id__in=lote)
+                .order_by()
+                .only('id', 'producto_id', 'talla_id', 'stock')
+            )
+            for fila in filas:
+                actuales[(fila.producto_id, fila.talla_id)] = fila
+
+        for producto_id in lote:
+            deseado = stocks_por_producto[producto_id]
+            for talla_id, stock in deseado.items():
+                fila = actuales.pop((producto_id, talla_id), None)
+                if fila is None:
+                    a_crear.append(ProductoTallaStock(producto_id=producto_id, talla_id=talla_id, stock=stock))
+                elif fila.stock != stock:
+                    fila.stock = stock
+                    a_actualizar.append(fila)
+        # Lo que quedó sin emparejar son tallas que ya no vienen
+        a_borrar.extend(actuales.values())
+
+    ProductoTallaStock.objects.bulk_update(a_actualizar, ['stock'], batch_size=batch_size)
+    # Upsert: si otra importación creó la misma talla entre la lectura y el
+    # INSERT, se actualiza su stock en lugar de fallar por la restricción única
+    ProductoTallaStock.objects.bulk_create(
+        a_crear,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['producto', 'talla'],
+        update_fields=['stock'],
+    )
+    pks = [fila.pk for fila in a_borrar]
+    if pks:
+        # Un DELETE por lote, sin cargar las filas: QuerySet.delete() dispararía
+        # post_delete por cada una (recálculo de stock_total e invalidación de la
+        # caché), que aquí se hacen una sola vez abajo
+        with connection.cursor() as cursor:
+            for i in range(0, len(pks), batch_size):
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(ProductoTallaStock._meta.db_table)} WHERE id = ANY(%s)',
+                    [pks[i:i + batch_size]],
+                )
+
+    cambiados = {fila.producto_id for fila in a_actualizar + a_crear + a_borrar}
+    if cambiados:
+        recalcular_stock_total(cambiados, batch_size=batch_size)
+        invalidar_catalogo()
+    return cambiados
+
+
+def descontar_stock(lineas, parcial=False):
+    """
+    Descuenta stock de varias líneas [(producto_id, talla_id, cantidad)] en una
+    transacción. Cada línea es un UPDATE condicional
+        UPDATE ... SET stock = stock - n WHERE producto_id = .. AND talla_id = .. AND stock >= n
+    así dos compras simultáneas nunca dejan el stock negativo: la segunda
+    espera el lock de la fila y, si ya no alcanza, no actualiza nada.
+
+    Si alguna línea falla y parcial=False no se descuenta ninguna.
+    Devuelve una lista de resultados en el mismo orden que `lineas`.
+    """
+    return _mover_stock(lineas, signo=-1, parcial=parcial)
+
+
+def liberar_stock(lineas):
+    """Devuelve stock (p. ej. una compra cancelada). Falla solo si la talla no existe."""
+    return _mover_stock(lineas, signo=1, parcial=False)
+
+
+def _mover_stock(lineas, signo, parcial):
+    # Las líneas repetidas se suman, y se procesan ordenadas para que dos
+    # transacciones siempre bloqueen las filas en el mismo orden (sin deadlocks)
+    cantidades = {}
+    for producto_id, talla_id, cantidad in lineas:
+        clave = (str(producto_id), talla_id)
+        cantidades[clave] = cantidades.get(clave, 0) + cantidad
+
+    resultados = {}
+    with transaction.atomic():
+        por_producto = {}
+        for (producto_id, talla_id), cantidad in sorted(cantidades.items(), key=lambda i: (i[0][0], i[0][1] or 0)):
+            filas = ProductoTallaStock.objects.filter(producto_id=producto_id, talla_id=talla_id)
+            if signo < 0:
+                actualizadas = filas.filter(stock__gte=cantidad).update(stock=F('stock') - cantidad)
+            else:
+                actualizadas = filas.update(stock=F('stock') + cantidad)
+
+            if actualizadas:
+                resultados[(producto_id, talla_id)] = {'ok': True}
+                por_producto[producto_id] = por_producto.get(producto_id, 0) + signo * cantidad
+            else:
+                # Solo en el caso de error leemos cuánto hay, para informarlo
+                disponible = filas.values_list('stock', flat=True).first()
+                resultados[(producto_id, talla_id)] = {
+                    'ok': False,
+                    'error': 'talla_inexistente' if disponible is None else 'stock_insuficiente',
+                    'disponible': disponible,
+                }
+
+        aplicar = parcial or all(r['ok'] for r in resultados.values())
+        if aplicar and por_producto:
+            # stock_total se mueve con la misma diferencia (sin releer la suma,
+            # que podría no ver descuentos concurrentes todavía sin confirmar)
+            for producto_id, diferencia in por_producto.items():
+                Producto.objects.filter(pk=producto_id).update(
+                    stock_total=F('stock_total') + diferencia, fecha_modificacion=timezone.now(),
+                )
+            invalidar_catalogo()
+        elif not aplicar:
+            transaction.set_rollback(True)
+            for resultado in resultados.values():
+                if resultado['ok']:
+                    resultado.update(ok=False, error='pedido_rechazado')
+
+    return [dict(resultados[(str(producto_id), talla_id)]) for producto_id, talla_id, _ in lineas]
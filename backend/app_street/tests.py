@@ -1,3 +1,1295 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection, connections, transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import importacion, trabajos
+from .cache_catalogo import metricas_cache
+from .exportacion import escribir_parquet
+from .formatos import disponible, motor_excel, motor_parquet
+from .importacion import ImportadorProductos, leer_dataframe
+from .referencias import referencias
+from .stock import descontar_stock, sincronizar_stock
+from .imagenes import procesar_imagen
+from .snapshot import actualizar_snapshot
+from .models import Producto, ProductoTallaStock, ImagenProducto, Talla, Categoria, Genero, Temporada, Marca, TrabajoImportacion, recalcular_stock_total, stock_total_subquery
+from .trabajos import procesar_trabajo, recuperar_trabajos
+
+
+def crear_catalogo(cantidad, tallas=('S', 'M', 'L'), inicio=0):
+    categoria = Categoria.objects.get_or_create(nombre='Polos')[0]
+    genero = Genero.objects.get_or_create(nombre='Unisex')[0]
+    temporada = Temporada.objects.get_or_create(nombre='Verano 2025')[0]
+    marca = Marca.objects.get_or_create(nombre='StreetForce')[0]
+    tallas = [Talla.objects.get_or_create(nombre=nombre)[0] for nombre in tallas]
+
+    productos = []
+    for i in range(inicio, inicio + cantidad):
+        producto = Producto.objects.create(
+            sku=f'SKU-{i:04d}', nombre=f'Producto {i}', precio_base=100,
+            categoria=categoria, genero=genero, temporada=temporada, marca=marca,
+        )
+        for stock, talla in enumerate(tallas):
+            ProductoTallaStock.objects.create(producto=producto, talla=talla, stock=stock)
+        ImagenProducto.objects.create(producto=producto, imagen=f'productos/{i}.png', principal=True)
+        productos.append(producto)
+    return productos
+
+
+def media_temporal(test):
+    """MEDIA_ROOT en un directorio temporal que se borra al terminar el test."""
+    directorio = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+    ajuste = override_settings(MEDIA_ROOT=directorio)
+    ajuste.enable()
+    test.addCleanup(ajuste.disable)
+
+
+def cursor_de(valores, hacia_atras=False):
+    return base64.b64encode(json.dumps({'v': valores, 'r': hacia_atras}).encode('utf-8')).decode('ascii')
+
+
+# Bien codificados pero con valores que no son del tipo de la columna
+CURSORES_INVALIDOS = [
+    cursor_de(['x', 'y']),
+    cursor_de([1, 2]),
+    cursor_de([None, str(uuid.uuid4())]),
+    cursor_de(['2025-01-01T00:00:00+00:00', 'no-es-uuid']),
+]
+
+
+class ProductViewSetQueryTests(TestCase):
+    # versión del catálogo + productos + talla_stock (con talla) + imagenes
+    CONSULTAS_ESPERADAS = 4
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_usa_consultas_constantes(self):
+        crear_catalogo(3)
+        with self.assertNumQueries(self.CONSULTAS_ESPERADAS):
+            response = self.client.get('/api/productos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+
+        # Más productos, mismas consultas
+        crear_catalogo(22, inicio=3)
+        with self.assertNumQueries(self.CONSULTAS_ESPERADAS):
+            response = self.client.get('/api/productos/')
+        self.assertEqual(len(response.json()['results']), 25)
+
+    def test_retrieve_usa_consultas_constantes(self):
+        producto = crear_catalogo(2)[0]
+        with self.assertNumQueries(self.CONSULTAS_ESPERADAS):
+            response = self.client.get(f'/api/productos/{producto.id}/')
+        data = response.json()
+        self.assertEqual(data['tallas'], 'S, M, L')
+        self.assertEqual(data['stocks'], '0, 1, 2')
+        self.assertEqual(len(data['imagenes']), 1)
+
+
+def plan_de(queryset):
+    """Nodos del plan de PostgreSQL (EXPLAIN FORMAT JSON) de la consulta, aplanados."""
+    nodos = []
+    pendientes = [json.loads(queryset.explain(format='json'))[0]['Plan']]
+    while pendientes:
+        nodo = pendientes.pop()
+        nodos.append(nodo)
+        pendientes.extend(nodo.get('Plans', []))
+    return nodos
+
+
+@contextmanager
+def solo_indices():
+    # Con las tablas chicas de las pruebas el planificador prefiere recorrerlas
+    # enteras; así el plan muestra qué índice usaría con datos reales
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off; SET enable_bitmapscan = off')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan; RESET enable_bitmapscan')
+
+
+def excel_subido(filas, nombre='productos.xlsx'):
+    df = pd.DataFrame(filas)
+    output = io.BytesIO()
+    df.to_excel(output, index=False, engine='openpyxl')
+    return SimpleUploadedFile(nombre, output.getvalue())
+
+
+def fila_excel(sku, tallas='S, M', stocks='5, 3', **extra):
+    fila = {
+        'SKU': sku, 'Nombre': f'Producto {sku}', 'Descripcion': 'Algodón', 'Precio Base': 99.9,
+        'Tallas': tallas, 'Stocks': stocks, 'Nombre Categoria': 'polos', 'Nombre Genero': 'Unisex',
+        'Nombre Temporada': 'Verano 2025', 'Nombre Marca': 'streetforce',
+    }
+    fila.update(extra)
+    return fila
+
+
+@override_settings(IMPORT_JOBS_RUNNER='command')
+class ProductImportTests(TestCase):
+    def setUp(self):
+        media_temporal(self)
+        self.client = APIClient()
+        self.existente = crear_catalogo(1)[0]
+
+    def importar(self, archivo):
+        # Encola el trabajo, lo procesa como lo haría el worker y devuelve su estado
+        response = self.client.post('/import/', {'excel_file': archivo})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['estado'], 'pendiente')
+        procesar_trabajo(response.json()['job_id'])
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_crea_y_actualiza_en_bloque(self):
+        archivo = excel_subido([
+            fila_excel(self.existente.sku, tallas='M', stocks='7'),
+            fila_excel('NUEVO-1'),
+            fila_excel('NUEVO-2', tallas='L', stocks='1'),
+        ])
+        trabajo = self.importar(archivo)
+        self.assertEqual(trabajo['estado'], 'completado')
+        self.assertEqual((trabajo['filas_procesadas'], trabajo['total_filas']), (3, 3))
+        self.assertEqual((trabajo['created'], trabajo['updated'], trabajo['errors']), (2, 1, []))
+
+        # La talla que ya no viene en el archivo se elimina, la que viene se actualiza
+        stock = dict(self.existente.talla_stock.values_list('talla__nombre', 'stock'))
+        self.assertEqual(stock, {'M': 7})
+        nuevo = Producto.objects.get(sku='NUEVO-1')
+        self.assertEqual(nuevo.marca.nombre, 'StreetForce')
+        self.assertEqual(dict(nuevo.talla_stock.values_list('talla__nombre', 'stock')), {'S': 5, 'M': 3})
+
+    def test_errores_por_fila_no_guardan_nada(self):
+        archivo = excel_subido([
+            fila_excel('OK-1'),
+            fila_excel('MAL-1', tallas='S, M', stocks='1'),
+            fila_excel('MAL-2', tallas='XXXL', stocks='1'),
+            fila_excel('MAL-3', **{'Nombre Marca': 'Inexistente'}),
+        ])
+        trabajo = self.importar(archivo)
+        self.assertEqual(trabajo['estado'], 'fallido')
+        self.assertEqual(trabajo['errors'], [
+            'Fila 3: El número de tallas (2) no coincide con el de stocks (1) para el SKU MAL-1.',
+            'Fila 4: Tallas inválidas: XXXL para el SKU MAL-2.',
+            "Fila 5: No se encontró un valor para 'Marca' con el nombre proporcionado para el SKU MAL-3.",
+        ])
+        self.assertFalse(Producto.objects.filter(sku='OK-1').exists())
+
+    def test_validacion_por_columnas(self):
+        df = pd.DataFrame([
+            fila_excel('OK-1', tallas='s, M, s', stocks='1, 2, 9'),
+            fila_excel(None),
+            fila_excel('MAL-1', stocks='5, -3'),
+            fila_excel('MAL-2', stocks='5, 2.5'),
+            fila_excel('MAL-3', tallas='S, XXL, 3XL', stocks='1, 1, 1', **{'Nombre Genero': 'Otro'}),
+            fila_excel('MAL-4', tallas='S, XXL', stocks='1, 1'),
+            fila_excel('MAL-5', **{'Precio Base': 'gratis'}),
+            fila_excel('OK-1', tallas='L', stocks='1'),
+        ])
+        errores = []
+        filas = ImportadorProductos().validar(df, errores)
+        self.assertEqual(errores, [
+            'Fila 3: El SKU es obligatorio.',
+            'Fila 4: Los Stocks deben ser números enteros positivos para el SKU MAL-1.',
+            'Fila 5: Los Stocks deben ser números enteros positivos para el SKU MAL-2.',
+            "Fila 6: No se encontró un valor para 'Genero' con el nombre proporcionado para el SKU MAL-3.",
+            'Fila 7: Tallas inválidas: XXL para el SKU MAL-4.',
+            'Fila 8: El Precio Base debe ser un número para el SKU MAL-5.',
+            'Fila 9: El SKU OK-1 está repetido en el archivo (aparece primero en la fila 2).',
+        ])
+        self.assertEqual(len(filas), 1)
+        tallas = {t.nombre: t.pk for t in Talla.objects.all()}
+        # La talla repetida en la fila se queda con el último stock
+        self.assertEqual(filas[0]['stocks'], {tallas['S']: 9, tallas['M']: 2})
+        self.assertEqual(filas[0]['campos']['precio_base'], 99.9)
+        self.assertEqual(filas[0]['campos']['marca'].nombre, 'StreetForce')
+
+    def test_precio_base_fuera_de_rango(self):
+        df = pd.DataFrame([
+            fila_excel('OK-1', **{'Precio Base': 99999999.99}),
+            fila_excel('MAL-1', **{'Precio Base': float('inf')}),
+            fila_excel('MAL-2', **{'Precio Base': -1}),
+            fila_excel('MAL-3', **{'Precio Base': 100000000}),
+            fila_excel('MAL-4', **{'Precio Base': 9.999}),
+        ])
+        errores = []
+        filas = ImportadorProductos().validar(df, errores)
+        self.assertEqual(errores, [
+            'Fila 3: El Precio Base debe ser un número para el SKU MAL-1.',
+            'Fila 4: El Precio Base no puede ser negativo para el SKU MAL-2.',
+            'Fila 5: El Precio Base admite hasta 8 dígitos enteros y 2 decimales para el SKU MAL-3.',
+            'Fila 6: El Precio Base admite hasta 8 dígitos enteros y 2 decimales para el SKU MAL-4.',
+        ])
+        self.assertEqual([fila['sku'] for fila in filas], ['OK-1'])
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        # 5 mapas de clasificación + SKUs existentes + savepoint + 2 inserts
+        # + recálculo de stock_total + release + 2 invalidaciones de la versión
+        filas = [fila_excel(f'LOTE-{i}') for i in range(50)]
+        df = pd.DataFrame(filas)
+        with self.assertNumQueries(13):
+            results = ImportadorProductos().importar(df)
+        self.assertEqual(results['created'], 50)
+
+    def test_csv_y_deteccion_de_formato(self):
+        filas = pd.DataFrame([fila_excel('CSV-1', Extra='ignorada'), fila_excel('NA', tallas='M', stocks='4')])
+        trabajo = self.importar(SimpleUploadedFile('productos.csv', filas.to_csv(index=False).encode('utf-8-sig')))
+        self.assertEqual((trabajo['estado'], trabajo['created']), ('completado', 2))
+        # 'NA' es un SKU válido, no una celda vacía
+        self.assertEqual(Producto.objects.get(sku='NA').stock_total, 4)
+
+        # Un .xlsx sin extensión se reconoce por su contenido
+        archivo = excel_subido([fila_excel('XLSX-1')], nombre='productos')
+        self.assertEqual(self.importar(archivo)['created'], 1)
+
+    def test_xls_no_se_lee_con_openpyxl(self):
+        # Firma OLE de un .xls: va a xlrd (o calamine), nunca a openpyxl
+        self.assertIn(motor_excel('xls'), ('xlrd', 'calamine', None))
+        with mock.patch('app_street.formatos.disponible', lambda modulo: modulo == 'xlrd'):
+            self.assertEqual(motor_excel('xls'), 'xlrd')
+            self.assertEqual(motor_excel('xlsx'), 'openpyxl')
+        with mock.patch('app_street.formatos.disponible', lambda modulo: False):
+            trabajo = self.importar(SimpleUploadedFile('productos.xls', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + bytes(504)))
+        self.assertEqual(trabajo['estado'], 'fallido')
+        self.assertIn('falta xlrd', trabajo['errors'][0])
+
+    def importar_con(self, filas, **opciones):
+        response = self.client.post('/import/', {'excel_file': excel_subido(filas), **opciones})
+        self.assertEqual(response.status_code, 202)
+        procesar_trabajo(response.json()['job_id'])
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_dry_run_no_escribe(self):
+        filas = [
+            fila_excel(self.existente.sku, tallas='M, XL', stocks='1, 4', **{'Nombre': 'Nuevo nombre', 'Precio Base': 100}),
+            fila_excel('NUEVO-1'),
+        ]
+        Talla.objects.create(nombre='XL')
+        referencias.invalidar()
+        trabajo = self.importar_con(filas, dry_run='true')
+        self.assertEqual((trabajo['estado'], trabajo['modo']), ('completado', 'simulacion'))
+        self.assertEqual((trabajo['created'], trabajo['updated'], trabajo['unchanged']), (1, 1, 0))
+        self.assertEqual(trabajo['diff'], {
+            'crear': ['NUEVO-1'],
+            'actualizar': [{'sku': self.existente.sku, 'cambios': {
+                'nombre': ['Producto 0', 'Nuevo nombre'],
+                'descripcion': [None, 'Algodón'],
+                'stock': {'S': [0, None], 'L': [2, None], 'XL': [None, 4]},
+            }}],
+            'sin_cambios': [],
+        })
+        self.assertFalse(Producto.objects.filter(sku='NUEVO-1').exists())
+        self.assertEqual(Producto.objects.get(pk=self.existente.pk).nombre, 'Producto 0')
+
+    def test_commit_por_lotes_reanudable(self):
+        filas = [fila_excel(f'LOTE-{i}') for i in range(5)]
+        original = importacion.sincronizar_stock
+        llamadas = []
+
+        def falla_en_el_segundo_lote(*args, **kwargs):
+            # Dos llamadas por lote (existentes y nuevos): falla la tercera
+            llamadas.append(1)
+            if len(llamadas) == 3:
+                raise RuntimeError('se cortó la conexión')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(importacion, 'sincronizar_stock', falla_en_el_segundo_lote), \
+                self.assertLogs('app_street.trabajos', 'ERROR'):
+            trabajo = self.importar_con(filas, commit='chunked', chunk_size=2)
+        self.assertEqual((trabajo['estado'], trabajo['modo']), ('fallido', 'lotes'))
+        # El primer lote quedó confirmado junto con su checkpoint; el segundo se revirtió
+        self.assertEqual((trabajo['filas_confirmadas'], trabajo['created']), (2, 2))
+        self.assertEqual(Producto.objects.filter(sku__startswith='LOTE-').count(), 2)
+
+        response = self.client.post(f"/import/{trabajo['job_id']}/reanudar/")
+        self.assertEqual(response.status_code, 202)
+        procesar_trabajo(trabajo['job_id'])
+        trabajo = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(trabajo['estado'], 'completado')
+        self.assertEqual((trabajo['filas_confirmadas'], trabajo['created'], trabajo['updated']), (5, 5, 0))
+        self.assertEqual(Producto.objects.filter(sku__startswith='LOTE-').count(), 5)
+
+        # Ya terminó: no hay nada que reanudar
+        self.assertEqual(self.client.post(f"/import/{trabajo['job_id']}/reanudar/").status_code, 409)
+
+    def test_reanuda_lotes_interrumpido(self):
+        trabajo = self.importar_con([fila_excel(f'LOTE-{i}') for i in range(3)], commit='chunked', chunk_size=2)
+        # Como si el proceso se hubiera caído tras el primer lote
+        TrabajoImportacion.objects.filter(pk=trabajo['job_id']).update(
+            estado=TrabajoImportacion.PROCESANDO, fecha_fin=None, filas_confirmadas=2,
+            fecha_inicio=timezone.now() - timedelta(hours=3), ultimo_avance=timezone.now(),
+        )
+        url = f"/import/{trabajo['job_id']}/reanudar/"
+        # Empezó hace mucho pero sigue avanzando: todavía corre en otro proceso
+        self.assertEqual(self.client.post(url).status_code, 409)
+
+        TrabajoImportacion.objects.filter(pk=trabajo['job_id']).update(ultimo_avance=timezone.now() - timedelta(hours=2))
+        self.assertEqual(self.client.post(url).status_code, 202)
+        procesar_trabajo(trabajo['job_id'])
+        self.assertEqual(TrabajoImportacion.objects.get(pk=trabajo['job_id']).estado, TrabajoImportacion.COMPLETADO)
+
+    def test_recupera_trabajos_interrumpidos(self):
+        hace = lambda minutos: timezone.now() - timedelta(minutes=minutos)
+        crear = lambda **campos: TrabajoImportacion.objects.create(archivo='importaciones/x.csv', **campos)
+        pendiente = crear()
+        colgado = crear(
+            estado=TrabajoImportacion.PROCESANDO, modo=TrabajoImportacion.LOTES, fecha_inicio=hace(180), ultimo_avance=hace(90),
+        )
+        # Lleva más que el límite corriendo, pero avanzó hace poco
+        en_curso = crear(estado=TrabajoImportacion.PROCESANDO, fecha_inicio=hace(180), ultimo_avance=hace(5))
+
+        with self.assertLogs('app_street.trabajos', 'WARNING'):
+            self.assertEqual(recuperar_trabajos(), (0, 1))
+        colgado.refresh_from_db()
+        self.assertEqual(colgado.estado, TrabajoImportacion.FALLIDO)
+        self.assertIn('interrumpió', colgado.errores[0])
+        en_curso.refresh_from_db()
+        self.assertEqual(en_curso.estado, TrabajoImportacion.PROCESANDO)
+
+        # Con el runner en hilos los pendientes se vuelven a encolar
+        with override_settings(IMPORT_JOBS_RUNNER='thread'), mock.patch('app_street.trabajos._get_executor') as executor:
+            self.assertEqual(recuperar_trabajos(), (1, 0))
+        executor.return_value.submit.assert_called_once_with(trabajos._procesar_en_hilo, pendiente.pk)
+
+    def test_opciones_invalidas(self):
+        archivo = excel_subido([fila_excel('X-1')])
+        response = self.client.post('/import/', {'excel_file': archivo, 'dry_run': 'true', 'commit': 'chunked'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_faltan_columnas(self):
+        archivo = excel_subido([{'SKU': 'X-1'}])
+        trabajo = self.importar(archivo)
+        self.assertEqual(trabajo['estado'], 'fallido')
+        self.assertTrue(trabajo['errors'][0].startswith('Faltan las siguientes columnas requeridas: Nombre'))
+
+
+@override_settings(IMPORT_JOBS_RUNNER='command', IMPORT_BATCH_SIZE=2)
+class ProgresoImportacionTests(TransactionTestCase):
+    """El avance de una importación atómica se ve mientras corre, no solo al final."""
+
+    def setUp(self):
+        media_temporal(self)
+        referencias.invalidar()
+        crear_catalogo(1)
+
+    def test_avance_por_lote(self):
+        archivo = excel_subido([fila_excel(f'AVANCE-{i}') for i in range(5)])
+        trabajo_id = APIClient().post('/import/', {'excel_file': archivo}).json()['job_id']
+        vistos = []
+        guardar = trabajos._Avance.guardar
+
+        def espiar(avance, **valores):
+            guardar(avance, **valores)
+            # Desde la conexión del import, con su transacción todavía abierta
+            vistos.append(TrabajoImportacion.objects.values_list('filas_procesadas', 'creados').get(pk=trabajo_id))
+
+        with mock.patch.object(trabajos._Avance, 'guardar', espiar):
+            procesar_trabajo(trabajo_id)
+        self.assertEqual(vistos, [(0, 0), (2, 2), (4, 4), (5, 5)])
+        trabajo = TrabajoImportacion.objects.get(pk=trabajo_id)
+        self.assertEqual((trabajo.estado, trabajo.filas_procesadas, trabajo.creados), (TrabajoImportacion.COMPLETADO, 5, 5))
+
+
+class StockTotalTests(TestCase):
+    def setUp(self):
+        self.producto = crear_catalogo(1)[0]
+
+    def test_se_mantiene_al_escribir_tallas(self):
+        # crear_catalogo guarda stocks 0, 1 y 2
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 3)
+
+        fila = self.producto.talla_stock.get(talla__nombre='L')
+        fila.stock = 10
+        fila.save()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 11)
+
+        fila.delete()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 1)
+
+    def test_serializer_actualiza_el_total(self):
+        response = APIClient().put(f'/api/productos/{self.producto.id}/', {
+            'sku': self.producto.sku, 'nombre': 'Nuevo', 'precio_base': '10.00',
+            'tallas': 'S, M', 'stocks': '4, 6',
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stock_total'], 10)
+
+    def test_comando_repara_desfasados(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock_total=999)
+        call_command('recalcular_stock', stdout=io.StringIO())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 3)
+
+
+class PrecioFinalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.normal, self.oferta, self.liquidacion = crear_catalogo(3)
+        Producto.objects.filter(pk=self.normal.pk).update(precio_base='80.00')
+        Producto.objects.filter(pk=self.oferta.pk).update(precio_base='99.99', en_oferta=True, descuento_porcentaje=15)
+        Producto.objects.filter(pk=self.liquidacion.pk).update(precio_base='200.00', en_oferta=True, descuento_porcentaje=75)
+
+    def skus(self, query):
+        response = self.client.get(f'/api/productos/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [p['sku'] for p in response.json()['results']]
+
+    def test_calculado_por_la_base_de_datos(self):
+        self.oferta.refresh_from_db()
+        self.assertEqual(str(self.oferta.precio_final), '84.99')
+
+        self.oferta.en_oferta = False
+        self.oferta.save()
+        self.assertEqual(str(self.oferta.precio_final), '99.99')
+
+    def test_filtros_y_orden_por_precio_final(self):
+        self.assertEqual(self.skus('ordering=precio_final'), [self.liquidacion.sku, self.normal.sku, self.oferta.sku])
+        self.assertEqual(self.skus('precio_max=85&ordering=-precio_final'), [self.oferta.sku, self.normal.sku, self.liquidacion.sku])
+        self.assertEqual(self.skus('en_oferta=true&precio_min=60'), [self.oferta.sku])
+        self.assertEqual(self.skus('en_oferta=false'), [self.normal.sku])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/productos/?precio_min=abc').status_code, 400)
+        for valor in ('nan', 'Infinity', '-Infinity', '1e999999', '100000000'):
+            response = self.client.get('/api/productos/', {'precio_max': valor})
+            self.assertEqual(response.status_code, 400, valor)
+            self.assertIn('precio_max', response.json())
+        self.assertEqual(self.client.get('/api/productos/?en_oferta=quizas').status_code, 400)
+        for valor in ('²', 'x', '-1', '0', str(2 ** 63)):
+            response = self.client.get('/api/productos/', {'marca': valor})
+            self.assertEqual(response.status_code, 400, valor)
+            self.assertIn('marca', response.json())
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.zapatilla, self.polo, self.gorra = crear_catalogo(3)
+        Producto.objects.filter(pk=self.zapatilla.pk).update(nombre='Zapatillas Air Runner', sku='NK-AIR-001')
+        Producto.objects.filter(pk=self.polo.pk).update(nombre='Polo Oversize', descripcion='Polo de algodón, ideal para zapatillas blancas')
+        nike = Marca.objects.create(nombre='Nike')
+        Producto.objects.filter(pk=self.gorra.pk).update(nombre='Gorra Trucker', marca=nike)
+
+    def buscar(self, termino):
+        response = self.client.get('/api/productos/', {'search': termino})
+        self.assertEqual(response.status_code, 200)
+        return [p['sku'] for p in response.json()['results']]
+
+    def test_prefijo_ordenado_por_relevancia(self):
+        # El nombre pesa más que la descripción
+        self.assertEqual(self.buscar('zapat'), ['NK-AIR-001', self.polo.sku])
+
+    def test_sku_marca_y_errores_de_tipeo(self):
+        self.assertEqual(self.buscar('air-0'), ['NK-AIR-001'])
+        self.assertEqual(self.buscar('nike'), [self.gorra.sku])
+        self.assertEqual(self.buscar('truckr'), [self.gorra.sku])
+        self.assertEqual(self.buscar('---'), [])
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.productos = crear_catalogo(7)
+        # Dos productos con la misma fecha: el id desempata
+        Producto.objects.filter(pk=self.productos[3].pk).update(fecha_registro=self.productos[4].fecha_registro)
+
+    def recorrer(self, url, consultas=ProductViewSetQueryTests.CONSULTAS_ESPERADAS):
+        # Cada página cuesta lo mismo, sin importar cuántas filas quedan detrás
+        skus, paginas = [], 0
+        while url:
+            with self.assertNumQueries(consultas):
+                data = self.client.get(url).json()
+            skus += [p['sku'] for p in data['results']]
+            url, paginas = data['next'], paginas + 1
+        return skus, paginas
+
+    def test_recorre_todo_sin_repetir(self):
+        esperado = list(Producto.objects.order_by('-fecha_registro', '-id').values_list('sku', flat=True))
+        self.assertEqual(self.recorrer('/api/productos/?page_size=3'), (esperado, 3))
+
+    def test_pagina_anterior(self):
+        primera = self.client.get('/api/productos/?page_size=3').json()
+        self.assertIsNone(primera['previous'])
+        segunda = self.client.get(primera['next']).json()
+        anterior = self.client.get(segunda['previous']).json()
+        self.assertEqual(anterior['results'], primera['results'])
+        self.assertIsNotNone(anterior['next'])
+
+    def test_respeta_ordering_y_busqueda(self):
+        skus, _ = self.recorrer('/api/productos/?page_size=2&ordering=-nombre')
+        self.assertEqual(skus, [p.sku for p in reversed(self.productos)])
+        # Decimales (columna generada) también vuelven a su tipo al leer el cursor
+        skus, _ = self.recorrer('/api/productos/?page_size=2&ordering=-precio_final')
+        self.assertEqual(sorted(skus), sorted(p.sku for p in self.productos))
+        # La búsqueda suma la consulta de marcas y la de existencia
+        skus, _ = self.recorrer('/api/productos/?page_size=2&search=producto', consultas=6)
+        self.assertEqual(sorted(skus), sorted(p.sku for p in self.productos))
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get('/api/productos/?cursor=no-es-un-cursor').status_code, 404)
+        for cursor in CURSORES_INVALIDOS:
+            self.assertEqual(self.client.get('/api/productos/', {'cursor': cursor}).status_code, 404, cursor)
+        # Precio fuera de la precisión de la columna o no finito
+        for precio in ('1e999999', 'NaN', 'x'):
+            response = self.client.get('/api/productos/', {'ordering': 'precio_final', 'cursor': cursor_de([precio, str(uuid.uuid4())])})
+            self.assertEqual(response.status_code, 404, precio)
+
+
+class CacheCatalogoTests(TestCase):
+    def setUp(self):
+        caches['catalogo'].clear()
+        self.client = APIClient()
+        self.producto = crear_catalogo(2)[0]
+
+    def test_segunda_lectura_sin_consultas(self):
+        primera = self.client.get('/api/productos/?page_size=1')
+        self.assertEqual(primera['X-Cache'], 'MISS')
+        # Solo la lectura de la versión del catálogo
+        with self.assertNumQueries(1):
+            segunda = self.client.get('/api/productos/?page_size=1')
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(metricas_cache()['hits'], 1)
+
+    def test_version_compartida_entre_procesos(self):
+        url = f'/api/productos/{self.producto.pk}/'
+        etag = self.client.get(url)['ETag']
+        # Otro proceso escribe: aquí no corre ninguna señal ni se toca esta caché
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('app_street_version_catalogo')")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_etag_y_304(self):
+        url = f'/api/productos/{self.producto.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Un cambio de stock invalida la versión: el ETag anterior ya no sirve
+        ProductoTallaStock.objects.filter(producto=self.producto).first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_escrituras_invalidan(self):
+        url = f'/api/productos/{self.producto.pk}/'
+        self.client.get(url)
+        self.producto.nombre = 'Nombre nuevo'
+        self.producto.save()
+        self.assertEqual(self.client.get(url).json()['nombre'], 'Nombre nuevo')
+
+        ImagenProducto.objects.filter(producto=self.producto).delete()
+        self.assertEqual(self.client.get(url).json()['imagenes'], [])
+
+    def test_importacion_invalida(self):
+        url = f'/api/productos/{self.producto.pk}/'
+        self.assertEqual(self.client.get(url).json()['stock_total'], 3)
+        # bulk_create/bulk_update no disparan señales: el importador invalida
+        df = pd.DataFrame([fila_excel(self.producto.sku, tallas='S', stocks='9')])
+        ImportadorProductos().importar(df)
+        self.assertEqual(self.client.get(url).json()['stock_total'], 9)
+
+
+class RegistroReferenciasTests(TestCase):
+    def setUp(self):
+        self.producto = crear_catalogo(1)[0]
+        referencias.invalidar()
+
+    def consultas_a(self, tabla, funcion):
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = funcion()
+        return resultado, [q['sql'] for q in contexto.captured_queries if f'FROM "app_street_{tabla}"' in q['sql']]
+
+    def test_busqueda_sin_mayusculas_y_carga_unica(self):
+        _, consultas = self.consultas_a('marca', lambda: referencias.por_nombre(Marca, ' STREETFORCE '))
+        self.assertEqual(len(consultas), 1)
+        marca, consultas = self.consultas_a('marca', lambda: referencias.por_nombre(Marca, 'streetforce'))
+        self.assertEqual(marca, self.producto.marca)
+        self.assertEqual(consultas, [])
+
+    def test_señales_invalidan(self):
+        self.assertIsNone(referencias.por_nombre(Talla, 'XL'))
+        xl = Talla.objects.create(nombre='XL')
+        self.assertEqual(referencias.por_nombre(Talla, 'xl'), xl)
+        xl.delete()
+        self.assertIsNone(referencias.por_nombre(Talla, 'XL'))
+
+    def test_serializer_no_consulta_tablas_de_referencia(self):
+        datos = {
+            'sku': 'NUEVO-1', 'nombre': 'Nuevo', 'precio_base': '10.00', 'tallas': 's, M', 'stocks': '4, 6',
+            'categoria': self.producto.categoria_id, 'marca': self.producto.marca_id,
+        }
+        referencias.todos(Talla), referencias.todos(Categoria), referencias.todos(Marca)
+        response, consultas = self.consultas_a('talla', lambda: APIClient().post('/api/productos/', datos, format='multipart'))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(consultas, [])
+        self.assertEqual(response.json()['tallas'], 'S, M')
+
+        datos['marca'] = 999999
+        response = APIClient().post('/api/productos/', {**datos, 'sku': 'NUEVO-2'}, format='multipart')
+        self.assertIn('marca', response.json())
+
+    def test_administrador_usa_el_registro(self):
+        client = APIClient()
+        client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        client.get('/')
+        with CaptureQueriesContext(connection) as contexto:
+            response = client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('app_street_' in q['sql'] for q in contexto.captured_queries))
+
+
+class SincronizarStockTests(TestCase):
+    def setUp(self):
+        self.producto = crear_catalogo(1)[0]
+        self.tallas = {t.nombre: t.pk for t in Talla.objects.all()}
+        self.filas = {f.talla_id: f.pk for f in self.producto.talla_stock.all()}
+
+    def stocks(self):
+        return dict(self.producto.talla_stock.values_list('talla__nombre', 'stock'))
+
+    def test_producto_sin_cambios_cuesta_una_lectura(self):
+        deseado = {self.tallas['S']: 0, self.tallas['M']: 1, self.tallas['L']: 2}
+        with self.assertNumQueries(1):
+            cambiados = sincronizar_stock({self.producto.pk: deseado})
+        self.assertEqual(cambiados, set())
+
+    def test_solo_escribe_lo_que_cambia(self):
+        xl = Talla.objects.create(nombre='XL')
+        deseado = {self.tallas['S']: 0, self.tallas['M']: 7, xl.pk: 4}  # L ya no viene
+        # lectura + bulk_update + bulk_create (upsert) + delete + recálculo de
+        # stock_total + invalidación de la versión del catálogo
+        with self.assertNumQueries(6):
+            sincronizar_stock({self.producto.pk: deseado})
+        self.assertEqual(self.stocks(), {'S': 0, 'M': 7, 'XL': 4})
+        # Las filas que siguen conservan su id
+        actuales = {f.talla_id: f.pk for f in self.producto.talla_stock.all()}
+        self.assertEqual(actuales[self.tallas['S']], self.filas[self.tallas['S']])
+        self.assertEqual(actuales[self.tallas['M']], self.filas[self.tallas['M']])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 11)
+
+    def test_borrar_tallas_no_cuesta_consultas_por_fila(self):
+        xl = Talla.objects.create(nombre='XL')
+        # Se quitan dos tallas (M y L): las mismas consultas que quitando una sola
+        with self.assertNumQueries(6):
+            sincronizar_stock({self.producto.pk: {self.tallas['S']: 3, xl.pk: 1}})
+        self.assertEqual(self.stocks(), {'S': 3, 'XL': 1})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_total, 4)
+
+    def test_insertar_una_talla_que_ya_existe(self):
+        # Como si otro proceso la hubiera creado entre la lectura y el INSERT
+        sincronizar_stock({self.producto.pk: {self.tallas['M']: 5}}, nuevos=True)
+        self.assertEqual(self.stocks(), {'S': 0, 'M': 5, 'L': 2})
+        self.assertEqual(self.producto.talla_stock.get(talla_id=self.tallas['M']).pk, self.filas[self.tallas['M']])
+
+    def test_serializer_conserva_las_filas(self):
+        response = APIClient().put(f'/api/productos/{self.producto.id}/', {
+            'sku': self.producto.sku, 'nombre': 'Nuevo', 'precio_base': '10.00',
+            'tallas': 'S, M, L', 'stocks': '0, 1, 5',
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stocks'], '0, 1, 5')
+        self.assertEqual({f.talla_id: f.pk for f in self.producto.talla_stock.all()}, self.filas)
+
+
+class DescontarStockTests(TestCase):
+    def setUp(self):
+        caches['catalogo'].clear()
+        referencias.invalidar()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tienda', is_staff=True))
+        self.a, self.b = crear_catalogo(2)  # stocks S=0, M=1, L=2
+
+    def descontar(self, lineas, **extra):
+        return self.client.post('/api/stock/descontar/', {'lineas': lineas, **extra}, format='json')
+
+    def stock(self, producto, talla):
+        return producto.talla_stock.get(talla__nombre=talla).stock
+
+    def test_descuenta_todas_las_lineas(self):
+        response = self.descontar([
+            {'producto': str(self.a.pk), 'talla': 'L', 'cantidad': 2},
+            {'producto': str(self.b.pk), 'talla': 'm', 'cantidad': 1},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(linea['ok'] for linea in response.json()['lineas']))
+        self.assertEqual((self.stock(self.a, 'L'), self.stock(self.b, 'M')), (0, 0))
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock_total, 1)
+        self.assertEqual(self.client.get(f'/api/productos/{self.a.pk}/').json()['stock_total'], 1)
+
+    def test_todo_o_nada(self):
+        response = self.descontar([
+            {'producto': str(self.a.pk), 'talla': 'L', 'cantidad': 1},
+            {'producto': str(self.b.pk), 'talla': 'M', 'cantidad': 5},
+            {'producto': str(self.b.pk), 'talla': 'XXL', 'cantidad': 1},
+        ])
+        self.assertEqual(response.status_code, 409)
+        errores = [linea.get('error') for linea in response.json()['lineas']]
+        self.assertEqual(errores, ['pedido_rechazado', 'stock_insuficiente', 'talla_inexistente'])
+        self.assertEqual(response.json()['lineas'][1]['disponible'], 1)
+        self.assertEqual(self.stock(self.a, 'L'), 2)
+
+    def test_parcial(self):
+        response = self.descontar([
+            {'producto': str(self.a.pk), 'talla': 'L', 'cantidad': 1},
+            {'producto': str(self.b.pk), 'talla': 'S', 'cantidad': 1},
+        ], parcial=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([linea['ok'] for linea in response.json()['lineas']], [True, False])
+        self.assertEqual(self.stock(self.a, 'L'), 1)
+
+    def test_solo_staff(self):
+        linea = [{'producto': str(self.a.pk), 'talla': 'L', 'cantidad': 1}]
+        anonimo = APIClient()
+        self.assertEqual(anonimo.post('/api/stock/descontar/', {'lineas': linea}, format='json').status_code, 403)
+        self.assertEqual(anonimo.post('/api/stock/liberar/', {'lineas': linea}, format='json').status_code, 403)
+        self.assertEqual(self.stock(self.a, 'L'), 2)
+
+    def test_liberar_ignora_parcial(self):
+        response = self.client.post('/api/stock/liberar/', {'lineas': [
+            {'producto': str(self.a.pk), 'talla': 'L', 'cantidad': 1},
+            {'producto': str(self.b.pk), 'talla': 'XXL', 'cantidad': 1},
+        ], 'parcial': True}, format='json')
+        # Se rechazó entero (liberar es todo o nada), así que 409 aunque pida parcial
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(self.a, 'L'), 2)
+
+    def test_lineas_invalidas(self):
+        self.assertEqual(self.descontar([]).status_code, 400)
+        self.assertEqual(self.descontar([{'producto': 'x', 'talla': 'L', 'cantidad': 0}]).status_code, 400)
+
+
+@override_settings(IMAGENES_VERSIONES_RUNNER='command')
+class DescontarStockConcurrenciaTests(TransactionTestCase):
+    """Muchos checkouts simultáneos sobre el mismo stock: nunca se vende de más."""
+    HILOS = 24
+
+    def setUp(self):
+        referencias.invalidar()
+        self.a, self.b = crear_catalogo(2)
+        ProductoTallaStock.objects.filter(talla__nombre='M').update(stock=10)
+        recalcular_stock_total([self.a.pk, self.b.pk])
+        self.talla_m = Talla.objects.get(nombre='M').pk
+
+    def test_sin_sobreventa(self):
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def comprar(i):
+            try:
+                # Mitad de los hilos pide las líneas en orden inverso: sin deadlocks
+                lineas = [(self.a.pk, self.talla_m, 1), (self.b.pk, self.talla_m, 1)]
+                barrera.wait()
+                resultados.append(descontar_stock(lineas[::-1] if i % 2 else lineas))
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=comprar, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        exitosos = [r for r in resultados if all(linea['ok'] for linea in r)]
+        self.assertEqual(len(resultados), self.HILOS)
+        self.assertEqual(len(exitosos), 10)
+        for producto in (self.a, self.b):
+            self.assertEqual(self.stock_m(producto), 0)
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock_total, 2)  # S=0, M=0, L=2
+
+    def stock_m(self, producto):
+        return producto.talla_stock.get(talla_id=self.talla_m).stock
+
+
+def png_subido(ancho=1500, alto=1000, nombre='foto.png'):
+    salida = io.BytesIO()
+    Image.new('RGBA', (ancho, alto), (200, 30, 30, 128)).save(salida, 'PNG')
+    return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGENES_VERSIONES_RUNNER='command')
+class VersionesImagenTests(TestCase):
+    def setUp(self):
+        media_temporal(self)
+        caches['catalogo'].clear()
+        self.producto = crear_catalogo(1)[0]
+        self.imagen = ImagenProducto.objects.create(producto=self.producto, imagen=png_subido())
+
+    def test_genera_versiones_sin_agrandar(self):
+        versiones = procesar_imagen(self.imagen.pk)
+        self.assertEqual(set(versiones['webp']), {'200', '600', '1200'})
+        with self.imagen.imagen.storage.open(versiones['jpeg']['600']) as archivo, Image.open(archivo) as jpeg:
+            self.assertEqual((jpeg.format, jpeg.size), ('JPEG', (600, 400)))
+
+        pequeña = ImagenProducto.objects.create(producto=self.producto, imagen=png_subido(300, 300, 'chica.png'))
+        self.assertEqual(set(procesar_imagen(pequeña.pk)['webp']), {'200'})
+        # Ya están al día: no se vuelven a generar
+        self.assertIsNone(procesar_imagen(pequeña.pk))
+
+    def test_srcset_en_la_api(self):
+        url = f'/api/productos/{self.producto.pk}/'
+        imagen = next(i for i in APIClient().get(url).json()['imagenes_srcset'] if i['id'] == self.imagen.pk)
+        self.assertEqual(imagen['srcset'], {})
+
+        procesar_imagen(self.imagen.pk)
+        imagen = next(i for i in APIClient().get(url).json()['imagenes_srcset'] if i['id'] == self.imagen.pk)
+        self.assertRegex(imagen['srcset']['webp'], r'^/media/productos/foto\w*_200\.webp 200w, .+ 600w, .+ 1200w$')
+
+    def test_comando_de_backfill(self):
+        salida = io.StringIO()
+        call_command('generar_versiones_imagenes', procesos=2, stdout=salida, stderr=io.StringIO())
+        # Las imágenes de crear_catalogo no tienen archivo: cuentan como error
+        self.assertIn('1 imagen(es) procesada(s), 1 con error', salida.getvalue())
+        self.imagen.refresh_from_db()
+        self.assertFalse(self.imagen.necesita_versiones())
+        self.assertEqual(self.imagen.srcset()['jpeg'].count('w,'), 2)
+
+
+@override_settings(IMAGENES_VERSIONES_RUNNER='command')
+class SubidaImagenesTests(TestCase):
+    def setUp(self):
+        media_temporal(self)
+        caches['catalogo'].clear()
+        self.client = APIClient()
+        self.producto = crear_catalogo(1)[0]
+        self.url = f'/api/productos/{self.producto.pk}/'
+        self.datos = {'sku': self.producto.sku, 'nombre': 'Nuevo', 'precio_base': '10.00', 'tallas': 'S', 'stocks': '1'}
+
+    def put(self, **extra):
+        response = self.client.put(self.url, {**self.datos, **extra}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['imagenes_srcset']
+
+    def archivos_guardados(self):
+        storage = ImagenProducto._meta.get_field('imagen').storage
+        return storage.listdir('productos')[1]
+
+    def test_agrega_sin_reemplazar_y_deduplica(self):
+        inicial = self.producto.imagenes.get()
+        imagenes = self.put(imagenes=[png_subido(40, 40, 'a.png'), png_subido(50, 50, 'b.png'), png_subido(40, 40, 'a-copia.png')])
+        # La copia idéntica de a.png no crea otra fila ni otro archivo
+        self.assertEqual([i['id'] for i in imagenes][0], inicial.pk)
+        self.assertEqual(len(imagenes), 3)
+        self.assertEqual(len(self.archivos_guardados()), 2)
+
+        # Otro producto que sube la misma foto reutiliza el archivo
+        otro = crear_catalogo(1, inicio=1)[0]
+        self.client.put(f'/api/productos/{otro.pk}/', {**self.datos, 'sku': otro.sku, 'imagenes': [png_subido(40, 40, 'x.png')]}, format='multipart')
+        self.assertEqual(len(self.archivos_guardados()), 2)
+        self.assertEqual(otro.imagenes.last().imagen.name, self.producto.imagenes.all()[1].imagen.name)
+
+    def test_eliminar_y_reordenar_por_id(self):
+        imagenes = self.put(imagenes=[png_subido(40, 40, 'a.png'), png_subido(50, 50, 'b.png')])
+        primera, a, b = [i['id'] for i in imagenes]
+        self.assertTrue(imagenes[0]['principal'])
+
+        imagenes = self.put(imagenes_eliminar=[primera], imagenes_orden=[b, a])
+        self.assertEqual([(i['id'], i['principal']) for i in imagenes], [(b, True), (a, False)])
+
+        # Sin cambios de imágenes, las existentes se conservan
+        self.assertEqual([i['id'] for i in self.put()], [b, a])
+
+
+class SnapshotCatalogoTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajuste = override_settings(CATALOGO_SNAPSHOT_DIR=directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        referencias.invalidar()
+        self.productos = crear_catalogo(4)
+
+    def exportar_csv(self, respuesta=None):
+        response = self.client.get('/export/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        if respuesta is not None:
+            respuesta.append(response)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(contenido)))
+
+    def test_exporta_desde_la_foto(self):
+        filas = self.exportar_csv()
+        self.assertEqual(filas[0][0], 'SKU')
+        self.assertEqual(filas[1], [
+            'SKU-0000', 'Producto 0', '', '100.00', 'No', '0', 'Polos', 'Unisex', 'Verano 2025', 'StreetForce', 'S, M, L', '0, 1, 2',
+        ])
+        self.assertEqual(len(filas), 5)
+
+    @override_settings(CATALOGO_SNAPSHOT_SOLAPE=0)
+    def test_actualizacion_incremental(self):
+        primera = actualizar_snapshot()
+        # Sin cambios: misma generación, solo la consulta de estado
+        with self.assertNumQueries(1):
+            self.assertEqual(actualizar_snapshot().generacion, primera.generacion)
+
+        fila = self.productos[1].talla_stock.get(talla__nombre='L')
+        fila.stock = 9
+        fila.save()
+        self.productos[3].delete()
+        crear_catalogo(1, inicio=10)
+
+        with CaptureQueriesContext(connection) as contexto:
+            segunda = actualizar_snapshot()
+        self.assertEqual(segunda.generacion, primera.generacion + 1)
+        # Solo se releyeron el producto modificado y el nuevo
+        lectura = next(q['sql'] for q in contexto.captured_queries if '"app_street_producto"."descripcion"' in q['sql'])
+        self.assertEqual(lectura.count("'::uuid"), 2)
+
+        skus = [segunda.texto('sku', i) for i in range(len(segunda))]
+        self.assertEqual(skus, ['SKU-0000', 'SKU-0001', 'SKU-0002', 'SKU-0010'])
+        self.assertEqual(segunda.stocks(1)[1].tolist(), [0, 1, 9])
+        self.assertEqual(int(segunda.columnas['stock_total'][1]), 10)
+
+    def test_exportar_pone_al_dia_la_foto(self):
+        respuestas = []
+        self.exportar_csv(respuestas)
+        cambio = timezone.now()
+        Producto.objects.filter(pk=self.productos[0].pk).update(nombre='Cambiado', fecha_modificacion=cambio)
+        # El cambio sale en la exportación siguiente, sin esperar a generar_snapshot
+        self.assertEqual(self.exportar_csv(respuestas)[1][1], 'Cambiado')
+        primera, segunda = respuestas
+        self.assertEqual(int(segunda['X-Catalogo-Generacion']), int(primera['X-Catalogo-Generacion']) + 1)
+        self.assertEqual(segunda['X-Catalogo-Actualizado'], cambio.isoformat())
+
+    def test_construye_por_bloques(self):
+        snapshot = actualizar_snapshot(completo=True, chunk_size=3)
+        self.assertEqual([snapshot.texto('sku', i) for i in range(len(snapshot))], [p.sku for p in self.productos])
+        self.assertEqual([snapshot.stocks(i)[1].tolist() for i in range(len(snapshot))], [[0, 1, 2]] * 4)
+
+    def test_ida_y_vuelta_en_csv(self):
+        filas = self.exportar_csv()
+        contenido = '\n'.join(','.join(f'"{c}"' for c in fila) for fila in filas).encode('utf-8-sig')
+        df = leer_dataframe(io.BytesIO(contenido), formato='csv')
+        self.assertNotIn('En Oferta', df.columns)
+        results = ImportadorProductos().importar(df)
+        self.assertEqual((results['created'], results['updated'], results['unchanged'], results['errors']), (0, 0, 4, []))
+        self.assertEqual(dict(self.productos[0].talla_stock.values_list('talla__nombre', 'stock')), {'S': 0, 'M': 1, 'L': 2})
+
+    @skipUnless(motor_parquet(), 'Requiere pyarrow o fastparquet')
+    def test_ida_y_vuelta_en_parquet(self):
+        response = self.client.get('/export/?format=parquet')
+        self.assertEqual(response.status_code, 200)
+        df = leer_dataframe(io.BytesIO(b''.join(response.streaming_content)))
+        results = ImportadorProductos().importar(df)
+        self.assertEqual((results['created'], results['updated'], results['unchanged'], results['errors']), (0, 0, 4, []))
+
+    @skipUnless(disponible('pyarrow'), 'Requiere pyarrow')
+    def test_parquet_por_row_groups(self):
+        import pyarrow.parquet as pq
+        archivo = escribir_parquet(actualizar_snapshot(), 'pyarrow', filas_por_grupo=3)
+        parquet = pq.ParquetFile(archivo)
+        self.assertEqual([parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)], [3, 1])
+        self.assertEqual(parquet.read().column('SKU').to_pylist(), [p.sku for p in self.productos])
+
+    def test_reporte_de_stock(self):
+        client = APIClient()
+        client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        data = client.get('/api/reportes/stock/').json()
+        self.assertEqual(data['total_unidades'], 12)
+        self.assertEqual(data['por_categoria'], [{'categoria': 'Polos', 'productos': 4, 'unidades': 12}])
+        self.assertEqual({t['talla']: t['unidades'] for t in data['por_talla']}, {'M': 4, 'L': 8})
+
+
+class IndicesTests(TestCase):
+    def setUp(self):
+        self.producto = crear_catalogo(3)[0]
+
+    def indices(self, queryset):
+        with solo_indices():
+            return {nodo.get('Index Name') for nodo in plan_de(queryset)} - {None}
+
+    def test_nombres_unicos_sin_distinguir_mayusculas(self):
+        for modelo, nombre in [(Categoria, 'POLOS'), (Marca, 'streetforce'), (Talla, 'm')]:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                modelo.objects.create(nombre=nombre)
+        self.assertIn('talla_nombre_ci_uniq', self.indices(Talla.objects.filter(nombre__iexact='m')))
+        self.assertIn('marca_nombre_ci_uniq', self.indices(Marca.objects.filter(nombre__iexact='STREETFORCE')))
+
+    def test_filtros_de_producto_sin_ordenar(self):
+        p = self.producto
+        queryset = Producto.objects.filter(
+            categoria=p.categoria_id, genero=p.genero_id, marca=p.marca_id, en_oferta=False,
+        ).order_by('-fecha_registro', '-id')
+        self.assertIn('producto_filtros_idx', self.indices(queryset))
+        with solo_indices():
+            self.assertNotIn('Sort', {nodo['Node Type'] for nodo in plan_de(queryset)})
+
+        response = APIClient().get('/api/productos/', {'categoria': p.categoria_id, 'marca': p.marca_id})
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertEqual(APIClient().get('/api/productos/', {'genero': 'x'}).status_code, 400)
+
+    def test_stock_sin_join_ni_sort(self):
+        queryset = ProductoTallaStock.objects.filter(producto=self.producto)
+        self.assertNotIn('JOIN', str(queryset.query))
+        with solo_indices():
+            tipos = {nodo['Node Type'] for nodo in plan_de(queryset)}
+        self.assertIn('Index Scan', tipos)
+        self.assertNotIn('Sort', tipos)
+
+
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        crear_catalogo(3)
+
+    def test_server_timing_y_log(self):
+        cliente = APIClient()
+        cliente.force_login(User.objects.create_user('staff', is_staff=True))
+        with self.assertLogs('app_street.instrumentacion', 'INFO') as logs:
+            response = cliente.get('/api/productos/')
+        cabecera = response['Server-Timing']
+        self.assertIn('total;dur=', cabecera)
+        self.assertIn('db;dur=', cabecera)
+        self.assertIn(f'desc="{ProductViewSetQueryTests.CONSULTAS_ESPERADAS} consultas"', cabecera)
+        self.assertIn('serializacion;dur=', cabecera)
+
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(registro['ruta'], '/api/productos/')
+        self.assertEqual(registro['estado'], 200)
+        self.assertEqual(registro['consultas'], ProductViewSetQueryTests.CONSULTAS_ESPERADAS)
+
+    def test_server_timing_solo_para_staff(self):
+        # Los anónimos no ven consultas ni tiempos de la base, pero el log se escribe igual
+        with self.assertLogs('app_street.instrumentacion', 'INFO') as logs:
+            response = APIClient().get('/api/productos/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['consultas'], ProductViewSetQueryTests.CONSULTAS_ESPERADAS)
+
+        with override_settings(INSTRUMENTACION_SERVER_TIMING=True):
+            self.assertIn('db;dur=', APIClient().get('/api/productos/')['Server-Timing'])
+        with override_settings(INSTRUMENTACION_SERVER_TIMING=False):
+            cliente = APIClient()
+            cliente.force_login(User.objects.create_user('staff', is_staff=True))
+            self.assertNotIn('Server-Timing', cliente.get('/api/productos/'))
+
+        # Sesión de un usuario común: tampoco
+        cliente = APIClient()
+        cliente.force_login(User.objects.create_user('cliente'))
+        self.assertNotIn('Server-Timing', cliente.get('/api/productos/'))
+
+    @override_settings(INSTRUMENTACION_PRESUPUESTO_CONSULTAS=2)
+    def test_avisa_si_excede_presupuesto(self):
+        with self.assertLogs('app_street.instrumentacion', 'WARNING') as logs:
+            APIClient().get('/api/productos/')
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['presupuesto_consultas'], 2)
+        self.assertGreater(registro['consultas'], 2)
+
+
+class SeedCatalogTests(TestCase):
+    def test_genera_catalogo_consistente(self):
+        call_command('seed_catalog', products=30, sizes_per_product=3, images=2, batch_size=7, stdout=io.StringIO())
+        productos = Producto.objects.filter(sku__startswith='SEED-')
+        self.assertEqual(productos.count(), 30)
+        self.assertEqual(ProductoTallaStock.objects.filter(producto__in=productos).count(), 90)
+        self.assertEqual(ImagenProducto.objects.filter(producto__in=productos, principal=True).count(), 30)
+        self.assertEqual(ImagenProducto.objects.filter(producto__in=productos).count(), 60)
+        # stock_total calculado al generar = suma real de las tallas
+        self.assertFalse(productos.exclude(stock_total=stock_total_subquery()).exists())
+
+        # Una segunda ejecución continúa la numeración de SKU
+        call_command('seed_catalog', products=5, stdout=io.StringIO())
+        self.assertTrue(Producto.objects.filter(sku='SEED-0000034').exists())
+
+        # Aunque se hayan borrado productos: sigue después del mayor, sin repetir
+        Producto.objects.filter(sku__in=['SEED-0000000', 'SEED-0000010']).delete()
+        call_command('seed_catalog', products=2, stdout=io.StringIO())
+        self.assertTrue(Producto.objects.filter(sku='SEED-0000036').exists())
+
+
+class ProductosAsyncTests(TestCase):
+    def setUp(self):
+        self.productos = crear_catalogo(5)
+
+    async def test_mismo_json_que_la_api_sincrona(self):
+        cliente = AsyncClient()
+        # Staff, para recibir Server-Timing
+        await cliente.aforce_login(await sync_to_async(User.objects.create_user)('staff', is_staff=True))
+        sincrona = (await sync_to_async(APIClient().get)('/api/productos/', {'page_size': 2})).json()
+        response = await cliente.get('/api/async/productos/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn(f'desc="{ProductViewSetQueryTests.CONSULTAS_ESPERADAS} consultas"', response['Server-Timing'])
+        data = response.json()
+        self.assertEqual(data['results'], sincrona['results'])
+        self.assertIn('/api/async/productos/?', data['next'])
+        self.assertEqual((await cliente.get('/api/async/productos/', {'page_size': 2}))['X-Cache'], 'HIT')
+
+        # Recorriendo los cursores se ven todos los productos una sola vez
+        vistos = [p['sku'] for p in data['results']]
+        while data['next']:
+            data = (await cliente.get(data['next'])).json()
+            vistos += [p['sku'] for p in data['results']]
+        self.assertEqual(sorted(vistos), sorted(p.sku for p in self.productos))
+
+    async def test_detalle_busqueda_y_errores(self):
+        cliente = AsyncClient()
+        producto = self.productos[0]
+        data = (await cliente.get(f'/api/async/productos/{producto.pk}/')).json()
+        self.assertEqual(data['sku'], producto.sku)
+        self.assertEqual(data['stocks'], '0, 1, 2')
+
+        data = (await cliente.get('/api/async/productos/', {'search': producto.sku})).json()
+        self.assertEqual([p['sku'] for p in data['results']], [producto.sku])
+
+        self.assertEqual((await cliente.get(f'/api/async/productos/{uuid.uuid4()}/')).status_code, 404)
+        response = await cliente.get('/api/async/productos/', {'marca': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('marca', response.json())
+        for cursor in CURSORES_INVALIDOS:
+            self.assertEqual((await cliente.get('/api/async/productos/', {'cursor': cursor})).status_code, 404, cursor)
+
+
+class FacetasTests(TestCase):
+    def setUp(self):
+        self.productos = crear_catalogo(3)
+        self.nike = Marca.objects.create(nombre='Nike')
+        Producto.objects.filter(pk=self.productos[0].pk).update(marca=self.nike, en_oferta=True, descuento_porcentaje=10)
+        # Sin stock: no cuenta en ninguna faceta
+        agotado = crear_catalogo(1, tallas=('S',), inicio=3)[0]
+        self.assertEqual(Producto.objects.get(pk=agotado.pk).stock_total, 0)
+        referencias.invalidar()
+
+    def test_conteos_en_dos_consultas_y_cacheados(self):
+        cliente = APIClient()
+        # Las tablas de clasificación ya cargadas en el registro en memoria
+        for modelo in (Categoria, Genero, Temporada, Marca, Talla):
+            referencias.todos(modelo)
+        # versión del catálogo + las dos consultas agrupadas
+        with self.assertNumQueries(3):
+            response = cliente.get('/api/productos/facets/')
+        data = response.json()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['en_oferta'], 1)
+        self.assertEqual(data['categoria'], [{'id': self.productos[0].categoria_id, 'nombre': 'Polos', 'cantidad': 3}])
+        self.assertEqual([(m['nombre'], m['cantidad']) for m in data['marca']], [('StreetForce', 2), ('Nike', 1)])
+        # La talla S tiene stock 0 en todos los productos
+        self.assertEqual([(t['nombre'], t['cantidad']) for t in data['talla']], [('M', 3), ('L', 3)])
+
+        # Parámetros que no son filtros comparten la entrada de caché
+        with self.assertNumQueries(1):
+            self.assertEqual(cliente.get('/api/productos/facets/', {'ordering': 'nombre'})['X-Cache'], 'HIT')
+
+        # Una escritura del catálogo la invalida
+        Producto.objects.get(pk=self.productos[1].pk).save()
+        response = cliente.get('/api/productos/facets/', {'marca': self.nike.pk})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['total'], 1)
+
+    def test_con_busqueda(self):
+        data = APIClient().get('/api/productos/facets/', {'search': 'SKU-0002'}).json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual([m['nombre'] for m in data['marca']], ['StreetForce'])
+        self.assertEqual(APIClient().get('/api/productos/facets/', {'genero': 'x'}).status_code, 400)
+
+
+class ProductoAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def contar_consultas(self, url):
+        # Una primera visita carga el registro de referencias (tallas nuevas lo invalidan)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def test_changelist_con_consultas_constantes(self):
+        urls = ['/admin/app_street/producto/', '/admin/app_street/producto/?stock=disponible&marca__id__exact=1']
+        crear_catalogo(3)
+        pocas = [self.contar_consultas(url) for url in urls]
+        crear_catalogo(30, inicio=3)
+        self.assertEqual([self.contar_consultas(url) for url in urls], pocas)
+
+    def test_formulario_con_consultas_constantes(self):
+        producto = crear_catalogo(1, tallas=('S',))[0]
+        pocas = self.contar_consultas(f'/admin/app_street/producto/{producto.pk}/change/')
+        producto = crear_catalogo(1, tallas=('S', 'M', 'L', 'XL', '38'), inicio=1)[0]
+        response = self.client.get(f'/admin/app_street/producto/{producto.pk}/change/')
+        # categoria, genero, temporada y marca con autocompletar; la talla del inline no
+        self.assertContains(response, 'data-app-label="app_street"', count=4)
+        self.assertEqual(self.contar_consultas(f'/admin/app_street/producto/{producto.pk}/change/'), pocas)
+
+        # Guardar el inline valida la talla con el registro en memoria
+        xl = Talla.objects.get(nombre='XL')
+        datos = {
+            'sku': producto.sku, 'nombre': producto.nombre, 'precio_base': '100', 'descuento_porcentaje': '0',
+            'categoria': producto.categoria_id, 'genero': producto.genero_id,
+            'temporada': producto.temporada_id, 'marca': producto.marca_id,
+            'talla_stock-TOTAL_FORMS': '1', 'talla_stock-INITIAL_FORMS': '0',
+            'talla_stock-0-talla': str(xl.pk), 'talla_stock-0-stock': '7',
+            'imagenes-TOTAL_FORMS': '0', 'imagenes-INITIAL_FORMS': '0',
+        }
+        nuevo = self.client.post('/admin/app_street/producto/add/', {**datos, 'sku': 'ADMIN-1'})
+        self.assertEqual(nuevo.status_code, 302)
+        self.assertEqual(Producto.objects.get(sku='ADMIN-1').talla_stock.get().talla, xl)
+        invalido = self.client.post('/admin/app_street/producto/add/', {**datos, 'sku': 'ADMIN-2', 'talla_stock-0-talla': '999999'})
+        self.assertEqual(invalido.status_code, 200)
+        self.assertFalse(Producto.objects.filter(sku='ADMIN-2').exists())
+
+    def test_total_estimado_sin_filtros(self):
+        crear_catalogo(3)
+        with mock.patch('app_street.admin.filas_estimadas', return_value=250_000):
+            response = self.client.get('/admin/app_street/producto/')
+            self.assertContains(response, '250000 productos')
+            # Con filtros se cuenta de verdad
+            response = self.client.get('/admin/app_street/producto/?q=SKU-0001')
+            self.assertContains(response, '1 producto')
+
+
+class PanelAdministradorTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def contar_consultas(self):
+        self.client.get('/')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/')
+        return response, len(consultas)
+
+    def test_no_depende_del_tamano_del_catalogo(self):
+        crear_catalogo(2)
+        response, pocas = self.contar_consultas()
+        self.assertNotIn('productos', response.context)
+        datos = json.loads(response.content.decode().split('id="datos-referencia" type="application/json">')[1].split('</script>')[0])
+        self.assertEqual(list(datos['tallas'].values()), ['S', 'M', 'L'])
+        self.assertEqual(list(datos['marcas'].values()), ['StreetForce'])
+
+        crear_catalogo(20, inicio=2)
+        self.assertEqual(self.contar_consultas()[1], pocas)
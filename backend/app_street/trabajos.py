@@ -0,0 +1,221 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q, sql
+from django.db.models.sql.constants import NO_RESULTS
+from django.utils import timezone
+
+from .importacion import ErrorImportacion, ImportadorProductos, leer_dataframe
+from .models import TrabajoImportacion
+
+logger = logging.getLogger(__name__)
+
+# Un solo pool por proceso; las importaciones se procesan de a una para no
+# competir por los mismos productos.
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMPORT_JOBS_WORKERS', 1),
+            thread_name_prefix='importacion',
+        )
+    return _executor
+
+
+def encolar(trabajo):
+    """
+    Programa el procesamiento de un trabajo de importación.
+
+    Con IMPORT_JOBS_RUNNER = 'thread' (por defecto) se procesa en un hilo del
+    mismo proceso. Con 'command' queda pendiente para el worker
+    `python manage.py procesar_importaciones`.
+    """
+    if getattr(settings, 'IMPORT_JOBS_RUNNER', 'thread') == 'thread':
+        # Esperamos al commit para que el hilo vea el trabajo recién creado
+        transaction.on_commit(lambda: _get_executor().submit(_procesar_en_hilo, trabajo.pk))
+
+
+def _procesar_en_hilo(trabajo_id):
+    close_old_connections()
+    try:
+        procesar_trabajo(trabajo_id)
+    finally:
+        close_old_connections()
+
+
+def recuperar_trabajos():
+    """
+    Trabajos que dejó colgados un reinicio o una caída del proceso: los
+    `procesando` que llevan más de IMPORT_JOBS_TIMEOUT minutos sin avanzar pasan
+    a `fallido` (los de modo lotes se pueden reanudar) y, con el runner
+    'thread', los `pendiente` se vuelven a encolar (el worker de
+    procesar_importaciones ya los toma solo). Devuelve (encolados, fallidos).
+    """
+    fallidos = TrabajoImportacion.objects.filter(_interrumpidos()).update(
+        estado=TrabajoImportacion.FALLIDO,
+        errores=['El procesamiento se interrumpió (reinicio o caída del servidor).'],
+        fecha_fin=timezone.now(),
+    )
+    if fallidos:
+        logger.warning("%s importación(es) interrumpida(s) marcadas como fallidas", fallidos)
+
+    encolados = 0
+    if getattr(settings, 'IMPORT_JOBS_RUNNER', 'thread') == 'thread':
+        # Si otro proceso también lo encoló, procesar_trabajo lo toma una sola vez
+        for trabajo_id in TrabajoImportacion.objects.filter(
+            estado=TrabajoImportacion.PENDIENTE
+        ).order_by('fecha_creacion').values_list('pk', flat=True):
+            _get_executor().submit(_procesar_en_hilo, trabajo_id)
+            encolados += 1
+    return encolados, fallidos
+
+
+def _interrumpidos():
+    # `procesando` sin avance desde hace más de IMPORT_JOBS_TIMEOUT minutos: su
+    # proceso ya no existe (uno vivo avanza en cada lote, por largo que sea el archivo)
+    limite = timezone.now() - timedelta(minutes=getattr(settings, 'IMPORT_JOBS_TIMEOUT', 60))
+    return Q(estado=TrabajoImportacion.PROCESANDO, ultimo_avance__lt=limite)
+
+
+def recuperar_en_segundo_plano():
+    # En el hilo de las importaciones, para no sumar consultas al request que lo dispara
+    _get_executor().submit(_recuperar_en_hilo)
+
+
+def _recuperar_en_hilo():
+    close_old_connections()
+    try:
+        recuperar_trabajos()
+    finally:
+        close_old_connections()
+
+
+class _Avance:
+    """
+    Guarda el avance de un trabajo para quien consulta /import/<id>/. Dentro
+    de una transacción (el modo atómico escribe todo en una) se usa una
+    conexión propia en autocommit: por la del import solo se vería al final.
+    """
+
+    # Nombres que usa ImportadorProductos -> campos del trabajo
+    CAMPOS = {'total': 'total_filas', 'procesadas': 'filas_procesadas'}
+
+    def __init__(self, trabajo_id):
+        self.trabajo_id = trabajo_id
+        self.conexion = None
+
+    def guardar(self, **valores):
+        campos = {self.CAMPOS.get(nombre, nombre): valor for nombre, valor in valores.items()}
+        campos['ultimo_avance'] = timezone.now()
+        trabajos = TrabajoImportacion.objects.filter(pk=self.trabajo_id)
+        if not transaction.get_connection(trabajos.db).in_atomic_block:
+            trabajos.update(**campos)
+            return
+        if self.conexion is None:
+            self.conexion = connections.create_connection(trabajos.db)
+        query = trabajos.query.chain(sql.UpdateQuery)
+        query.add_update_values(campos)
+        query.get_compiler(connection=self.conexion).execute_sql(NO_RESULTS)
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+
+
+def procesar_trabajo(trabajo_id):
+    # Tomamos el trabajo solo si sigue pendiente, así dos workers no lo procesan a la vez
+    ahora = timezone.now()
+    tomado = TrabajoImportacion.objects.filter(pk=trabajo_id, estado=TrabajoImportacion.PENDIENTE).update(
+        estado=TrabajoImportacion.PROCESANDO, fecha_inicio=ahora, ultimo_avance=ahora
+    )
+    if not tomado:
+        return
+
+    trabajo = TrabajoImportacion.objects.get(pk=trabajo_id)
+    avance = _Avance(trabajo_id)
+
+    def checkpoint(confirmadas, parcial):
+        # Corre dentro de la transacción del lote: el avance se confirma junto con los datos
+        TrabajoImportacion.objects.filter(pk=trabajo_id).update(
+            filas_confirmadas=confirmadas,
+            filas_procesadas=confirmadas,
+            creados=trabajo.creados + parcial["created"],
+            actualizados=trabajo.actualizados + parcial["updated"],
+            sin_cambios=trabajo.sin_cambios + parcial["unchanged"],
+            ultimo_avance=timezone.now(),
+        )
+
+    total = 0
+    try:
+        with trabajo.archivo.open('rb') as archivo:
+            df = leer_dataframe(archivo)
+        total = len(df)
+        TrabajoImportacion.objects.filter(pk=trabajo_id).update(total_filas=total)
+        importador = ImportadorProductos(progreso=avance.guardar)
+
+        if trabajo.modo == TrabajoImportacion.LOTES:
+            filas_por_lote = trabajo.filas_por_lote or getattr(settings, 'IMPORT_CHUNK_SIZE', 500)
+            results = importador.importar_por_lotes(df, filas_por_lote, desde=trabajo.filas_confirmadas, checkpoint=checkpoint)
+            # Lo confirmado en ejecuciones anteriores también cuenta
+            results["created"] += trabajo.creados
+            results["updated"] += trabajo.actualizados
+            results["unchanged"] += trabajo.sin_cambios
+        else:
+            results = importador.importar(df, dry_run=trabajo.modo == TrabajoImportacion.SIMULACION)
+    except ErrorImportacion as e:
+        results = {"errors": [str(e)]}
+    except Exception as e:
+        logger.exception("Error procesando la importación %s", trabajo_id)
+        results = {"errors": [f"Ocurrió un error inesperado en el servidor: {str(e)}"]}
+    finally:
+        avance.cerrar()
+
+    campos = {}
+    if "created" in results:
+        campos.update(creados=results["created"], actualizados=results["updated"], sin_cambios=results["unchanged"])
+    elif trabajo.modo != TrabajoImportacion.LOTES:
+        campos.update(creados=0, actualizados=0, sin_cambios=0)
+    if trabajo.modo != TrabajoImportacion.LOTES:
+        # Con errores la transacción se deshizo: no queda ninguna fila escrita
+        campos.update(filas_procesadas=0 if results["errors"] else total)
+    # En modo lotes un error inesperado deja los contadores del último lote
+    # confirmado, para poder reanudar desde ahí
+    TrabajoImportacion.objects.filter(pk=trabajo_id).update(
+        estado=TrabajoImportacion.FALLIDO if results["errors"] else TrabajoImportacion.COMPLETADO,
+        errores=results["errors"],
+        diferencias=results.get("diff", {}),
+        fecha_fin=timezone.now(),
+        **campos,
+    )
+
+
+def reanudar(trabajo):
+    """
+    Vuelve a encolar una importación por lotes que falló o que quedó
+    interrumpida (sigue `procesando` pasado IMPORT_JOBS_TIMEOUT, sin que
+    recuperar_trabajos la haya marcado aún); al procesarse sigue desde
+    filas_confirmadas. Devuelve False si el trabajo no se puede reanudar.
+    """
+    reanudado = TrabajoImportacion.objects.filter(
+        Q(estado=TrabajoImportacion.FALLIDO) | _interrumpidos(),
+        pk=trabajo.pk, modo=TrabajoImportacion.LOTES,
+    ).update(estado=TrabajoImportacion.PENDIENTE, fecha_fin=None)
+    if reanudado:
+        encolar(trabajo)
+    return bool(reanudado)
+
+
+def procesar_pendientes():
+    procesados = 0
+    for trabajo_id in TrabajoImportacion.objects.filter(
+        estado=TrabajoImportacion.PENDIENTE
+    ).order_by('fecha_creacion').values_list('pk', flat=True):
+        procesar_trabajo(trabajo_id)
+        procesados += 1
+    return procesados
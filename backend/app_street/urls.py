@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api import ProductViewSet
+from .api_async import ProductosAsyncView
 from . import views
 
 router = DefaultRouter()
@@ -8,7 +9,16 @@ router.register(r'productos', ProductViewSet, basename='product')
 
 urlpatterns = [
     path('', views.administrador, name = "administrador"),
+    path('api/stock/descontar/', views.StockDescontarView.as_view(), name='stock-descontar'),
+    path('api/stock/liberar/', views.StockLiberarView.as_view(), name='stock-liberar'),
+    path('api/catalogo/cache/', views.CatalogoCacheStatsView.as_view(), name='catalogo-cache-stats'),
+    # Lectura async del catálogo (para el despliegue ASGI, ver api_async.py)
+    path('api/async/productos/', ProductosAsyncView.as_view(), name='product-async-list'),
+    path('api/async/productos/<uuid:pk>/', ProductosAsyncView.as_view(), name='product-async-detail'),
     path('api/', include(router.urls)),
+    path('api/reportes/stock/', views.ReporteStockView.as_view(), name='reporte-stock'),
     path('export/', views.ProductExportView.as_view(), name='product-export'),
     path('import/', views.ProductImportView.as_view(), name='product-import'),
+    path('import/<uuid:job_id>/', views.ProductImportStatusView.as_view(), name='product-import-status'),
+    path('import/<uuid:job_id>/reanudar/', views.ProductImportResumeView.as_view(), name='product-import-resume'),
 ]
\ No newline at end of file
@@ -37,13 +37,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'app_street',
     'rest_framework',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer que además mide la serialización (ver instrumentacion.py)
+        'app_street.instrumentacion.JSONRendererMedido',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -52,7 +54,31 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Importaciones de productos desde Excel
+IMPORT_BATCH_SIZE = 1000
+# 'thread': se procesan en un hilo del servidor; 'command': quedan en cola para
+# `python manage.py procesar_importaciones`
+IMPORT_JOBS_RUNNER = 'thread'
+IMPORT_JOBS_WORKERS = 1
+# Minutos sin avance tras los que un trabajo que sigue `procesando` se da por
+# interrumpido (reinicio, caída); debe superar lo que tarda leer y validar el
+# archivo más grande o escribir un lote
+IMPORT_JOBS_TIMEOUT = 60
+# Filas por transacción en las importaciones con commit=chunked
+IMPORT_CHUNK_SIZE = 500
+
+# Versiones reducidas de las imágenes de producto (ancho en px, WebP y JPEG).
+# 'thread': se generan en un hilo tras subir la imagen; 'command': con
+# `python manage.py generar_versiones_imagenes`
+IMAGENES_ANCHOS = [200, 600, 1200]
+IMAGENES_VERSIONES_RUNNER = 'thread'
+IMAGENES_WORKERS = 2
+# Hilos que escriben al storage las imágenes subidas en un mismo request
+IMAGENES_SUBIDA_WORKERS = 4
+
 MIDDLEWARE = [
+    # Primero, para que el tiempo total incluya al resto de los middlewares
+    'app_street.instrumentacion.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +90,15 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'proyecto_street.urls'
 
+# Métricas por petición (Server-Timing + log JSON en 'app_street.instrumentacion').
+# Las peticiones con más consultas que el presupuesto se registran como WARNING
+INSTRUMENTACION_ACTIVA = True
+INSTRUMENTACION_PRESUPUESTO_CONSULTAS = 30
+INSTRUMENTACION_SERIALIZACION = True
+# Quién recibe la cabecera Server-Timing (revela consultas y tiempos de la base):
+# True (todos), 'staff' o False. El log se escribe siempre
+INSTRUMENTACION_SERVER_TIMING = 'staff'
+
 STATICFILES_DIRS = [
     BASE_DIR / 'app_street/static',
 ]
@@ -91,6 +126,33 @@ WSGI_APPLICATION = 'proyecto_street.wsgi.application'
 
 DATABASES = {   'default': {       'ENGINE': 'django.db.backends.postgresql',       'NAME': 'dabase-prueba-2',       'USER': 'admin',       'PASSWORD': '1234',       'HOST': 'localhost',       'PORT': '5432',   } }
 
+# Foto columnar del catálogo (export y reportes). Se comparte entre workers
+# vía mmap y el request que la lee la actualiza incrementalmente si el catálogo
+# cambió; `python manage.py generar_snapshot` (p. ej. desde cron) la adelanta y
+# con --completo la regenera por completo.
+CATALOGO_SNAPSHOT_DIR = BASE_DIR / 'snapshot'
+CATALOGO_SNAPSHOT_SOLAPE = 300
+
+# Caché del catálogo (respuestas de /api/productos/). La versión que la invalida
+# vive en PostgreSQL, así que cada proceso deja de servir lo viejo en cuanto otro
+# escribe; para compartir además las respuestas basta cambiar el BACKEND, p. ej.
+# django.core.cache.backends.redis.RedisCache, sin tocar el código.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogo': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogo',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+CATALOGO_CACHE_ALIAS = 'catalogo'
+CATALOGO_CACHE_TIMEOUT = 300
+# Segundos que cada proceso conserva en memoria las tablas de clasificación
+# (las señales solo avisan al proceso que hizo el cambio)
+REFERENCIAS_TTL = 60
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 